@@ -0,0 +1,421 @@
+import argparse
+import glob
+import os
+import time
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from cube_state import (FACE_ORDER, FACELET_COUNT, INVERSE_MOVES, MOVE_COUNT, NO_PREVIOUS_MOVE, CubeState,
+                        format_moves, is_canonical_successor)
+from cubie_cube import (CORNER_FACELETS, CORNER_LOOKUP, CORNER_NAMES, EDGE_FACELETS, EDGE_LOOKUP, EDGE_NAMES,
+                        INVALID_PIECE, facelets_to_cubies, verify_cubies)
+from data_classes import SearchStats
+from optimal_solver import CORNER_DESTINATIONS, CORNER_TWISTS, EDGE_DESTINATIONS, EDGE_FLIPS
+
+# A piece at position p with twist or flip o is coordinate 3p + o for a corner, 24 + 2p + o for an edge
+PIECE_COUNT: int = len(CORNER_NAMES) + len(EDGE_NAMES)
+EDGE_OFFSET: int = 3 * len(CORNER_NAMES)
+COORDINATE_COUNT: int = EDGE_OFFSET + 2 * len(EDGE_NAMES)
+WILDCARD: str = '.'
+
+# Each half sequence is packed base 18 next to a 32-bit hash in one word, which bounds a half at 7 moves
+MAX_HALF_DEPTH: int = 7
+MAX_SEARCH_DEPTH: int = 2 * MAX_HALF_DEPTH
+DEFAULT_MAX_ENTRIES: int = 1 << 25
+DEFAULT_CHUNK_ROWS: int = 1 << 20
+# Sequences enumerated per task are grouped under prefixes of this length
+PREFIX_DEPTH: int = 2
+# Canonical sequences grow by about this factor per move
+BRANCHING: float = 13.35
+
+
+def get_coordinate_moves() -> np.ndarray:
+    """
+    Returns: (moves, 48) coordinate of every piece coordinate after each move.
+    """
+    table: np.ndarray = np.empty((MOVE_COUNT, COORDINATE_COUNT), dtype=np.uint8)
+    position, twist = np.divmod(np.arange(EDGE_OFFSET), 3)
+    table[:, :EDGE_OFFSET] = CORNER_DESTINATIONS[:, position] * 3 + (twist + CORNER_TWISTS[:, position]) % 3
+    position, flip = np.divmod(np.arange(COORDINATE_COUNT - EDGE_OFFSET), 2)
+    table[:, EDGE_OFFSET:] = EDGE_OFFSET + EDGE_DESTINATIONS[:, position] * 2 + (flip + EDGE_FLIPS[:, position]) % 2
+    return table
+
+
+COORDINATE_MOVES: np.ndarray = get_coordinate_moves()
+SOLVED_COORDINATES: np.ndarray = np.concatenate([np.arange(len(CORNER_NAMES)) * 3,
+                                                 EDGE_OFFSET + np.arange(len(EDGE_NAMES)) * 2]).astype(np.uint8)
+# Whether a move may follow another, the extra last row being the first move. Backward halves run from the target, so
+# they are the reversed second halves of solutions and follow the rule the other way round.
+FORWARD_SUCCESSORS: np.ndarray = np.array([[p == NO_PREVIOUS_MOVE or is_canonical_successor(p, m)
+                                            for m in range(MOVE_COUNT)] for p in range(MOVE_COUNT + 1)])
+BACKWARD_SUCCESSORS: np.ndarray = np.array([[p == NO_PREVIOUS_MOVE or is_canonical_successor(m, p)
+                                             for m in range(MOVE_COUNT)] for p in range(MOVE_COUNT + 1)])
+HASH_MULTIPLIERS: Tuple[np.uint64, np.uint64] = (np.uint64(0x9E3779B97F4A7C15), np.uint64(0xC2B2AE3D27D4EB4F))
+
+
+def get_piece(name: str) -> int:
+    """
+    Returns: Index of a corner or edge among the PIECE_COUNT pieces, from its faces in any order.
+    """
+    for index, piece in enumerate(CORNER_NAMES + EDGE_NAMES):
+        if sorted(name.upper()) == sorted(piece):
+            return index
+    raise ValueError(f'Unknown piece: {name!r}')
+
+
+class TargetPattern(NamedTuple):
+    """
+    Where each of the 8 corners then 12 edges has to end up, as a piece coordinate, and which parts of that count:
+    a piece with neither is a don't care.
+    """
+    coordinates: np.ndarray
+    position_mask: np.ndarray
+    orientation_mask: np.ndarray
+
+    @classmethod
+    def from_moves(cls, moves: str, ignore: Iterable[str] = (), ignore_orientation: Iterable[str] = ()) -> \
+            'TargetPattern':
+        """
+        Returns: The effect of a move sequence on every piece except the ignored ones.
+        """
+        return cls.from_facelets(CubeState().apply_moves(moves).to_string(), ignore, ignore_orientation)
+
+    @classmethod
+    def from_facelets(cls, facelets: str, ignore: Iterable[str] = (), ignore_orientation: Iterable[str] = ()) -> \
+            'TargetPattern':
+        """
+        Returns: The pattern of a URFDLB facelet string in which the pieces left entirely as WILDCARD do not count.
+        """
+        if len(facelets) != FACELET_COUNT or not set(facelets) <= set(FACE_ORDER) | {WILDCARD}:
+            raise ValueError(f'Expected {FACELET_COUNT} URFDLB or {WILDCARD!r} facelets, got {facelets!r}')
+        known: np.ndarray = np.array([c != WILDCARD for c in facelets])
+        colors: np.ndarray = np.array([FACE_ORDER.index(c) if c != WILDCARD else 0 for c in facelets])
+        if any(known[f * 9 + 4] and colors[f * 9 + 4] != f for f in range(len(FACE_ORDER))):
+            raise ValueError('Centers must be wildcards or their own face')
+
+        coordinates: np.ndarray = SOLVED_COORDINATES.copy()
+        located: np.ndarray = np.zeros(PIECE_COUNT, dtype=bool)
+        for kind, (sticker_sets, (pieces, orientations), base, offset, count) in enumerate((
+                (CORNER_FACELETS, CORNER_LOOKUP, 3, 0, 0),
+                (EDGE_FACELETS, EDGE_LOOKUP, 2, EDGE_OFFSET, len(CORNER_NAMES)))):
+            for position, stickers in enumerate(sticker_sets):
+                if not known[stickers].any():
+                    continue
+                name: str = (CORNER_NAMES, EDGE_NAMES)[kind][position]
+                if not known[stickers].all():
+                    raise ValueError(f'Position {name} mixes wildcards and colors; a piece counts whole or not at all')
+                code: int = int(colors[stickers] @ (6 ** np.arange(len(stickers) - 1, -1, -1)))
+                if pieces[code] == INVALID_PIECE:
+                    raise ValueError(f'Position {name} shows no piece')
+                piece: int = count + int(pieces[code])
+                if located[piece]:
+                    raise ValueError(f'Piece {(CORNER_NAMES + EDGE_NAMES)[piece]} appears twice')
+                located[piece] = True
+                coordinates[piece] = offset + position * base + orientations[code]
+        if located.all():
+            cp, co, ep, eo = facelets_to_cubies(colors)
+            if not verify_cubies(cp, co, ep, eo):
+                raise ValueError('Cube state is not solvable')
+
+        position_mask: np.ndarray = located.copy()
+        orientation_mask: np.ndarray = located.copy()
+        position_mask[[get_piece(name) for name in ignore]] = False
+        orientation_mask[[get_piece(name) for name in list(ignore) + list(ignore_orientation)]] = False
+        return cls(coordinates, position_mask, orientation_mask)
+
+    @property
+    def pieces(self) -> np.ndarray:
+        """
+        Indices of the pieces the search tracks.
+        """
+        return np.flatnonzero(self.position_mask | self.orientation_mask)
+
+    def get_key_maps(self) -> np.ndarray:
+        """
+        Returns: (tracked pieces, 48) key of every coordinate of each tracked piece: the coordinate itself, or its
+        position or orientation alone when the other part does not count.
+        """
+        coordinates: np.ndarray = np.arange(COORDINATE_COUNT)
+        corners: np.ndarray = coordinates < EDGE_OFFSET
+        position: np.ndarray = np.where(corners, coordinates // 3, (coordinates - EDGE_OFFSET) // 2)
+        orientation: np.ndarray = np.where(corners, coordinates % 3, (coordinates - EDGE_OFFSET) % 2)
+        return np.array([coordinates if self.position_mask[p] and self.orientation_mask[p]
+                         else position if self.position_mask[p] else orientation
+                         for p in self.pieces], dtype=np.uint8)
+
+    def matches(self, moves: Sequence[int]) -> bool:
+        """
+        Returns: Whether the move indices, applied to the solved cube, give the pattern.
+        """
+        coordinates: np.ndarray = apply_sequences(SOLVED_COORDINATES[None, self.pieces], np.array([moves]))[0]
+        key_maps: np.ndarray = self.get_key_maps()
+        columns: np.ndarray = np.arange(len(self.pieces))
+        return bool((key_maps[columns, coordinates] == key_maps[columns, self.coordinates[self.pieces]]).all())
+
+
+def count_sequences(length: int, successors: np.ndarray = FORWARD_SUCCESSORS) -> int:
+    """
+    Returns: Number of canonical move sequences of the length.
+    """
+    counts: np.ndarray = np.zeros(MOVE_COUNT + 1, dtype=np.int64)
+    counts[NO_PREVIOUS_MOVE] = 1
+    for _ in range(length):
+        counts = np.append(counts @ successors.astype(np.int64), 0)
+    return int(counts.sum())
+
+
+def decode_sequences(codes: np.ndarray, length: int) -> np.ndarray:
+    """
+    Returns: (N, length) moves of base-18 sequence codes, first move in the most significant digit.
+    """
+    codes = np.asarray(codes, dtype=np.int64)
+    return np.stack([(codes // MOVE_COUNT ** (length - 1 - i)) % MOVE_COUNT for i in range(length)], axis=-1) \
+        if length else np.zeros((len(codes), 0), dtype=np.int64)
+
+
+def apply_sequences(coordinates: np.ndarray, moves: np.ndarray) -> np.ndarray:
+    """
+    Returns: (N, pieces) coordinates after each row of (N, length) moves, applied to the same row of coordinates.
+    """
+    coordinates = np.broadcast_to(coordinates, (len(moves), coordinates.shape[-1])).copy()
+    for i in range(moves.shape[1]):
+        coordinates = COORDINATE_MOVES[moves[:, i:i + 1], coordinates]
+    return coordinates
+
+
+def expand_sequences(coordinates: np.ndarray, codes: np.ndarray, levels: int, successors: np.ndarray,
+                     chunk_rows: int) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Yields: (coordinates, codes) chunks of every canonical extension of the sequences by `levels` moves, depth first
+    so a chunk holds about chunk_rows rows whatever the depth.
+    """
+    stack: List[Tuple[np.ndarray, np.ndarray, int]] = [(coordinates, codes, levels)]
+    while stack:
+        coordinates, codes, levels = stack.pop()
+        if levels == 0:
+            yield coordinates, codes
+            continue
+        lasts: np.ndarray = np.where(codes >= 0, codes % MOVE_COUNT, NO_PREVIOUS_MOVE)
+        next_coordinates: List[np.ndarray] = []
+        next_codes: List[np.ndarray] = []
+        for move in range(MOVE_COUNT):
+            rows: np.ndarray = successors[lasts, move]
+            next_coordinates.append(COORDINATE_MOVES[move][coordinates[rows]])
+            next_codes.append(np.maximum(codes[rows], 0) * MOVE_COUNT + move)
+        coordinates, codes = np.concatenate(next_coordinates), np.concatenate(next_codes)
+        step: int = max(1, int(chunk_rows / BRANCHING ** (levels - 1)))
+        for start in reversed(range(0, len(codes), step)):
+            stack.append((coordinates[start:start + step], codes[start:start + step], levels - 1))
+
+
+def hash_keys(keys: np.ndarray) -> np.ndarray:
+    """
+    Returns: 64-bit hash of each row of up to 20 six-bit keys.
+    """
+    words: List[np.ndarray] = [np.zeros(len(keys), dtype=np.uint64) for _ in range(2)]
+    for i in range(keys.shape[1]):
+        words[i // 10] |= keys[:, i].astype(np.uint64) << np.uint64(6 * (i % 10))
+    hashes: np.ndarray = words[0] * HASH_MULTIPLIERS[0] ^ words[1] * HASH_MULTIPLIERS[1]
+    return hashes ^ (hashes >> np.uint64(29))
+
+
+class HalfSearch(NamedTuple):
+    """
+    One half of a meet-in-the-middle search, as sent to the workers: sequences of `length` moves from `start`.
+    """
+    side: str
+    start: np.ndarray
+    length: int
+    successors: np.ndarray
+    key_maps: np.ndarray
+    buckets: int
+    scratch: str
+    chunk_rows: int
+
+
+def get_bucket_path(scratch: str, side: str, bucket: int) -> str:
+    return os.path.join(scratch, f'{side}_{os.getpid()}_{bucket}.bin')
+
+
+def _map_half(task: Tuple[HalfSearch, np.ndarray]) -> int:
+    """
+    Enumerates the sequences under some prefixes and appends each to the scratch file of its bucket, as its hash in
+    the high 32 bits and its code in the low 32 bits.
+
+    Returns: Number of sequences enumerated.
+    """
+    half, prefixes = task
+    prefix_length: int = min(half.length, PREFIX_DEPTH)
+    coordinates: np.ndarray = apply_sequences(half.start, decode_sequences(prefixes, prefix_length))
+    codes: np.ndarray = prefixes if prefix_length else np.full(len(prefixes), -1, dtype=np.int64)
+    columns: np.ndarray = np.arange(len(half.start))
+    count: int = 0
+    for coordinates, codes in expand_sequences(coordinates, codes, half.length - prefix_length, half.successors,
+                                               half.chunk_rows):
+        hashes: np.ndarray = hash_keys(half.key_maps[columns, coordinates])
+        entries: np.ndarray = (hashes >> np.uint64(32) << np.uint64(32)) | np.maximum(codes, 0).astype(np.uint64)
+        buckets: np.ndarray = (hashes & np.uint64(0xFFFFFFFF)) % np.uint64(half.buckets)
+        for bucket in range(half.buckets):
+            with open(get_bucket_path(half.scratch, half.side, bucket), 'ab') as f:
+                entries[buckets == bucket].tofile(f)
+        count += len(codes)
+    return count
+
+
+def _join_bucket(task: Tuple[HalfSearch, HalfSearch, int]) -> Tuple[np.ndarray, np.ndarray, int]:
+    """
+    Matches the forward and backward sequences of one bucket by hash, then checks every candidate exactly.
+
+    Returns: Forward and backward codes of the solutions, and the number of candidates checked.
+    """
+    forward, backward, bucket = task
+    forward_entries: np.ndarray = np.sort(np.concatenate(
+        [np.fromfile(path, dtype=np.uint64)
+         for path in glob.glob(os.path.join(forward.scratch, f'forward_*_{bucket}.bin'))] or [np.zeros(0, np.uint64)]))
+    forward_hashes: np.ndarray = forward_entries >> np.uint64(32)
+    columns: np.ndarray = np.arange(len(forward.start))
+    solutions: List[Tuple[np.ndarray, np.ndarray]] = []
+    candidates: int = 0
+    for path in glob.glob(os.path.join(backward.scratch, f'backward_*_{bucket}.bin')):
+        backward_entries: np.ndarray = np.fromfile(path, dtype=np.uint64)
+        backward_hashes: np.ndarray = backward_entries >> np.uint64(32)
+        low: np.ndarray = np.searchsorted(forward_hashes, backward_hashes, 'left')
+        counts: np.ndarray = np.searchsorted(forward_hashes, backward_hashes, 'right') - low
+        backward_rows: np.ndarray = np.repeat(np.arange(len(backward_entries)), counts)
+        forward_rows: np.ndarray = np.repeat(low - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        mask: np.ndarray = np.uint64(0xFFFFFFFF)
+        forward_codes: np.ndarray = (forward_entries[forward_rows] & mask).astype(np.int64)
+        backward_codes: np.ndarray = (backward_entries[backward_rows] & mask).astype(np.int64)
+        candidates += len(forward_codes)
+
+        ok: np.ndarray = np.ones(len(forward_codes), dtype=bool)
+        if forward.length and backward.length:
+            # The first move of the second half is the inverse of the last backward move, on the same face
+            ok &= FORWARD_SUCCESSORS[forward_codes % MOVE_COUNT, backward_codes % MOVE_COUNT]
+        forward_codes, backward_codes = forward_codes[ok], backward_codes[ok]
+        # Hashes can collide; the keys themselves decide
+        forward_keys: np.ndarray = forward.key_maps[columns, apply_sequences(
+            forward.start, decode_sequences(forward_codes, forward.length))]
+        backward_keys: np.ndarray = backward.key_maps[columns, apply_sequences(
+            backward.start, decode_sequences(backward_codes, backward.length))]
+        equal: np.ndarray = (forward_keys == backward_keys).all(axis=1)
+        solutions.append((forward_codes[equal], backward_codes[equal]))
+    if not solutions:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), candidates
+    return np.concatenate([f for f, _ in solutions]), np.concatenate([b for _, b in solutions]), candidates
+
+
+class AlgorithmSearch:
+    """
+    Bidirectional meet-in-the-middle search for every shortest move sequence, in the 18 face turns of the buttons,
+    with the effect of a TargetPattern. Sequences of half the length are enumerated from the solved cube and, as
+    inverses, from the target; a solution is a pair whose tracked pieces meet. Halves are spilled to scratch files in
+    hash buckets sized to `max_entries`, so memory does not grow with the depth, and a process pool enumerates
+    prefixes and then joins buckets in parallel.
+    """
+
+    def __init__(self, pattern: TargetPattern, processes: int = None, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 chunk_rows: int = DEFAULT_CHUNK_ROWS):
+        self.pattern: TargetPattern = pattern
+        self.processes: int = processes or os.cpu_count()
+        self.max_entries: int = max_entries
+        self.chunk_rows: int = chunk_rows
+        self.stats: SearchStats = SearchStats()
+        self.candidates: int = 0
+
+    def search(self, max_depth: int = MAX_SEARCH_DEPTH, verbose: bool = False) -> List[str]:
+        """
+        Returns: Every canonical solution of the smallest length that has any, none if none within max_depth.
+        """
+        if max_depth > MAX_SEARCH_DEPTH:
+            raise ValueError(f'Depths beyond {MAX_SEARCH_DEPTH} do not fit the packed half sequences')
+        # Imported here rather than at load, where they would cost every importer and pool worker that never searches
+        import multiprocessing
+        import multiprocessing.pool
+        self.stats = SearchStats()
+        self.candidates = 0
+        start: float = time.perf_counter()
+        pool: Optional[multiprocessing.pool.Pool] = None
+        try:
+            for depth in range(max_depth + 1):
+                self.stats.depth = depth
+                # Short depths are quicker in this process than the pool takes to start
+                if pool is None and self.processes > 1 and count_sequences((depth + 1) // 2) > self.chunk_rows:
+                    pool = multiprocessing.get_context('spawn').Pool(self.processes)
+                solutions: List[List[int]] = self.search_depth(depth, pool)
+                if verbose:
+                    print(f'depth {depth}: {self.stats.nodes} sequences, {self.candidates} candidates, '
+                          f'{len(solutions)} solutions, {time.perf_counter() - start:.1f} s')
+                if solutions:
+                    return sorted(format_moves(moves) for moves in solutions)
+            return []
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+            self.stats.elapsed_sec = time.perf_counter() - start
+
+    def search_depth(self, depth: int, pool: 'multiprocessing.pool.Pool' = None) -> List[List[int]]:
+        """
+        Returns: Every canonical solution of exactly `depth` moves.
+        """
+        import tempfile
+        pieces: np.ndarray = self.pattern.pieces
+        key_maps: np.ndarray = self.pattern.get_key_maps()
+        forward_length: int = (depth + 1) // 2
+        buckets: int = max(1, -(-count_sequences(forward_length) // self.max_entries))
+        run = pool.imap_unordered if pool is not None else map
+        with tempfile.TemporaryDirectory(prefix='rubiks_mitm_') as scratch:
+            forward: HalfSearch = HalfSearch('forward', SOLVED_COORDINATES[pieces], forward_length, FORWARD_SUCCESSORS,
+                                             key_maps, buckets, scratch, self.chunk_rows)
+            backward: HalfSearch = HalfSearch('backward', self.pattern.coordinates[pieces], depth - forward_length,
+                                              BACKWARD_SUCCESSORS, key_maps, buckets, scratch, self.chunk_rows)
+            tasks: List[Tuple[HalfSearch, np.ndarray]] = [(half, prefixes) for half in (forward, backward)
+                                                          for prefixes in self.__split_prefixes(half)]
+            self.stats.nodes += sum(run(_map_half, tasks))
+            solutions: List[List[int]] = []
+            for forward_codes, backward_codes, candidates in run(_join_bucket, [(forward, backward, bucket)
+                                                                                for bucket in range(buckets)]):
+                self.candidates += candidates
+                second_halves: np.ndarray = INVERSE_MOVES[decode_sequences(backward_codes, backward.length)[:, ::-1]]
+                solutions += np.hstack([decode_sequences(forward_codes, forward.length), second_halves]).tolist()
+        return solutions
+
+    def __split_prefixes(self, half: HalfSearch) -> List[np.ndarray]:
+        prefix_length: int = min(half.length, PREFIX_DEPTH)
+        prefixes: np.ndarray = np.concatenate([codes for _, codes in expand_sequences(
+            np.zeros((1, 0), dtype=np.uint8), np.full(1, -1, dtype=np.int64), prefix_length, half.successors,
+            self.chunk_rows)]) if prefix_length else np.zeros(1, dtype=np.int64)
+        # A few tasks per process, so uneven subtrees still spread over the pool
+        return np.array_split(prefixes, min(len(prefixes), 4 * self.processes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Find every shortest move sequence with a given effect on the '
+                                                 'pieces that matter, by meet-in-the-middle search.')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--moves', help='A sequence with the wanted effect, such as a known longer algorithm')
+    target.add_argument('--facelets', help=f'URFDLB facelets of the target, {WILDCARD!r} for pieces that do not count')
+    parser.add_argument('--ignore', default='', help='Comma separated pieces that do not count, such as UF,URF')
+    parser.add_argument('--ignore-orientation', default='',
+                        help='Comma separated pieces whose place counts but not their twist or flip')
+    parser.add_argument('--max-depth', type=int, default=MAX_SEARCH_DEPTH)
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--max-entries', type=int, default=DEFAULT_MAX_ENTRIES,
+                        help='Sequences of a half held in memory at once, per process')
+    args = parser.parse_args()
+
+    ignore: List[str] = [name for name in args.ignore.split(',') if name]
+    ignore_orientation: List[str] = [name for name in args.ignore_orientation.split(',') if name]
+    pattern: TargetPattern = TargetPattern.from_moves(args.moves, ignore, ignore_orientation) if args.moves else \
+        TargetPattern.from_facelets(args.facelets, ignore, ignore_orientation)
+    search: AlgorithmSearch = AlgorithmSearch(pattern, args.processes, args.max_entries)
+    solutions: List[str] = search.search(args.max_depth, verbose=True)
+    for solution in solutions:
+        print(solution)
+    print(f'{len(solutions)} solutions of {search.stats.depth} moves in {search.stats.elapsed_sec:.1f} s')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,47 @@
+import argparse
 from typing import Tuple
 
-from enums import PygameWindow
-from pygame_wrapper import GluPerspectiveDC, PygameWrapper
+import numpy as np
+
+from cube_batch import CubeBatch
+from cube_state import MOVE_COUNT
+from enums import CubeRenderModes, PygameWindow
+from frame_profiler import FrameProfiler
+from pygame_wrapper import DEFAULT_MAX_FPS, GluPerspectiveDC, PygameWrapper
+
+
+def random_states(n: int, depth: int = 30) -> np.ndarray:
+    rng: np.random.Generator = np.random.default_rng()
+    batch: CubeBatch = CubeBatch.solved(n)
+    for _ in range(depth):
+        batch.apply_moves(rng.integers(0, MOVE_COUNT, size=n))
+    return batch.states
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Rubik's Cube explorer.")
+    parser.add_argument('--renderer', choices=CubeRenderModes.values(), default=CubeRenderModes.VBO.value,
+                        help='Cube renderer: one vertex buffer (vbo) or the immediate-mode fallback')
+    parser.add_argument('--profile', action='store_true',
+                        help='Time every frame and show p50/p95/p99 frame times on screen (toggle with P)')
+    parser.add_argument('--trace', default=None, help='Write the last profiled frames as Chrome trace JSON on exit')
+    parser.add_argument('--size', type=int, default=3,
+                        help='Cube size n of an n x n x n cube; sizes other than 3 need the vbo renderer')
+    parser.add_argument('--grid', type=int, default=None,
+                        help='Show this many randomly scrambled 3x3x3 cubes in a grid, drawn with GPU instancing')
+    parser.add_argument('--max-fps', type=int, default=DEFAULT_MAX_FPS,
+                        help='Frame rate cap while animating, 0 for none')
+    parser.add_argument('--vsync', action='store_true', help='Synchronize buffer swaps with the display refresh')
+    parser.add_argument('--continuous', action='store_true',
+                        help='Redraw every frame even when nothing changes, instead of sleeping until input arrives')
+    parser.add_argument('--record', default=None, help='Append every button turn and camera drag to this session log')
+    parser.add_argument('--replay', default=None, help='Play back a session log, following it while it is written')
+    parser.add_argument('--replay-from', type=float, default=0.0, help='Seconds into the session log to start at')
+    args = parser.parse_args()
+    if (args.record or args.replay) and args.size != 3:
+        # Session logs hold 3x3x3 face turns and keyframes, so a log of another size would replay to a different cube
+        parser.error('--record and --replay need --size 3')
+
     window_size: Tuple[int, int] = PygameWindow.values()
     glu_perspective: GluPerspectiveDC = GluPerspectiveDC(fov_y=45,
                                                          aspect_ratio=window_size[0] / window_size[1],
@@ -14,7 +51,18 @@ def main():
 
     pygame_wrapper = PygameWrapper(window_size=window_size,
                                    glu_perspective=glu_perspective,
-                                   camera_pos=camera_pos)
+                                   camera_pos=camera_pos,
+                                   render_mode=CubeRenderModes(args.renderer),
+                                   profiler=FrameProfiler(enabled=args.profile or bool(args.trace)),
+                                   trace_path=args.trace,
+                                   cube_size=args.size,
+                                   grid_states=random_states(args.grid) if args.grid else None,
+                                   max_fps=args.max_fps,
+                                   vsync=args.vsync,
+                                   continuous=args.continuous,
+                                   record_path=args.record,
+                                   replay_path=args.replay,
+                                   replay_from_sec=args.replay_from)
     pygame_wrapper.run()
 
 
@@ -0,0 +1,93 @@
+import argparse
+import time
+from typing import Callable, List
+
+import pygame
+from OpenGL.GL import *
+from pygame.locals import DOUBLEBUF, HIDDEN, OPENGL
+
+from button import Button
+from data_classes import GluPerspectiveDC
+from enums import PygameWindow, RubiksCubeRotations, RubiksMoveVariations
+from glyph_cache import GlyphAtlas
+from picking import Camera, to_gl_matrix
+
+
+def draw_uncached(button: Button):
+    """
+    The per-frame label path Button.draw() used before the glyph atlas: font, surface and texture every frame.
+    The texture is deleted afterwards so the comparison does not also measure the old leak.
+    """
+    font = pygame.font.Font(None, size=button.font_size)
+    text_surface = font.render(button.text, True, button.text_color, button.background_color)
+    texture = glGenTextures(1)
+    glBindTexture(GL_TEXTURE_2D, texture)
+    glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, text_surface.get_width(), text_surface.get_height(), 0, GL_RGBA,
+                 GL_UNSIGNED_BYTE, pygame.image.tostring(text_surface, "RGBA", True))
+    glTexParameterf(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+    glTexParameterf(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
+    glEnable(GL_BLEND)
+    glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+    glEnable(GL_TEXTURE_2D)
+    glBegin(GL_QUADS)
+    glColor4f(1, 1, 1, 1)
+    for tex_coord, vertex in zip([(0.0, 1.0), (0.0, 0.0), (1.0, 0.0), (1.0, 1.0)], button.vertices):
+        glTexCoord2f(*tex_coord)
+        glVertex3fv(vertex)
+    glEnd()
+    glDisable(GL_TEXTURE_2D)
+    glDeleteTextures([texture])
+
+
+def get_buttons(camera: Camera) -> List[Button]:
+    buttons: List[Button] = []
+    for i, face in enumerate(RubiksCubeRotations.values()):
+        for j, variation in enumerate(RubiksMoveVariations.values()):
+            buttons.append(Button(None, camera,
+                                  x_px=10 + j * 110, y_px=10 + i * 55, width_px=100, height_px=50,
+                                  text_color=(255, 255, 255, 255), background_color=(0, 255, 0, 0),
+                                  text=f'{face}{variation}', face=face, angle=-90))
+    return buttons
+
+
+def time_frames(draw_frame: Callable[[], None], frames: int) -> float:
+    draw_frame()
+    glFinish()
+    start = time.perf_counter()
+    for _ in range(frames):
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        draw_frame()
+        glFinish()
+    return (time.perf_counter() - start) / frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Button label frame time before and after the glyph atlas.')
+    parser.add_argument('--frames', type=int, default=200)
+    args = parser.parse_args()
+
+    window_size = PygameWindow.values()
+    pygame.init()
+    pygame.display.set_mode(window_size, DOUBLEBUF | OPENGL | HIDDEN)
+    glMatrixMode(GL_PROJECTION)
+    camera: Camera = Camera(window_size, GluPerspectiveDC(45, window_size[0] / window_size[1], 0.1, 50.0),
+                            (0.0, -1.0, -10.0))
+    glLoadMatrixd(to_gl_matrix(camera.projection_matrix))
+    glMatrixMode(GL_MODELVIEW)
+
+    buttons: List[Button] = get_buttons(camera)
+    atlas: GlyphAtlas = GlyphAtlas()
+
+    before: float = time_frames(lambda: [draw_uncached(button) for button in buttons], args.frames)
+    after: float = time_frames(lambda: atlas.draw([(button.label_key, button.vertices) for button in buttons]),
+                               args.frames)
+    print(f'{len(buttons)} buttons, {args.frames} frames')
+    print(f'per-frame textures (before): {before * 1000:.3f} ms/frame')
+    print(f'glyph atlas (after):         {after * 1000:.3f} ms/frame  ({before / after:.1f}x, '
+          f'{atlas.uploads} uploads total)')
+    atlas.release()
+    pygame.quit()
+
+
+if __name__ == '__main__':
+    main()
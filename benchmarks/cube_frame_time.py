@@ -0,0 +1,62 @@
+import argparse
+import time
+from typing import Callable
+
+import pygame
+from OpenGL.GL import *
+from OpenGL.GLU import gluPerspective
+from pygame.locals import DOUBLEBUF, HIDDEN, OPENGL
+
+from enums import CubeRenderModes, PygameWindow
+from rubiks_cube import RubiksCube
+
+
+def time_frames(draw_frame: Callable[[], None], frames: int) -> float:
+    draw_frame()
+    glFinish()
+    start = time.perf_counter()
+    for _ in range(frames):
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        glLoadIdentity()
+        draw_frame()
+        glFinish()
+    return (time.perf_counter() - start) / frames
+
+
+def time_cube(render_mode: CubeRenderModes, frames: int, turning: bool) -> float:
+    cube: RubiksCube = RubiksCube(center_pos=(3.0, 0.0, 0.0), render_mode=render_mode)
+
+    def draw_frame():
+        if turning and not cube.is_rotating:
+            cube.rotate('R', -90)
+        cube.render()
+
+    frame_time: float = time_frames(draw_frame, frames)
+    cube.release()
+    return frame_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description='RubiksCube.render() frame time per render mode.')
+    parser.add_argument('--frames', type=int, default=200)
+    args = parser.parse_args()
+
+    window_size = PygameWindow.values()
+    pygame.init()
+    pygame.display.set_mode(window_size, DOUBLEBUF | OPENGL | HIDDEN)
+    glEnable(GL_DEPTH_TEST)
+    glMatrixMode(GL_PROJECTION)
+    gluPerspective(45, window_size[0] / window_size[1], 0.1, 50.0)
+    glTranslatef(0.0, -1.0, -10.0)
+    glMatrixMode(GL_MODELVIEW)
+
+    print(f'{"renderer":>10} {"static ms/frame":>16} {"turning ms/frame":>17}')
+    for render_mode in CubeRenderModes:
+        static: float = time_cube(render_mode, args.frames, turning=False)
+        turning: float = time_cube(render_mode, args.frames, turning=True)
+        print(f'{render_mode.value:>10} {static * 1000:>16.3f} {turning * 1000:>17.3f}')
+    pygame.quit()
+
+
+if __name__ == '__main__':
+    main()
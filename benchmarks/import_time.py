@@ -0,0 +1,80 @@
+import argparse
+import os
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+# The model and solver layer: importable by pool workers and CLI tools without PyOpenGL, pygame or a GL context
+CORE_MODULES: Tuple[str, ...] = ('cube_state', 'cubie_cube', 'coordinates', 'cube_batch', 'cube_nxn', 'move_compiler',
+                                 'move_scheduler', 'move_history', 'state_codec', 'pocket_cube', 'transposition_table',
+                                 'table_store', 'session_log', 'picking', 'bitset_bfs', 'two_phase', 'optimal_solver',
+                                 'solve_batch', 'algorithm_search', 'facelet_io', 'rubiks_cube')
+FORBIDDEN_PACKAGES: Tuple[str, ...] = ('OpenGL', 'pygame')
+# Third-party packages whose import time, stdlib modules they pull in included, is theirs; numpy takes around 100 ms
+EXTERNAL_PACKAGES: Tuple[str, ...] = ('numpy',)
+# The slowest core modules, algorithm_search and solve_batch, import in 45-60 ms from a single run on a one-vCPU
+# Xeon VM; process pools, temp directories and numpy.random load only when used, so that noise stays under budget
+DEFAULT_BUDGET_MS: float = 75.0
+
+
+def measure_imports(modules: Tuple[str, ...]) -> Dict[str, Tuple[int, int]]:
+    """
+    Returns: (self, cumulative) microseconds of every module imported by a fresh interpreter importing `modules`,
+    from its -X importtime report.
+    """
+    root: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env: Dict[str, str] = dict(os.environ, PYTHONPATH=root)
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {", ".join(modules)}'],
+                            cwd=root, env=env, capture_output=True, text=True, check=True)
+    times: Dict[str, Tuple[int, int]] = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def get_own_ms(times: Dict[str, Tuple[int, int]]) -> float:
+    """
+    Returns: Milliseconds spent importing everything but the external packages, with whatever they import in turn.
+    """
+    total_us: int = sum(self_us for self_us, _ in times.values())
+    return (total_us - sum(times[name][1] for name in EXTERNAL_PACKAGES if name in times)) / 1000
+
+
+def get_import_ms(modules: Tuple[str, ...], repeat: int) -> Tuple[float, Dict[str, Tuple[int, int]]]:
+    """
+    Returns: Best of `repeat` runs of get_own_ms, as a cold disk cache or a busy machine only ever adds time, with
+    the report of that run.
+    """
+    runs: List[Dict[str, Tuple[int, int]]] = [measure_imports(modules) for _ in range(repeat)]
+    times: Dict[str, Tuple[int, int]] = min(runs, key=get_own_ms)
+    return get_own_ms(times), times
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import time gate: every core module must import without GL or '
+                                                 'pygame, within a time budget over a bare interpreter and numpy.')
+    parser.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    # Interpreter startup is paid by every process whatever it imports
+    bare_ms, _ = get_import_ms(('sys',), args.repeat)
+    failures: List[str] = []
+    print(f'{"module":24} {"import":>10}')
+    for module in CORE_MODULES:
+        own_ms, times = get_import_ms((module,), args.repeat)
+        print(f'{module:24} {own_ms - bare_ms:8.1f}ms')
+        failures += [f'{module} imports {package}' for package in FORBIDDEN_PACKAGES if package in times]
+        if own_ms - bare_ms > args.budget_ms:
+            failures.append(f'{module} takes {own_ms - bare_ms:.1f} ms, over the {args.budget_ms:.0f} ms budget')
+    print(f'interpreter startup {bare_ms:.1f} ms; {", ".join(EXTERNAL_PACKAGES)} not counted')
+    for failure in failures:
+        print(f'FAIL: {failure}', file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+import argparse
+import time
+from typing import List
+
+import numpy as np
+
+from cube_batch import CubeBatch
+from cube_state import MOVE_COUNT
+
+
+def measure(n: int, moves_per_cube: int, seed: int = 0) -> dict:
+    rng: np.random.Generator = np.random.default_rng(seed)
+    batch: CubeBatch = CubeBatch.solved(n)
+    move_vectors: np.ndarray = rng.integers(0, MOVE_COUNT, size=(moves_per_cube, n))
+    shared_sequence: List[int] = rng.integers(0, MOVE_COUNT, size=moves_per_cube).tolist()
+
+    start = time.perf_counter()
+    for moves in move_vectors:
+        batch.apply_moves(moves)
+    per_cube_sec = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch.apply_sequence(shared_sequence)
+    shared_sec = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch.is_solved()
+    solved_sec = time.perf_counter() - start
+
+    total_moves = n * moves_per_cube
+    return {
+        'n': n,
+        'per_cube_moves_per_sec': total_moves / per_cube_sec,
+        'shared_sequence_moves_per_sec': total_moves / shared_sec,
+        'is_solved_cubes_per_sec': n / solved_sec,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Batched move engine throughput in moves/sec across N.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument('--moves', type=int, default=20, help='Moves applied to every cube')
+    args = parser.parse_args()
+
+    print(f'{"N":>10} {"per-cube moves/s":>18} {"shared seq moves/s":>20} {"is_solved cubes/s":>18}')
+    for n in args.sizes:
+        result = measure(n, args.moves)
+        print(f'{result["n"]:>10} {result["per_cube_moves_per_sec"]:>18.3e} '
+              f'{result["shared_sequence_moves_per_sec"]:>20.3e} {result["is_solved_cubes_per_sec"]:>18.3e}')
+
+
+if __name__ == '__main__':
+    main()
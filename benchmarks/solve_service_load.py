@@ -0,0 +1,131 @@
+import argparse
+import asyncio
+import json
+import time
+from collections import Counter
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from benchmarks.solver_latency import scramble_corpus
+from solve_service import DEFAULT_HOST, DEFAULT_PORT, SolveService, serve
+
+
+class ServiceClient:
+    """
+    One kept-alive HTTP/1.1 connection to the solve service.
+    """
+
+    def __init__(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, unix_path: str = None):
+        self.__address: Tuple[str, int, Optional[str]] = (host, port, unix_path)
+        self.__reader: asyncio.StreamReader = None
+        self.__writer: asyncio.StreamWriter = None
+
+    async def connect(self):
+        host, port, unix_path = self.__address
+        self.__reader, self.__writer = await asyncio.open_unix_connection(unix_path) if unix_path else \
+            await asyncio.open_connection(host, port)
+
+    async def request(self, method: str, path: str, payload: dict = None) -> Tuple[int, dict]:
+        body: bytes = json.dumps(payload).encode() if payload is not None else b''
+        self.__writer.write(f'{method} {path} HTTP/1.1\r\nHost: solver\r\nContent-Type: application/json\r\n'
+                            f'Content-Length: {len(body)}\r\n\r\n'.encode('latin-1') + body)
+        await self.__writer.drain()
+        status: int = int((await self.__reader.readline()).split()[1])
+        length: int = 0
+        while True:
+            line: bytes = await self.__reader.readline()
+            if not line.strip():
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            if name.strip().lower() == 'content-length':
+                length = int(value)
+        return status, json.loads(await self.__reader.readexactly(length))
+
+    async def close(self):
+        self.__writer.close()
+        await self.__writer.wait_closed()
+
+
+async def run_load(args: argparse.Namespace) -> Tuple[List[float], Counter, float, dict]:
+    """
+    Returns: Latency of every request, the count of every status, the wall time of the run and the service stats.
+    """
+    rng: np.random.Generator = np.random.default_rng(args.seed)
+    # A fraction of the requests repeat earlier scrambles, as tools asking for the same states again would
+    unique: List[str] = [''.join('URFDLB'[f] for f in state.facelets)
+                         for state in scramble_corpus(max(1, round(args.requests * (1 - args.repeat_fraction))),
+                                                      seed=args.seed)]
+    scrambles: List[str] = [unique[i] if i < len(unique) else unique[rng.integers(len(unique))]
+                            for i in range(args.requests)]
+    scrambles = [scrambles[i] for i in rng.permutation(len(scrambles))]
+
+    service: Optional[SolveService] = None
+    server: Optional[asyncio.AbstractServer] = None
+    if not args.connect:
+        service = SolveService(workers=args.workers, max_batch=args.max_batch, max_pending=args.max_pending,
+                               table_dir=args.table_dir)
+        server = await serve(service, args.host, args.port, args.unix)
+
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    next_request: List[int] = [0]
+
+    async def client_loop():
+        client: ServiceClient = ServiceClient(args.host, args.port, args.unix)
+        await client.connect()
+        while next_request[0] < len(scrambles):
+            facelets: str = scrambles[next_request[0]]
+            next_request[0] += 1
+            start: float = time.perf_counter()
+            status, _ = await client.request('POST', '/solve', {'facelets': facelets,
+                                                                'deadline_ms': args.deadline_ms})
+            latencies.append(time.perf_counter() - start)
+            statuses[status] += 1
+        await client.close()
+
+    start: float = time.perf_counter()
+    await asyncio.gather(*(client_loop() for _ in range(args.concurrency)))
+    elapsed: float = time.perf_counter() - start
+
+    client: ServiceClient = ServiceClient(args.host, args.port, args.unix)
+    await client.connect()
+    _, stats = await client.request('GET', '/stats')
+    await client.close()
+    if server is not None:
+        server.close()
+        await server.wait_closed()
+        service.close()
+    return latencies, statuses, elapsed, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load generator for the solve service: concurrent kept-alive '
+                                                 'clients, reporting throughput and tail latency.')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--repeat-fraction', type=float, default=0.25,
+                        help='Share of requests for a scramble already sent, served from the cache')
+    parser.add_argument('--deadline-ms', type=float, default=5000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--unix', default=None)
+    parser.add_argument('--connect', action='store_true', help='Load a running service instead of starting one')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--max-batch', type=int, default=64)
+    parser.add_argument('--max-pending', type=int, default=1024)
+    parser.add_argument('--table-dir', default=None)
+    args = parser.parse_args()
+
+    latencies, statuses, elapsed, stats = asyncio.run(run_load(args))
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+    print(f'{len(latencies)} requests in {elapsed:.2f} s: {len(latencies) / elapsed:.1f} req/s')
+    print(f'latency ms: p50 {p50:.1f}  p95 {p95:.1f}  p99 {p99:.1f}  max {max(latencies) * 1000:.1f}')
+    print('status: ' + '  '.join(f'{status} x{count}' for status, count in sorted(statuses.items())))
+    print(f'service: {stats["solved"]} solved, {stats["cache_hits"]} cache hits, {stats["batches"]} batches of '
+          f'{stats["mean_batch_size"]:.1f} on average, {stats["rejected"]} rejected, {stats["expired"]} expired')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+import argparse
+import time
+from typing import List
+
+import numpy as np
+
+from cube_state import MOVE_COUNT, CubeState
+from table_store import TableStore
+from two_phase import TwoPhaseSolver
+
+
+def scramble_corpus(count: int, length: int = 25, seed: int = 0) -> List[CubeState]:
+    rng: np.random.Generator = np.random.default_rng(seed)
+    return [CubeState().apply_moves(rng.integers(0, MOVE_COUNT, size=length).tolist()) for _ in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Two-phase solver table load time and per-state latency.')
+    parser.add_argument('--count', type=int, default=100)
+    parser.add_argument('--max-length', type=int, default=21)
+    parser.add_argument('--timeout', type=float, default=0.05)
+    parser.add_argument('--table-dir', default=None)
+    args = parser.parse_args()
+
+    store: TableStore = TableStore(args.table_dir)
+    start = time.perf_counter()
+    TwoPhaseSolver(store)
+    print(f'first load (builds missing tables): {time.perf_counter() - start:.3f} s')
+
+    start = time.perf_counter()
+    solver: TwoPhaseSolver = TwoPhaseSolver(TableStore(args.table_dir))
+    print(f'cold load from memory-mapped tables: {(time.perf_counter() - start) * 1000:.1f} ms')
+
+    latencies: List[float] = []
+    lengths: List[int] = []
+    for state in scramble_corpus(args.count):
+        start = time.perf_counter()
+        solution: str = solver.solve(state, args.max_length, args.timeout)
+        latencies.append(time.perf_counter() - start)
+        lengths.append(len(solution.split()))
+
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+    print(f'latency ms: p50 {p50:.1f}  p95 {p95:.1f}  p99 {p99:.1f}  max {max(latencies) * 1000:.1f}')
+    print(f'solution length: mean {np.mean(lengths):.2f}  max {max(lengths)}')
+
+
+if __name__ == '__main__':
+    main()
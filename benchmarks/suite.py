@@ -0,0 +1,405 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from platform import node, python_version
+from typing import Callable, Dict, List, Optional
+
+# frame_export points SDL and PyOpenGL at offscreen/EGL before either is imported, so the GL benchmarks run headless
+from frame_export import OffscreenContext
+
+import numpy as np
+from OpenGL.GL import *
+from OpenGL.GLU import gluPerspective
+
+from algorithm_search import AlgorithmSearch, TargetPattern
+from benchmarks.solver_latency import scramble_corpus
+from cube_batch import CubeBatch
+from cube_grid import CubeGrid
+from cube_nxn import CubeStateNxN, LayerTurn
+from cube_state import MOVE_COUNT, CubeState
+from data_classes import GluPerspectiveDC, SearchStats
+from enums import CubeRenderModes, PygameWindow
+from facelet_io import format_facelet_lines, parse_facelet_lines, validate_facelets
+from move_history import MoveHistory
+from move_scheduler import ManualClock
+from picking import Camera, CubePicker
+from pocket_cube import PocketSolver
+from rubiks_cube import RubiksCube
+from session_log import SessionReader, SessionWriter
+from state_codec import encode_facelets
+from table_store import TableStore
+from transposition_table import TranspositionTable
+from two_phase import TwoPhaseSolver
+
+DEFAULT_RESULTS_DIR: str = os.path.join(os.path.dirname(__file__), 'results')
+DEFAULT_THRESHOLD: float = 0.25
+
+Benchmark = Callable[[argparse.Namespace], List[float]]
+BENCHMARKS: Dict[str, Benchmark] = {}
+
+
+def benchmark(name: str):
+    """
+    Registers a benchmark. It returns per-operation times in seconds, one sample per repeat; lower is better.
+    """
+    def register(function: Benchmark) -> Benchmark:
+        BENCHMARKS[name] = function
+        return function
+    return register
+
+
+def time_per_call(function: Callable[[], None], repeat: int, number: int) -> List[float]:
+    function()
+    samples: List[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        samples.append((time.perf_counter() - start) / number)
+    return samples
+
+
+@benchmark('cube_construction.vbo')
+def cube_construction_vbo(args: argparse.Namespace) -> List[float]:
+    return time_per_call(lambda: RubiksCube((3.0, 0.0, 0.0), render_mode=CubeRenderModes.VBO).init_renderer(),
+                         args.repeat, 20)
+
+
+@benchmark('cube_construction.immediate')
+def cube_construction_immediate(args: argparse.Namespace) -> List[float]:
+    return time_per_call(lambda: RubiksCube((3.0, 0.0, 0.0), render_mode=CubeRenderModes.IMMEDIATE).init_renderer(),
+                         args.repeat, 5)
+
+
+def time_render(render_mode: CubeRenderModes, turning: bool, args: argparse.Namespace) -> List[float]:
+    clock: ManualClock = ManualClock()
+    cube: RubiksCube = RubiksCube((3.0, 0.0, 0.0), render_mode=render_mode, clock=clock)
+
+    def frame():
+        if turning:
+            if not cube.is_rotating:
+                cube.rotate('R', -90)
+            clock.advance(1 / 60)
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        glLoadIdentity()
+        cube.render()
+        glFinish()
+
+    samples: List[float] = time_per_call(frame, args.repeat, 20)
+    cube.release()
+    return samples
+
+
+for _mode in CubeRenderModes:
+    for _turning in (False, True):
+        benchmark(f'render_frame.{_mode.value}.{"turning" if _turning else "static"}')(
+            lambda args, mode=_mode, turning=_turning: time_render(mode, turning, args))
+
+
+def time_grid_render(count: int, turning: bool, args: argparse.Namespace) -> List[float]:
+    clock: ManualClock = ManualClock()
+    grid: CubeGrid = CubeGrid((3.0, 0.0, 0.0), random_batch(count, args.seed).states, clock=clock)
+
+    def frame():
+        if turning:
+            if not grid.is_rotating:
+                grid.rotate('R', -90)
+            clock.advance(1 / 60)
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        glLoadIdentity()
+        grid.render()
+        glFinish()
+
+    samples: List[float] = time_per_call(frame, args.repeat, 20)
+    grid.release()
+    return samples
+
+
+for _turning in (False, True):
+    benchmark(f'render_frame.instanced_1024.{"turning" if _turning else "static"}')(
+        lambda args, turning=_turning: time_grid_render(1024, turning, args))
+
+
+@benchmark('moves.single')
+def moves_single(args: argparse.Namespace) -> List[float]:
+    moves: List[int] = np.random.default_rng(args.seed).integers(0, MOVE_COUNT, size=1000).tolist()
+    state: CubeState = CubeState()
+
+    def apply():
+        for move in moves:
+            state.apply_move(move)
+    return [sample / len(moves) for sample in time_per_call(apply, args.repeat, 5)]
+
+
+@benchmark('moves.batched')
+def moves_batched(args: argparse.Namespace) -> List[float]:
+    n: int = 100_000
+    batch: CubeBatch = CubeBatch.solved(n)
+    moves: np.ndarray = np.random.default_rng(args.seed).integers(0, MOVE_COUNT, size=n)
+    return [sample / n for sample in time_per_call(lambda: batch.apply_moves(moves), args.repeat, 5)]
+
+
+def time_layer_moves(n: int, args: argparse.Namespace) -> List[float]:
+    rng: np.random.Generator = np.random.default_rng(args.seed)
+    starts: np.ndarray = rng.integers(0, n, size=1000)
+    turns: List[LayerTurn] = [LayerTurn('URFDLB'[face], int(start), int(start) + 1, int(quarters))
+                              for face, start, quarters in zip(rng.integers(0, 6, size=1000), starts,
+                                                               rng.integers(1, 4, size=1000))]
+    state: CubeStateNxN = CubeStateNxN(n)
+    return [sample / len(turns) for sample in time_per_call(lambda: state.apply_moves(turns), args.repeat, 1)]
+
+
+for _n in (3, 10, 100):
+    benchmark(f'moves.nxn_{_n}')(lambda args, n=_n: time_layer_moves(n, args))
+
+
+def random_batch(n: int, seed: int) -> CubeBatch:
+    rng: np.random.Generator = np.random.default_rng(seed)
+    batch: CubeBatch = CubeBatch.solved(n)
+    for _ in range(30):
+        batch.apply_moves(rng.integers(0, MOVE_COUNT, size=n))
+    return batch
+
+
+@benchmark('state_codec.encode')
+def state_codec_encode(args: argparse.Namespace) -> List[float]:
+    n: int = 1_000_000
+    states: np.ndarray = random_batch(n, args.seed).states
+    return [sample / n for sample in time_per_call(lambda: encode_facelets(states), args.repeat, 1)]
+
+
+@benchmark('scramble.uniform')
+def scramble_uniform(args: argparse.Namespace) -> List[float]:
+    """
+    Uniformly random legal states as facelets, per state.
+    """
+    n: int = 1_000_000
+    rng: np.random.Generator = np.random.default_rng(args.seed)
+    return [sample / n for sample in time_per_call(lambda: CubeBatch.random(n, rng), args.repeat, 1)]
+
+
+@benchmark('facelet_io.ingest')
+def facelet_io_ingest(args: argparse.Namespace) -> List[float]:
+    """
+    Parsing and validating facelet strings, per state.
+    """
+    n: int = 1_000_000
+    data: bytes = format_facelet_lines(CubeBatch.random(n, np.random.default_rng(args.seed)).states)
+    return [sample / n for sample in time_per_call(lambda: validate_facelets(parse_facelet_lines(data)),
+                                                   args.repeat, 1)]
+
+
+@benchmark('transposition_table.probe_many')
+def transposition_table_probe_many(args: argparse.Namespace) -> List[float]:
+    n: int = 100_000
+    corners, edges = encode_facelets(random_batch(n, args.seed).states)
+    table: TranspositionTable = TranspositionTable()
+    table.store_many(corners[::2], edges[::2], np.zeros(n // 2, dtype=np.int32), np.ones(n // 2, dtype=np.uint8))
+    return [sample / n for sample in time_per_call(lambda: table.probe_many(corners, edges), args.repeat, 5)]
+
+
+@benchmark('session_log.seek')
+def session_log_seek(args: argparse.Namespace) -> List[float]:
+    n: int = 100_000
+    rng: np.random.Generator = np.random.default_rng(args.seed)
+    with tempfile.TemporaryDirectory() as directory:
+        path: str = os.path.join(directory, 'session.log')
+        now: List[float] = [0.0]
+        writer: SessionWriter = SessionWriter(path, clock=lambda: now[0])
+        for move in rng.integers(0, MOVE_COUNT, size=n).tolist():
+            now[0] += 0.05
+            writer.record_move(move)
+        writer.close()
+        reader: SessionReader = SessionReader(path)
+        indices: List[int] = rng.integers(0, n, size=100).tolist()
+
+        def seek():
+            for index in indices:
+                reader.seek(index)
+        samples: List[float] = [sample / len(indices) for sample in time_per_call(seek, args.repeat, 1)]
+        reader.close()
+    return samples
+
+
+@benchmark('history.jump')
+def history_jump(args: argparse.Namespace) -> List[float]:
+    rng: np.random.Generator = np.random.default_rng(args.seed)
+    history: MoveHistory = MoveHistory()
+    for move in rng.integers(0, MOVE_COUNT, size=200_000).tolist():
+        history.record(move)
+    # Back and forth by 100k steps
+    targets: List[int] = [100_000, 200_000] * 50
+
+    def jump():
+        for target in targets:
+            history.jump(target)
+    return [sample / len(targets) for sample in time_per_call(jump, args.repeat, 1)]
+
+
+@benchmark('picking.drag')
+def picking_drag(args: argparse.Namespace) -> List[float]:
+    """
+    A press and a drag on the orbited cube: two rays, the pick and the turn, with the camera matrices cached.
+    """
+    window_size = PygameWindow.values()
+    camera: Camera = Camera(window_size, GluPerspectiveDC(45, window_size[0] / window_size[1], 0.1, 50.0),
+                            (0.0, -1.0, -10.0))
+    cube: RubiksCube = RubiksCube(center_pos=(3.0, 0.0, 0.0))
+    picker: CubePicker = CubePicker(*cube.get_bounds())
+    camera.set_pivot(picker.center)
+    camera.set_angles(30.0, 20.0)
+    rng: np.random.Generator = np.random.default_rng(args.seed)
+    presses: List[List[int]] = rng.integers(0, min(window_size), size=(100, 2)).tolist()
+
+    def drag():
+        for x, y in presses:
+            hit = picker.pick(*camera.get_ray(x, y))
+            if hit is not None:
+                picker.get_turn(hit, *camera.get_ray(x + 40, y))
+    return [sample / len(presses) for sample in time_per_call(drag, args.repeat, 1)]
+
+
+@benchmark('pocket.solve_many')
+def pocket_solve_many(args: argparse.Namespace) -> List[float]:
+    """
+    Optimal 2x2x2 solutions from the whole-space table, per state, for scrambles turning every face and the cube.
+    """
+    solver: PocketSolver = PocketSolver(TableStore(args.table_dir))
+    rng: np.random.Generator = np.random.default_rng(args.seed)
+    moves: List[str] = [f'{face}{variation}' for face in 'URFDLBxyz' for variation in ('', "'", '2')]
+    scrambles: np.ndarray = np.array([CubeStateNxN(2).apply_moves(rng.choice(moves, 25).tolist()).facelets
+                                      for _ in range(1000)])
+    stickers: np.ndarray = np.tile(scrambles, (100, 1))
+    return [sample / len(stickers) for sample in time_per_call(lambda: solver.solve_many(stickers), args.repeat, 1)]
+
+
+@benchmark('search.meet_in_middle')
+def search_meet_in_middle(args: argparse.Namespace) -> List[float]:
+    """
+    Meet-in-the-middle search of every 10-move sequence with the effect of a T-perm, per half sequence enumerated.
+    """
+    search: AlgorithmSearch = AlgorithmSearch(TargetPattern.from_moves("R U R' U' R' F R2 U' R' U' R U R' F'"),
+                                              processes=1)
+    samples: List[float] = []
+    for _ in range(args.repeat):
+        search.stats = SearchStats()
+        start = time.perf_counter()
+        search.search_depth(10)
+        samples.append((time.perf_counter() - start) / search.stats.nodes)
+    return samples
+
+
+@benchmark('solver.two_phase')
+def solver_two_phase(args: argparse.Namespace) -> List[float]:
+    """
+    One sample per state of the seeded scramble corpus, so the percentiles are the solver latency distribution.
+    """
+    solver: TwoPhaseSolver = TwoPhaseSolver(TableStore(args.table_dir))
+    samples: List[float] = []
+    for state in scramble_corpus(args.solver_count, seed=args.seed):
+        start = time.perf_counter()
+        solver.solve(state)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+    return {'unit': 's', 'samples': len(samples), 'min': min(samples), 'median': p50, 'p95': p95, 'p99': p99}
+
+
+def get_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], threshold: float) -> List[str]:
+    """
+    Returns: One line per benchmark in both whose median got slower than the baseline median by more than threshold.
+    """
+    regressions: List[str] = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio: float = result['median'] / baseline[name]['median']
+        if ratio > 1 + threshold:
+            regressions.append(f'{name}: {baseline[name]["median"] * 1e6:.2f} us -> {result["median"] * 1e6:.2f} us '
+                               f'({ratio:.2f}x)')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark suite: results are saved per commit and can be compared '
+                                                 'against a baseline, failing the run on regressions.')
+    parser.add_argument('--filter', default='', help='Only run benchmarks whose name contains this')
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--solver-count', type=int, default=50, help='Size of the seeded solver scramble corpus')
+    parser.add_argument('--table-dir', default=None)
+    parser.add_argument('--output', default=None, help='Result file, default results/<commit>.json')
+    parser.add_argument('--compare', default=None, help='Baseline result file to check for regressions')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='Allowed slowdown of a median before the run fails, as a fraction')
+    args = parser.parse_args()
+    output: str = args.output or os.path.join(DEFAULT_RESULTS_DIR, f'{get_commit()}.json')
+    baseline: Optional[Dict[str, dict]] = None
+    if args.compare:
+        # The default output is named after HEAD, which is also the usual baseline while benchmarking uncommitted work
+        if os.path.abspath(output) == os.path.abspath(args.compare):
+            parser.error(f'--output would overwrite the --compare baseline {args.compare}; pass another --output')
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+
+    window_size = PygameWindow.values()
+    context: OffscreenContext = OffscreenContext(*window_size)
+    glEnable(GL_DEPTH_TEST)
+    glMatrixMode(GL_PROJECTION)
+    gluPerspective(45, window_size[0] / window_size[1], 0.1, 50.0)
+    glTranslatef(0.0, -1.0, -10.0)
+    glMatrixMode(GL_MODELVIEW)
+
+    results: Dict[str, dict] = {}
+    print(f'{"benchmark":<36} {"median":>12} {"p95":>12} {"p99":>12}')
+    for name, function in BENCHMARKS.items():
+        if args.filter not in name:
+            continue
+        results[name] = summarize(function(args))
+        print(f'{name:<36} {results[name]["median"] * 1e6:>10.2f}us {results[name]["p95"] * 1e6:>10.2f}us '
+              f'{results[name]["p99"] * 1e6:>10.2f}us')
+    context.release()
+
+    commit: str = get_commit()
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({'commit': commit, 'date': time.time(), 'machine': node(), 'python': python_version(),
+                   'params': {'repeat': args.repeat, 'seed': args.seed, 'solver_count': args.solver_count},
+                   'results': results}, f, indent=2)
+    print(f'results written to {output}')
+
+    if baseline is not None:
+        # Benchmarks added or renamed since the baseline cannot regress silently: name them, and fail if none overlap
+        for name in sorted(results.keys() - baseline.keys()):
+            print(f'NOT IN BASELINE {name}')
+        for name in sorted(baseline.keys() - results.keys()):
+            if args.filter in name:
+                print(f'NOT RUN {name}: in the baseline but no longer in the suite')
+        if not results.keys() & baseline.keys():
+            print(f'nothing to compare: no benchmark run is in {args.compare}')
+            sys.exit(1)
+        regressions: List[str] = compare(results, baseline, args.threshold)
+        for line in regressions:
+            print(f'REGRESSION {line}')
+        if regressions:
+            sys.exit(1)
+        print(f'no regressions beyond {args.threshold:.0%} against {args.compare}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+import os
+from abc import ABC, abstractmethod
+from typing import Iterable, List, Tuple
+
+import numpy as np
+
+UNKNOWN_DISTANCE: int = 0xF
+DEFAULT_CHUNK_SIZE: int = 1 << 18
+
+
+class StateSpace(ABC):
+    """
+    A ranked state space: every state is an integer in [0, size). Instances are pickled into BFS worker processes.
+    """
+
+    @property
+    @abstractmethod
+    def size(self) -> int:
+        pass
+
+    @abstractmethod
+    def neighbours(self, indices: np.ndarray) -> np.ndarray:
+        """
+        Returns: (len(indices), moves) ranks of the states one move away.
+        """
+        pass
+
+
+def nibble_get(table: np.ndarray, indices: np.ndarray) -> np.ndarray:
+    indices = np.asarray(indices, dtype=np.int64)
+    return (table[indices >> 1] >> ((indices & 1) << 2).astype(np.uint8)) & 0xF
+
+
+def nibble_set(table: np.ndarray, indices: np.ndarray, value: int):
+    """
+    Sets the 4-bit entries at distinct indices. Even and odd entries are written separately so two entries
+    sharing one byte never race within a single fancy-indexed assignment.
+    """
+    indices = np.asarray(indices, dtype=np.int64)
+    low: np.ndarray = indices[(indices & 1) == 0] >> 1
+    table[low] = (table[low] & 0xF0) | value
+    high: np.ndarray = indices[(indices & 1) == 1] >> 1
+    table[high] = (table[high] & 0x0F) | (value << 4)
+
+
+def bitset_set(bits: np.ndarray, indices: np.ndarray):
+    indices = np.asarray(indices, dtype=np.int64)
+    np.bitwise_or.at(bits, indices >> 3, np.left_shift(1, indices & 7).astype(np.uint8))
+
+
+def bitset_test(bits: np.ndarray, indices: np.ndarray) -> np.ndarray:
+    indices = np.asarray(indices, dtype=np.int64)
+    return ((bits[indices >> 3] >> (indices & 7).astype(np.uint8)) & 1).astype(bool)
+
+
+def bitset_indices(bits: np.ndarray, start: int, stop: int) -> np.ndarray:
+    """
+    Returns: Indices of set bits in [start, stop); start must be a multiple of 8.
+    """
+    flags: np.ndarray = np.unpackbits(bits[start >> 3:(stop + 7) >> 3], bitorder='little')[:stop - start]
+    return np.flatnonzero(flags) + start
+
+
+_worker_space: StateSpace = None
+_worker_frontier: np.ndarray = None
+_worker_visited: np.ndarray = None
+
+
+def _init_worker(space: StateSpace, frontier_path: str, visited_path: str, byte_count: int):
+    global _worker_space, _worker_frontier, _worker_visited
+    _worker_space = space
+    _worker_frontier = np.memmap(frontier_path, dtype=np.uint8, mode='r', shape=(byte_count,))
+    _worker_visited = np.memmap(visited_path, dtype=np.uint8, mode='r', shape=(byte_count,))
+
+
+def _expand_chunk(bounds: Tuple[int, int]) -> np.ndarray:
+    frontier: np.ndarray = bitset_indices(_worker_frontier, *bounds)
+    if frontier.size == 0:
+        return frontier
+    reached: np.ndarray = _worker_space.neighbours(frontier).reshape(-1)
+    return reached[~bitset_test(_worker_visited, reached)]
+
+
+def build_distance_table(space: StateSpace, goals: Iterable[int], processes: int = None,
+                         chunk_size: int = DEFAULT_CHUNK_SIZE, verbose: bool = False) -> np.ndarray:
+    """
+    Breadth-first search from the goal states over the whole space. The frontier and the visited set are bitsets
+    in memory-mapped scratch files shared with a pool of workers, each expanding a slice of the frontier per level.
+
+    Returns: Packed 4-bit distance table, UNKNOWN_DISTANCE for unreachable states.
+    """
+    # Imported here rather than at load, where they would cost every solver importer that finds its tables built
+    import multiprocessing
+    import tempfile
+    size: int = space.size
+    byte_count: int = (size + 7) // 8
+    distances: np.ndarray = np.full((size + 1) // 2, 0xFF, dtype=np.uint8)
+    goals = np.unique(np.fromiter(goals, dtype=np.int64))
+
+    with tempfile.TemporaryDirectory(prefix='rubiks_bfs_') as scratch:
+        frontier_path: str = os.path.join(scratch, 'frontier.bits')
+        visited_path: str = os.path.join(scratch, 'visited.bits')
+        frontier: np.ndarray = np.memmap(frontier_path, dtype=np.uint8, mode='w+', shape=(byte_count,))
+        visited: np.ndarray = np.memmap(visited_path, dtype=np.uint8, mode='w+', shape=(byte_count,))
+        bitset_set(frontier, goals)
+        bitset_set(visited, goals)
+        nibble_set(distances, goals, 0)
+
+        chunks: List[Tuple[int, int]] = [(start, min(start + chunk_size, size)) for start in range(0, size, chunk_size)]
+        # Spawned rather than forked: tables are built lazily, inside processes that may run GL or other threads
+        context = multiprocessing.get_context('spawn')
+        with context.Pool(processes or os.cpu_count(), initializer=_init_worker,
+                          initargs=(space, frontier_path, visited_path, byte_count)) as pool:
+            depth: int = 0
+            reached_count: int = goals.size
+            while reached_count:
+                if depth + 1 >= UNKNOWN_DISTANCE:
+                    raise ValueError(f'Distances beyond {UNKNOWN_DISTANCE - 1} do not fit in a nibble')
+                frontier.flush()
+                visited.flush()
+                next_frontier: np.ndarray = np.zeros(byte_count, dtype=np.uint8)
+                for reached in pool.imap_unordered(_expand_chunk, chunks):
+                    bitset_set(next_frontier, reached)
+                # Workers filtered against the visited set of the previous level only
+                next_frontier &= ~visited
+                visited |= next_frontier
+                frontier[:] = next_frontier
+                depth += 1
+                reached_count = 0
+                for start, stop in chunks:
+                    reached = bitset_indices(next_frontier, start, stop)
+                    nibble_set(distances, reached, depth)
+                    reached_count += reached.size
+                if verbose:
+                    print(f'depth {depth}: {reached_count} states')
+            del frontier, visited
+    return distances
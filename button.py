@@ -1,20 +1,20 @@
 from typing import Tuple, List
 
-import pygame
-from OpenGL.GL import *
-from OpenGL.GLU import gluUnProject
+import numpy as np
 
 from enums import RubiksCubeRotations
+from glyph_cache import GlyphAtlas, LabelKey
+from picking import Camera
 from rubiks_cube import RubiksCube
 
 
 class Button:
-    def __init__(self, rubiks_cube: RubiksCube, window_size,
+    def __init__(self, rubiks_cube: RubiksCube, camera: Camera,
                  x_px, y_px, width_px, height_px,
                  text_color, background_color,
-                 text, face: str, angle: int):
+                 text, face: str, angle: int, font_size: int = 200):
         self.rubiks_cube: RubiksCube = rubiks_cube
-        self.window_size: Tuple[int, int] = window_size
+        self.camera: Camera = camera
         self.x_px: float = x_px
         self.y_px: float = y_px
         self.z: float = 0.0
@@ -23,24 +23,15 @@ class Button:
         self.text_color: Tuple[int, int, int, int] = text_color
         self.background_color: Tuple[int, int, int, int] = background_color
         self.text: str = text
+        self.font_size: int = font_size
 
         self.face = face
         self.angle = angle
         self.vertices: List[Tuple] = self.get_world_vertices()
 
-    @staticmethod
-    def convert_screen_to_world(winx, winy, winz=0):
-        glLoadIdentity()
-        viewport = glGetIntegerv(GL_VIEWPORT)
-        modelview = glGetDoublev(GL_MODELVIEW_MATRIX)
-        projection = glGetDoublev(GL_PROJECTION_MATRIX)
-        world_x, world_y, world_z = gluUnProject(winX=winx, winY=winy, winZ=winz,
-                                                 model=modelview, proj=projection, view=viewport)
-        return world_x, world_y, world_z
-
     def get_world_vertices(self):
         # Need to make y relative to top instead of bottom
-        winy = self.window_size[1] - self.y_px
+        winy = self.camera.window_size[1] - self.y_px
         winy_bottom = winy - self.height_px
 
         top_left = (self.x_px, winy, self.z)
@@ -50,43 +41,15 @@ class Button:
 
         screen_vertices = [top_left, bottom_left, bottom_right, top_right]
 
-        return [self.convert_screen_to_world(*_) for _ in screen_vertices]
-
-    def draw(self):
-        # Create font and render text onto a surface
-        font = pygame.font.Font(None, size=200)
-        text_surface = font.render(self.text, True, self.text_color, self.background_color)
-
-        # Create texture from the text surface
-        texture = glGenTextures(1)
-        glBindTexture(GL_TEXTURE_2D, texture)
-        glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, text_surface.get_width(), text_surface.get_height(), 0, GL_RGBA,
-                     GL_UNSIGNED_BYTE, pygame.image.tostring(text_surface, "RGBA", True))
-        glTexParameterf(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-        glTexParameterf(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
-
-        # Enable alpha blending
-        glEnable(GL_BLEND)
-        glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+        # One batch through the camera's cached inverse matrix, instead of GL readbacks and gluUnProject per vertex
+        return [tuple(vertex) for vertex in self.camera.unproject(np.array(screen_vertices)).tolist()]
 
-        # Bind texture and render quad
-        glEnable(GL_TEXTURE_2D)
-        glBindTexture(GL_TEXTURE_2D, texture)
-        t = 1
-        quad_tex_coords = [
-            (0.0, t),
-            (0.0, 0.0),
-            (t, 0.0),
-            (t, t),
-        ]
-        glBegin(GL_QUADS)
-        glColor4f(1, 1, 1, 1)
-        for i, vertex in enumerate(self.vertices):
-            glTexCoord2f(*quad_tex_coords[i])
-            glVertex3fv(vertex)
-        glEnd()
+    @property
+    def label_key(self) -> LabelKey:
+        return self.text, self.text_color, self.background_color, self.font_size
 
-        glDisable(GL_TEXTURE_2D)
+    def draw(self, glyph_atlas: GlyphAtlas):
+        glyph_atlas.draw([(self.label_key, self.vertices)])
 
     def is_clicked(self, pos):
         x, y = pos
@@ -0,0 +1,140 @@
+from math import comb, factorial
+from typing import List
+
+import numpy as np
+
+# Vectorized rank/unrank helpers. Every function works on a leading batch axis: (N, n) arrays in, (N,) ranks out.
+# Rows are split into contiguous per-position columns first, since numpy reductions over a short last axis are slow.
+
+
+def get_columns(rows: np.ndarray) -> List[np.ndarray]:
+    return list(np.ascontiguousarray(np.moveaxis(np.asarray(rows, dtype=np.int64), -1, 0)))
+
+
+def stack_columns(columns: List[np.ndarray], dtype=np.uint8) -> np.ndarray:
+    return np.stack(columns, axis=-1).astype(dtype)
+
+
+def rank_permutation(perms: np.ndarray) -> np.ndarray:
+    """
+    Returns: Lehmer rank in [0, n!) of each row of a (N, n) permutation array.
+    """
+    columns: List[np.ndarray] = get_columns(perms)
+    n: int = len(columns)
+    ranks: np.ndarray = np.zeros(columns[0].shape, dtype=np.int64)
+    for i in range(n - 1):
+        smaller: np.ndarray = np.zeros_like(ranks)
+        for j in range(i + 1, n):
+            smaller += columns[j] < columns[i]
+        ranks += smaller * factorial(n - 1 - i)
+    return ranks
+
+
+def unrank_permutation(ranks: np.ndarray, n: int) -> np.ndarray:
+    ranks = np.asarray(ranks, dtype=np.int64)
+    return lehmer_to_permutation([(ranks // factorial(n - 1 - i)) % (n - i) for i in range(n)])
+
+
+def lehmer_to_permutation(columns: List[np.ndarray]) -> np.ndarray:
+    """
+    Returns: (N, n) permutations of n Lehmer digit columns, digit i in [0, n - i); the columns are overwritten.
+    """
+    n: int = len(columns)
+    # Turn the Lehmer digits into values, right to left
+    for i in range(n - 2, -1, -1):
+        for j in range(i + 1, n):
+            columns[j] += columns[j] >= columns[i]
+    return stack_columns(columns)
+
+
+def rank_orientation(orientations: np.ndarray, base: int, free: int) -> np.ndarray:
+    """
+    Returns: Base-`base` number formed by the first `free` orientations of each row.
+    """
+    return rank_orientation_columns(get_columns(orientations), base, free)
+
+
+def rank_orientation_columns(columns: List[np.ndarray], base: int, free: int) -> np.ndarray:
+    ranks: np.ndarray = np.zeros(columns[0].shape, dtype=np.int64)
+    for i in range(free):
+        ranks *= base
+        ranks += columns[i]
+    return ranks
+
+
+def unrank_orientation(ranks: np.ndarray, base: int, free: int, n: int) -> np.ndarray:
+    """
+    Inverse of rank_orientation. When free == n - 1 the last orientation is fixed by the zero-sum rule.
+    """
+    ranks = np.asarray(ranks, dtype=np.int64)
+    columns: List[np.ndarray] = [np.zeros_like(ranks) for _ in range(n)]
+    for i in range(free - 1, -1, -1):
+        columns[i] = ranks % base
+        ranks = ranks // base
+    if free == n - 1:
+        columns[n - 1] = (-sum(columns[:n - 1])) % base
+    return stack_columns(columns)
+
+
+def rank_combination(occupied: np.ndarray) -> np.ndarray:
+    """
+    Returns: Colex rank in [0, C(n, k)) of the set of True positions of each (N, n) boolean row.
+    """
+    columns: List[np.ndarray] = get_columns(occupied)
+    n: int = len(columns)
+    binomials: np.ndarray = np.array([[comb(j, k) for k in range(n + 1)] for j in range(n)], dtype=np.int64)
+    ranks: np.ndarray = np.zeros(columns[0].shape, dtype=np.int64)
+    seen: np.ndarray = np.zeros_like(ranks)
+    for j in range(n):
+        ranks += np.where(columns[j] > 0, binomials[j, seen + 1], 0)
+        seen += columns[j]
+    return ranks
+
+
+def unrank_combination(ranks: np.ndarray, n: int, k: int) -> np.ndarray:
+    ranks = np.asarray(ranks, dtype=np.int64).copy()
+    columns: List[np.ndarray] = [np.zeros(ranks.shape, dtype=bool) for _ in range(n)]
+    remaining: np.ndarray = np.full(ranks.shape, k, dtype=np.int64)
+    binomials: np.ndarray = np.array([[comb(j, i) for i in range(k + 1)] for j in range(n)], dtype=np.int64)
+    for j in range(n - 1, -1, -1):
+        value: np.ndarray = binomials[j, remaining]
+        take: np.ndarray = (remaining > 0) & (ranks >= value)
+        columns[j] = take
+        ranks -= np.where(take, value, 0)
+        remaining -= take
+    return stack_columns(columns, dtype=bool)
+
+
+def count_partial_permutations(n: int, k: int) -> int:
+    return factorial(n) // factorial(n - k)
+
+
+def rank_partial_permutation(positions: np.ndarray, n: int) -> np.ndarray:
+    """
+    Returns: Rank in [0, n! / (n - k)!) of each row of k distinct positions drawn from range(n), order significant.
+    """
+    return rank_partial_permutation_columns(get_columns(positions), n)
+
+
+def rank_partial_permutation_columns(columns: List[np.ndarray], n: int) -> np.ndarray:
+    k: int = len(columns)
+    ranks: np.ndarray = np.zeros(columns[0].shape, dtype=np.int64)
+    for i in range(k):
+        # Number of still unused positions below positions[i]
+        digit: np.ndarray = columns[i].copy()
+        for j in range(i):
+            digit -= columns[j] < columns[i]
+        ranks += digit * count_partial_permutations(n - 1 - i, k - 1 - i)
+    return ranks
+
+
+def unrank_partial_permutation(ranks: np.ndarray, n: int, k: int) -> np.ndarray:
+    ranks = np.asarray(ranks, dtype=np.int64)
+    columns: List[np.ndarray] = []
+    for i in range(k):
+        # The digit-th unused position: shift the digit past every earlier position at or below it, smallest first
+        position: np.ndarray = (ranks // count_partial_permutations(n - 1 - i, k - 1 - i)) % (n - i)
+        for used in np.sort(np.stack(columns), axis=0) if columns else []:
+            position += used <= position
+        columns.append(position)
+    return stack_columns(columns)
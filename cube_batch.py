@@ -0,0 +1,97 @@
+from typing import Iterable, Tuple, Union
+
+import numpy as np
+
+from cube_state import FACELET_COUNT, MOVE_COUNT, MOVE_PERMUTATIONS, SOLVED_FACELETS, Move, compose_moves, parse_move
+from cubie_cube import cubies_to_facelets, random_cubies
+
+# Rows are processed in chunks so the (rows, 54) gather indices stay cache sized for any N
+CHUNK_ROWS: int = 1 << 16
+
+
+class CubeBatch:
+    def __init__(self, states: np.ndarray):
+        # Always a private writable copy: moves update the states in place, and a caller's array or a broadcast view
+        # must not change with them
+        self.__states: np.ndarray = np.array(states, dtype=np.uint8, order='C')
+        if self.__states.ndim != 2 or self.__states.shape[1] != FACELET_COUNT:
+            raise ValueError(f'Expected a (N, {FACELET_COUNT}) state matrix, got shape {self.__states.shape}')
+
+    @classmethod
+    def _wrap(cls, states: np.ndarray) -> 'CubeBatch':
+        """
+        Takes ownership of a fresh (N, 54) C-ordered uint8 array no one else references, skipping the copy __init__
+        makes.
+        """
+        batch: CubeBatch = cls.__new__(cls)
+        batch.__states = states
+        return batch
+
+    @classmethod
+    def solved(cls, n: int) -> 'CubeBatch':
+        return cls._wrap(np.tile(SOLVED_FACELETS, (n, 1)))
+
+    @classmethod
+    def random(cls, n: int, rng: 'np.random.Generator' = None) -> 'CubeBatch':
+        """
+        Returns: n states drawn uniformly from the reachable ones, see cubie_cube.random_cubies.
+        """
+        cubies: Tuple[np.ndarray, ...] = random_cubies(n, rng if rng is not None else np.random.default_rng())
+        states: np.ndarray = np.empty((n, FACELET_COUNT), dtype=np.uint8)
+        for start in range(0, n, CHUNK_ROWS):
+            rows = slice(start, start + CHUNK_ROWS)
+            states[rows] = cubies_to_facelets(*(pieces[rows] for pieces in cubies))
+        return cls._wrap(states)
+
+    @property
+    def states(self) -> np.ndarray:
+        return self.__states
+
+    def __len__(self) -> int:
+        return self.__states.shape[0]
+
+    def apply_moves(self, moves: np.ndarray) -> 'CubeBatch':
+        """
+        Applies moves[i] to cube i, all cubes in one vectorized pass.
+        """
+        moves = np.asarray(moves)
+        if moves.shape != (len(self),):
+            raise ValueError(f'Expected one move per cube ({len(self)}), got shape {moves.shape}')
+        if moves.size and (moves.min() < 0 or moves.max() >= MOVE_COUNT):
+            raise ValueError('Move index out of range')
+        for start in range(0, len(self), CHUNK_ROWS):
+            rows = slice(start, start + CHUNK_ROWS)
+            self.__states[rows] = np.take_along_axis(self.__states[rows], MOVE_PERMUTATIONS[moves[rows]], axis=1)
+        return self
+
+    def apply_sequence(self, moves: Union[str, Iterable[Move]]) -> 'CubeBatch':
+        """
+        Applies the same move sequence to every cube, folded into a single gather.
+        """
+        return self.apply_permutation(compose_moves(moves))
+
+    def apply_move(self, move: Move) -> 'CubeBatch':
+        return self.apply_permutation(MOVE_PERMUTATIONS[parse_move(move)])
+
+    def apply_permutation(self, perm: np.ndarray) -> 'CubeBatch':
+        for start in range(0, len(self), CHUNK_ROWS):
+            rows = slice(start, start + CHUNK_ROWS)
+            self.__states[rows] = self.__states[rows][:, perm]
+        return self
+
+    def is_solved(self) -> np.ndarray:
+        faces: np.ndarray = self.__states.reshape(-1, 6, 9)
+        return (faces == faces[:, :, 4:5]).all(axis=(1, 2))
+
+    def equals(self, other: Union['CubeBatch', np.ndarray]) -> np.ndarray:
+        """
+        Returns: Boolean mask of cubes whose facelets equal other, either a batch of the same size or one state.
+        """
+        other_states: np.ndarray = other.states if isinstance(other, CubeBatch) else np.asarray(other)
+        return (self.__states == other_states).all(axis=-1)
+
+    def copy(self) -> 'CubeBatch':
+        return CubeBatch(self.__states)
+
+    def __getitem__(self, item) -> 'CubeBatch':
+        return CubeBatch(np.atleast_2d(self.__states[item]))
@@ -0,0 +1,80 @@
+import time
+from math import ceil, sqrt
+from typing import Tuple
+
+import numpy as np
+
+from cube_batch import CubeBatch
+from cube_state import MOVE_NAMES, move_from_rotation, rotation_from_move
+from globject import GLObject
+from instanced_renderer import GRID_SPACING, InstancedCubeRenderer, get_grid_offsets
+from move_scheduler import Clock, MoveScheduler
+
+
+class CubeGrid(GLObject):
+    """
+    A grid of cubes from a (N, 54) state matrix, drawn with one instanced draw call. Turns are queued on one
+    MoveScheduler over the whole CubeBatch, so every cube plays the same turn at the same time.
+    """
+
+    def __init__(self,
+                 center_pos: Tuple[float, float, float],
+                 states: np.ndarray,
+                 size: float = 7.0,
+                 clock: Clock = time.perf_counter):
+        super(CubeGrid, self).__init__(center_pos)
+
+        self.elapsed_angle: float = 0
+        self.rotation_face: str = None
+
+        batch: CubeBatch = CubeBatch(np.array(states, dtype=np.uint8))
+        self.__scheduler: MoveScheduler = MoveScheduler(batch, clock=clock)
+        self.__renderer: InstancedCubeRenderer = InstancedCubeRenderer(len(batch))
+
+        # Scaled so the grid is `size` wide along its longer side
+        columns: int = max(1, ceil(sqrt(len(batch))))
+        scale: float = size / (columns * GRID_SPACING)
+        self.__offsets: np.ndarray = np.asarray(center_pos) + get_grid_offsets(len(batch), GRID_SPACING * scale, columns)
+        self.__scale: float = scale
+        self.__placed: bool = False
+        self.__turn: Tuple[int, float] = (-1, 0.0)
+
+    @property
+    def state(self) -> CubeBatch:
+        """
+        The cubes as drawn at rest; turns still queued in the scheduler are not applied yet.
+        """
+        return self.__scheduler.state
+
+    @property
+    def scheduler(self) -> MoveScheduler:
+        return self.__scheduler
+
+    @property
+    def is_rotating(self) -> bool:
+        return self.__scheduler.is_rotating
+
+    def rotate(self, face: str, angle):
+        self.__scheduler.enqueue(MOVE_NAMES[move_from_rotation(face, angle)])
+
+    def update(self):
+        turn = self.__scheduler.update()
+        self.rotation_face, self.elapsed_angle = turn if turn is not None else (None, 0)
+
+    def render(self, *args, **kwargs):
+        self.update()
+        renderer: InstancedCubeRenderer = self.__renderer
+        renderer.set_states(self.state.states)
+        if not self.__placed:
+            renderer.set_placements(self.__offsets, self.__scale)
+            self.__placed = True
+        head = self.__scheduler.head
+        turn: Tuple[int, float] = (-1, 0.0) if head is None or not self.elapsed_angle else \
+            (head, self.elapsed_angle / rotation_from_move(head)[1])
+        if turn != self.__turn:
+            renderer.set_turns(*turn)
+            self.__turn = turn
+        renderer.render()
+
+    def release(self):
+        self.__renderer.release()
@@ -0,0 +1,258 @@
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List, NamedTuple, Tuple, Union
+
+import numpy as np
+
+from cube_state import FACE_FRAMES, FACE_ORDER, MOVE_NAMES, QUARTER_TURNS, CubeState, rotation_from_move
+from enums import RubiksCubeRotations, RubiksMoveVariations
+
+# Whole-cube rotations, as turns of every layer seen from this face
+CUBE_ROTATION_FACES: Dict[str, str] = {'x': 'R', 'y': 'U', 'z': 'F'}
+OPPOSITE_FACES: Dict[str, str] = {'U': 'D', 'R': 'L', 'F': 'B', 'D': 'U', 'L': 'R', 'B': 'F'}
+# SiGN notation: R outer layer, 3R third layer alone, Rw outer two layers, 3Rw outer three layers, x y z the whole cube
+LAYER_MOVE_PATTERN: re.Pattern = re.compile(r"^(?:(\d+)?([URFDLB])(w?)|([xyz]))(['2]?)$")
+
+LayerMove = Union['LayerTurn', str]
+
+
+class LayerTurn(NamedTuple):
+    """
+    Quarter turns clockwise, seen from `face`, of the layers at depths start to stop - 1 from that face.
+    """
+    face: str
+    start: int
+    stop: int
+    quarters: int
+
+
+def get_sticker_positions(n: int) -> np.ndarray:
+    """
+    Returns: (6, n, n, 3) integer sticker positions in doubled coordinates, with the URFDLB row by row layout of
+    cube_state: the positions of a 3x3x3 reshaped to (54, 3) equal cube_state.get_facelet_positions().
+    """
+    positions: np.ndarray = np.empty((len(FACE_ORDER), n, n, 3), dtype=np.int64)
+    offsets: np.ndarray = 2 * np.arange(n) - (n - 1)
+    for f, face in enumerate(FACE_ORDER):
+        normal, right, down = (np.array(v) for v in FACE_FRAMES[face])
+        positions[f] = n * normal + offsets[None, :, None] * right + offsets[:, None, None] * down
+    return positions
+
+
+def get_strip_cycles() -> Dict[str, List[Tuple[int, int]]]:
+    """
+    Returns: For every face, the four faces around it in the order a clockwise turn moves stickers, each with the
+    np.rot90 count of the view in which row d is the strip at depth d from the turning face. These views run the same
+    way round on all four faces, and they are the same for every n, so they are derived on a 3x3x3.
+    """
+    n: int = 3
+    positions: np.ndarray = get_sticker_positions(n)
+    normals: List[np.ndarray] = [np.array(FACE_FRAMES[face][0]) for face in FACE_ORDER]
+    cycles: Dict[str, List[Tuple[int, int]]] = {}
+    for face, normal in zip(FACE_ORDER, normals):
+        # Clockwise seen from outside the face is a -90 degree rotation about its outward normal
+        rotate = lambda p: normal * (p @ normal)[..., None] - np.cross(normal, p)
+        neighbor: int = next(f for f, other in enumerate(normals) if other @ normal == 0)
+        cycle: List[Tuple[int, int]] = []
+        for _ in range(4):
+            k: int = next(k for k in range(4)
+                          if ((n - 1 - np.rot90(positions[neighbor], k) @ normal) // 2 == np.arange(n)[:, None]).all())
+            cycle.append((neighbor, k))
+            neighbor = next(f for f, other in enumerate(normals) if (other == rotate(normals[neighbor])).all())
+        for (a, k_a), (b, k_b) in zip(cycle, cycle[1:] + cycle[:1]):
+            if not (rotate(np.rot90(positions[a], k_a)) == np.rot90(positions[b], k_b)).all():
+                raise AssertionError(f'Strips around {face} do not line up')
+        cycles[face] = cycle
+    return cycles
+
+
+STRIP_CYCLES: Dict[str, List[Tuple[int, int]]] = get_strip_cycles()
+
+
+def parse_layer_move(move: LayerMove, n: int) -> LayerTurn:
+    if isinstance(move, LayerTurn):
+        turn: LayerTurn = move
+    else:
+        match = LAYER_MOVE_PATTERN.match(move)
+        if match is None:
+            raise ValueError(f'Unknown move {move!r}')
+        depth, face, wide, rotation, variation = match.groups()
+        quarters: int = QUARTER_TURNS[RubiksMoveVariations.values().index(variation)]
+        if rotation:
+            turn = LayerTurn(CUBE_ROTATION_FACES[rotation], 0, n, quarters)
+        elif wide:
+            turn = LayerTurn(face, 0, int(depth) if depth else 2, quarters)
+        else:
+            layer: int = int(depth) if depth else 1
+            turn = LayerTurn(face, layer - 1, layer, quarters)
+    if not 0 <= turn.start < turn.stop <= n or turn.quarters % 4 == 0:
+        raise ValueError(f'{move!r} does not turn layers of a {n}x{n}x{n} cube')
+    return turn
+
+
+def parse_layer_moves(moves: Union[str, Iterable[LayerMove]], n: int) -> List[LayerTurn]:
+    if isinstance(moves, str):
+        moves = moves.split()
+    return [parse_layer_move(move, n) for move in moves]
+
+
+def format_layer_move(turn: LayerTurn, n: int) -> str:
+    variation: str = RubiksMoveVariations.values()[QUARTER_TURNS.index(turn.quarters % 4)]
+    if turn.start == 0 and turn.stop == 1:
+        return f'{turn.face}{variation}'
+    if turn.start == 0 and turn.stop == n and turn.face in CUBE_ROTATION_FACES.values():
+        return f'{next(r for r, face in CUBE_ROTATION_FACES.items() if face == turn.face)}{variation}'
+    if turn.start == 0:
+        return f'{"" if turn.stop == 2 else turn.stop}{turn.face}w{variation}'
+    if turn.stop == turn.start + 1:
+        return f'{turn.stop}{turn.face}{variation}'
+    raise ValueError(f'{turn} has no single-move notation')
+
+
+def move_from_layer_turn(turn: LayerTurn) -> int:
+    """
+    Returns: The cube_state move index of a turn of the face, whatever layers it turns.
+    """
+    return RubiksCubeRotations.values().index(turn.face) * 3 + QUARTER_TURNS.index(turn.quarters % 4)
+
+
+def layer_turn_from_move(move: int) -> LayerTurn:
+    return LayerTurn(MOVE_NAMES[move][0], 0, 1, QUARTER_TURNS[move % 3])
+
+
+def rotation_from_layer_move(turn: LayerTurn) -> Tuple[str, int]:
+    """
+    Returns: (face, angle) of the turn for glRotatef about the face's RubiksFaceRotation axis, as cube_state does.
+    """
+    return rotation_from_move(move_from_layer_turn(turn))
+
+
+def get_quarter_rotation(face: str, quarters: int = 1) -> np.ndarray:
+    """
+    Returns: (3, 3) integer matrix turning vectors `quarters` times clockwise, seen from outside the face.
+    """
+    normal: np.ndarray = np.array(FACE_FRAMES[face][0])
+    # Clockwise seen from outside the face is a -90 degree rotation about its outward normal: n (n . v) - n x v
+    cross: np.ndarray = np.array([[0, -normal[2], normal[1]], [normal[2], 0, -normal[0]], [-normal[1], normal[0], 0]])
+    return np.linalg.matrix_power(np.outer(normal, normal) - cross, quarters % 4)
+
+
+def reorient_turn(turn: LayerTurn, rotation: np.ndarray) -> LayerTurn:
+    """
+    Returns: The turn of the same layers about the face that `rotation` takes turn.face to.
+    """
+    normal: Tuple[int, ...] = tuple((rotation @ FACE_FRAMES[turn.face][0]).tolist())
+    return turn._replace(face=next(face for face in FACE_ORDER if FACE_FRAMES[face][0] == normal))
+
+
+def split_turn(turn: LayerTurn) -> Tuple[List[LayerTurn], int]:
+    """
+    Splits a turn of a 3x3x3 into outer-layer turns and a whole-cube rotation, so that a cube keeping its centres
+    fixed can make it. The whole cube only turns when the turn moves the middle layer.
+
+    Returns: Face turns, and the quarter turns of the whole cube about turn.face that follow them.
+    """
+    face, start, stop, quarters = turn
+    if stop <= 1 or start >= 2:
+        # The far layer is the near layer of the opposite face, turning the other way round
+        return [turn if start == 0 else LayerTurn(OPPOSITE_FACES[face], 0, 1, -quarters % 4)], 0
+    # Turning the whole cube also turns the outer layers outside the turn, which are turned back
+    outer: List[LayerTurn] = []
+    if start > 0:
+        outer.append(LayerTurn(face, 0, 1, -quarters % 4))
+    if stop < 3:
+        outer.append(LayerTurn(OPPOSITE_FACES[face], 0, 1, quarters % 4))
+    return outer, quarters % 4
+
+
+def get_rotation_permutation(rotation: np.ndarray) -> np.ndarray:
+    """
+    Returns: Gather permutation of the 3x3x3 facelets for turning the whole cube by `rotation`: the facelets of the
+    turned cube are facelets[perm].
+    """
+    positions: np.ndarray = get_sticker_positions(3).reshape(-1, 3)
+    # Doubled coordinates run from -3 to 3, so every position has a unique key below 7 ** 3
+    keys: np.ndarray = (positions + 3) @ np.array([49, 7, 1])
+    lookup: np.ndarray = np.empty(7 ** 3, dtype=np.intp)
+    lookup[keys] = np.arange(len(positions))
+    # The sticker drawn at p comes from rotation^-1 p, which is p @ rotation for a rotation matrix
+    return lookup[(positions @ rotation + 3) @ np.array([49, 7, 1])]
+
+
+@lru_cache(maxsize=None)
+def get_solved_stickers(n: int) -> np.ndarray:
+    stickers: np.ndarray = np.repeat(np.arange(len(FACE_ORDER), dtype=np.uint8), n * n).reshape(len(FACE_ORDER), n, n)
+    stickers.flags.writeable = False
+    return stickers
+
+
+class CubeStateNxN:
+    """
+    NxNxN cube as a (6, n, n) uint8 sticker array, URFDLB faces row by row as seen from outside; for n = 3 the
+    flattened stickers are the facelets of CubeState. A turn rotates the face grids with np.rot90 and rolls the four
+    strips around the turning layers, so it costs O(n * layers) array work whatever the size.
+    """
+
+    def __init__(self, n: int = 3, stickers: np.ndarray = None):
+        if n < 1:
+            raise ValueError(f'Cube size must be at least 1, got {n}')
+        self.__n: int = n
+        self.__stickers: np.ndarray = np.array(get_solved_stickers(n) if stickers is None else stickers, dtype=np.uint8)
+        if self.__stickers.shape != (len(FACE_ORDER), n, n):
+            raise ValueError(f'Expected (6, {n}, {n}) stickers, got shape {self.__stickers.shape}')
+
+    @property
+    def n(self) -> int:
+        return self.__n
+
+    @property
+    def stickers(self) -> np.ndarray:
+        return self.__stickers
+
+    @property
+    def facelets(self) -> np.ndarray:
+        return self.__stickers.reshape(-1)
+
+    def apply_move(self, move: LayerMove) -> 'CubeStateNxN':
+        face, start, stop, quarters = parse_layer_move(move, self.__n)
+        quarters %= 4
+        stickers: np.ndarray = self.__stickers
+        if start == 0:
+            f: int = FACE_ORDER.index(face)
+            stickers[f] = np.rot90(stickers[f], -quarters)
+        if stop == self.__n:
+            f = FACE_ORDER.index(OPPOSITE_FACES[face])
+            stickers[f] = np.rot90(stickers[f], quarters)
+        strips: List[np.ndarray] = [np.rot90(stickers[neighbor], k)[start:stop] for neighbor, k in STRIP_CYCLES[face]]
+        rolled: np.ndarray = np.roll(np.stack(strips), quarters, axis=0)
+        for strip, new in zip(strips, rolled):
+            strip[...] = new
+        return self
+
+    def apply_moves(self, moves: Union[str, Iterable[LayerMove]]) -> 'CubeStateNxN':
+        for turn in parse_layer_moves(moves, self.__n):
+            self.apply_move(turn)
+        return self
+
+    def is_solved(self) -> bool:
+        faces: np.ndarray = self.__stickers.reshape(len(FACE_ORDER), -1)
+        return bool((faces == faces[:, :1]).all())
+
+    def copy(self) -> 'CubeStateNxN':
+        return CubeStateNxN(self.__n, self.__stickers)
+
+    def to_string(self) -> str:
+        return ''.join(FACE_ORDER[f] for f in self.facelets)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, CubeStateNxN) and np.array_equal(self.__stickers, other.stickers)
+
+    def __hash__(self) -> int:
+        return hash((self.__n, self.__stickers.tobytes()))
+
+    def __repr__(self) -> str:
+        return f'CubeStateNxN({self.__n}, {self.to_string()!r})'
+
+
+# The fixed-centre 3x3x3 model that the solvers work on, or the sticker array of any size
+AnyCubeState = Union[CubeState, CubeStateNxN]
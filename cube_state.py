@@ -0,0 +1,227 @@
+from typing import Dict, Iterable, List, Tuple, Union
+
+import numpy as np
+
+from enums import GlColors4f, RubiksCubeRotations, RubiksFaceRotation, RubiksMoveVariations, Surfaces
+
+# Facelets are stored in the standard URFDLB order, 9 per face, row by row as seen from outside the face.
+FACE_ORDER: Tuple[str, ...] = ('U', 'R', 'F', 'D', 'L', 'B')
+FACELET_COUNT: int = 54
+
+FACE_SURFACES: Dict[str, Surfaces] = {
+    'U': Surfaces.TOP,
+    'R': Surfaces.RIGHT,
+    'F': Surfaces.FRONT,
+    'D': Surfaces.BOTTOM,
+    'L': Surfaces.LEFT,
+    'B': Surfaces.BACK,
+}
+
+FACE_COLORS: Dict[str, GlColors4f] = {
+    'U': GlColors4f.WHITE_SOLID,
+    'R': GlColors4f.BLUE_SOLID,
+    'F': GlColors4f.RED_SOLID,
+    'D': GlColors4f.YELLOW_SOLID,
+    'L': GlColors4f.GREEN_SOLID,
+    'B': GlColors4f.ORANGE_SOLID,
+}
+
+# Outward normal, in-view "right" and in-view "down" unit vectors of every face (x right, y up, z front).
+FACE_FRAMES: Dict[str, Tuple[Tuple[int, int, int], Tuple[int, int, int], Tuple[int, int, int]]] = {
+    'U': ((0, 1, 0), (1, 0, 0), (0, 0, 1)),
+    'R': ((1, 0, 0), (0, 0, -1), (0, -1, 0)),
+    'F': ((0, 0, 1), (1, 0, 0), (0, -1, 0)),
+    'D': ((0, -1, 0), (1, 0, 0), (0, 0, -1)),
+    'L': ((-1, 0, 0), (0, 0, 1), (0, -1, 0)),
+    'B': ((0, 0, -1), (-1, 0, 0), (0, -1, 0)),
+}
+
+# Moves follow the button layout of PygameWrapper.get_buttons(): F, F', F2, B, B', B2, ...
+MOVE_NAMES: List[str] = [f'{face}{variation}'
+                         for face in RubiksCubeRotations.values()
+                         for variation in RubiksMoveVariations.values()]
+MOVE_INDEX: Dict[str, int] = {name: i for i, name in enumerate(MOVE_NAMES)}
+MOVE_COUNT: int = len(MOVE_NAMES)
+QUARTER_TURNS: Tuple[int, ...] = (1, 3, 2)
+
+SOLVED_FACELETS: np.ndarray = np.repeat(np.arange(6, dtype=np.uint8), 9)
+
+Move = Union[int, str]
+
+
+def get_facelet_positions() -> np.ndarray:
+    """
+    Returns: (54, 3) integer sticker positions in doubled coordinates, so every sticker has a unique position.
+    """
+    positions: np.ndarray = np.empty((FACELET_COUNT, 3), dtype=np.int64)
+    for f, face in enumerate(FACE_ORDER):
+        normal, right, down = (np.array(v) for v in FACE_FRAMES[face])
+        for row in range(3):
+            for col in range(3):
+                positions[f * 9 + row * 3 + col] = 3 * normal + 2 * (col - 1) * right + 2 * (row - 1) * down
+    return positions
+
+
+def get_quarter_turn_permutation(face: str) -> np.ndarray:
+    """
+    Returns: Gather permutation of one clockwise quarter turn of the face, i.e. new_state = state[perm].
+    """
+    positions: np.ndarray = get_facelet_positions()
+    normal: np.ndarray = np.array(FACE_FRAMES[face][0])
+    lookup: Dict[Tuple[int, ...], int] = {tuple(p): i for i, p in enumerate(positions)}
+
+    perm: np.ndarray = np.arange(FACELET_COUNT)
+    for i, p in enumerate(positions):
+        if p @ normal >= 2:
+            # Clockwise seen from outside the face is a -90 degree rotation about its outward normal
+            rotated = normal * (normal @ p) - np.cross(normal, p)
+            perm[lookup[tuple(rotated)]] = i
+    return perm
+
+
+def get_move_permutations() -> np.ndarray:
+    quarter_turns: Dict[str, np.ndarray] = {face: get_quarter_turn_permutation(face) for face in FACE_ORDER}
+    permutations: np.ndarray = np.empty((MOVE_COUNT, FACELET_COUNT), dtype=np.intp)
+    for i, name in enumerate(MOVE_NAMES):
+        perm: np.ndarray = np.arange(FACELET_COUNT)
+        for _ in range(QUARTER_TURNS[i % 3]):
+            perm = perm[quarter_turns[name[0]]]
+        permutations[i] = perm
+    return permutations
+
+
+MOVE_PERMUTATIONS: np.ndarray = get_move_permutations()
+MOVE_PERMUTATIONS.flags.writeable = False
+
+INVERSE_MOVES: np.ndarray = np.array([3 * (i // 3) + (1, 0, 2)[i % 3] for i in range(MOVE_COUNT)], dtype=np.intp)
+MOVE_FACES: np.ndarray = np.repeat(np.arange(len(RubiksCubeRotations)), 3)
+MOVE_AXIS_VECTORS: List[Tuple[int, int, int]] = list(RubiksFaceRotation.dict().values())
+MOVE_AXES: np.ndarray = np.array([MOVE_AXIS_VECTORS.index(RubiksFaceRotation[name[0]].value) for name in MOVE_NAMES])
+
+
+def is_canonical_successor(previous: int, move: int) -> bool:
+    """
+    Rejects turning the same face twice in a row, and orders commuting opposite faces (F before B, U before D, ...).
+    """
+    previous_face: int = previous // 3
+    face: int = move // 3
+    return face != previous_face and not (MOVE_AXES[face * 3] == MOVE_AXES[previous_face * 3] and face < previous_face)
+
+
+# Allowed moves after each previous move; the extra last row is for the first move of a sequence
+NO_PREVIOUS_MOVE: int = MOVE_COUNT
+CANONICAL_SUCCESSORS: List[List[int]] = [[m for m in range(MOVE_COUNT) if is_canonical_successor(p, m)]
+                                         for p in range(MOVE_COUNT)] + [list(range(MOVE_COUNT))]
+
+
+def parse_move(move: Move) -> int:
+    if isinstance(move, (int, np.integer)):
+        if not 0 <= move < MOVE_COUNT:
+            raise ValueError(f'Move index out of range: {move}')
+        return int(move)
+    try:
+        return MOVE_INDEX[move]
+    except KeyError:
+        raise ValueError(f'Unknown move: {move!r}') from None
+
+
+def parse_moves(moves: Union[str, Iterable[Move]]) -> List[int]:
+    if isinstance(moves, str):
+        moves = moves.split()
+    return [parse_move(m) for m in moves]
+
+
+def format_moves(moves: Iterable[int]) -> str:
+    return ' '.join(MOVE_NAMES[m] for m in moves)
+
+
+def move_from_rotation(face: str, angle: int) -> int:
+    """
+    Maps a RubiksCube.rotate(face, angle) call, as issued by the buttons, to its move index.
+    """
+    clockwise_angle: int = 90 if face in ('B', 'D', 'L') else -90
+    quarter_turns: int = (angle // clockwise_angle) % 4
+    if quarter_turns == 0 or angle % 90:
+        raise ValueError(f'Angle {angle} is not a face turn')
+    return MOVE_INDEX[face + RubiksMoveVariations.values()[QUARTER_TURNS.index(quarter_turns)]]
+
+
+def rotation_from_move(move: Move) -> Tuple[str, int]:
+    """
+    Inverse of move_from_rotation: the (face, angle) a button issues for the move.
+    """
+    move = parse_move(move)
+    face: str = MOVE_NAMES[move][0]
+    clockwise_angle: int = 90 if face in ('B', 'D', 'L') else -90
+    return face, clockwise_angle * (1, -1, 2)[move % 3]
+
+
+def compose_moves(moves: Union[str, Iterable[Move]]) -> np.ndarray:
+    """
+    Returns: Single gather permutation equivalent to applying the moves in order.
+    """
+    perm: np.ndarray = np.arange(FACELET_COUNT)
+    for m in parse_moves(moves):
+        perm = perm[MOVE_PERMUTATIONS[m]]
+    return perm
+
+
+class CubeState:
+    def __init__(self, facelets: np.ndarray = None):
+        if facelets is None:
+            facelets = SOLVED_FACELETS
+        self.__facelets: np.ndarray = np.array(facelets, dtype=np.uint8)
+        if self.__facelets.shape != (FACELET_COUNT,):
+            raise ValueError(f'Expected {FACELET_COUNT} facelets, got shape {self.__facelets.shape}')
+
+    @classmethod
+    def from_string(cls, facelet_string: str) -> 'CubeState':
+        return cls(np.array([FACE_ORDER.index(c) for c in facelet_string], dtype=np.uint8))
+
+    @property
+    def facelets(self) -> np.ndarray:
+        return self.__facelets
+
+    def apply_move(self, move: Move) -> 'CubeState':
+        self.__facelets = self.__facelets[MOVE_PERMUTATIONS[parse_move(move)]]
+        return self
+
+    def apply_moves(self, moves: Union[str, Iterable[Move]]) -> 'CubeState':
+        self.__facelets = self.__facelets[compose_moves(moves)]
+        return self
+
+    def apply_permutation(self, perm: np.ndarray) -> 'CubeState':
+        self.__facelets = self.__facelets[perm]
+        return self
+
+    def is_solved(self) -> bool:
+        return bool((self.__facelets.reshape(6, 9) == self.__facelets[4::9, None]).all())
+
+    def copy(self) -> 'CubeState':
+        return CubeState(self.__facelets)
+
+    def to_string(self) -> str:
+        return ''.join(FACE_ORDER[f] for f in self.__facelets)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, CubeState) and np.array_equal(self.__facelets, other.facelets)
+
+    def __hash__(self) -> int:
+        return hash(self.__facelets.tobytes())
+
+    def __repr__(self) -> str:
+        return f'CubeState({self.to_string()!r})'
+
+
+StateLike = Union[CubeState, str, np.ndarray]
+
+
+def to_facelets(state: StateLike) -> np.ndarray:
+    """
+    Returns: (54,) facelets of a CubeState, a URFDLB facelet string or a facelet array.
+    """
+    if isinstance(state, CubeState):
+        return state.facelets
+    if isinstance(state, str):
+        return CubeState.from_string(state).facelets
+    return np.asarray(state)
@@ -0,0 +1,147 @@
+from typing import List, Tuple
+
+import numpy as np
+
+from coordinates import lehmer_to_permutation
+from cube_state import FACELET_COUNT, MOVE_PERMUTATIONS, SOLVED_FACELETS
+
+# Cubie positions in Kociemba order. Each corner lists its facelets clockwise starting with the U/D sticker,
+# each edge lists its U/D (or F/B for slice edges) sticker first.
+CORNER_NAMES: Tuple[str, ...] = ('URF', 'UFL', 'ULB', 'UBR', 'DFR', 'DLF', 'DBL', 'DRB')
+EDGE_NAMES: Tuple[str, ...] = ('UR', 'UF', 'UL', 'UB', 'DR', 'DF', 'DL', 'DB', 'FR', 'FL', 'BL', 'BR')
+
+CORNER_FACELETS: np.ndarray = np.array([
+    [8, 9, 20], [6, 18, 38], [0, 36, 47], [2, 45, 11],
+    [29, 26, 15], [27, 44, 24], [33, 53, 42], [35, 17, 51],
+], dtype=np.intp)
+EDGE_FACELETS: np.ndarray = np.array([
+    [5, 10], [7, 19], [3, 37], [1, 46], [32, 16], [28, 25],
+    [30, 43], [34, 52], [23, 12], [21, 41], [50, 39], [48, 14],
+], dtype=np.intp)
+
+CORNER_COLORS: np.ndarray = SOLVED_FACELETS[CORNER_FACELETS]
+EDGE_COLORS: np.ndarray = SOLVED_FACELETS[EDGE_FACELETS]
+
+INVALID_PIECE: int = 255
+
+
+def get_corner_lookup() -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns: (piece, orientation) tables indexed by the 3 colors at a corner position encoded as c0 * 36 + c1 * 6 + c2.
+    """
+    pieces: np.ndarray = np.full(216, INVALID_PIECE, dtype=np.uint8)
+    orientations: np.ndarray = np.zeros(216, dtype=np.uint8)
+    for piece, colors in enumerate(CORNER_COLORS):
+        for ori in range(3):
+            seen = [0, 0, 0]
+            for k in range(3):
+                seen[(ori + k) % 3] = colors[k]
+            code = seen[0] * 36 + seen[1] * 6 + seen[2]
+            pieces[code] = piece
+            orientations[code] = ori
+    return pieces, orientations
+
+
+def get_edge_lookup() -> Tuple[np.ndarray, np.ndarray]:
+    pieces: np.ndarray = np.full(36, INVALID_PIECE, dtype=np.uint8)
+    orientations: np.ndarray = np.zeros(36, dtype=np.uint8)
+    for piece, (c0, c1) in enumerate(EDGE_COLORS):
+        pieces[c0 * 6 + c1] = piece
+        pieces[c1 * 6 + c0] = piece
+        orientations[c1 * 6 + c0] = 1
+    return pieces, orientations
+
+
+CORNER_LOOKUP: Tuple[np.ndarray, np.ndarray] = get_corner_lookup()
+EDGE_LOOKUP: Tuple[np.ndarray, np.ndarray] = get_edge_lookup()
+
+
+def facelets_to_cubies(facelets: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Returns: (cp, co, ep, eo) for (..., 54) facelets. Unrecognizable pieces are reported as INVALID_PIECE in cp/ep.
+    """
+    facelets = np.asarray(facelets, dtype=np.int64)
+    corner_colors: np.ndarray = facelets[..., CORNER_FACELETS]
+    corner_codes: np.ndarray = corner_colors[..., 0] * 36 + corner_colors[..., 1] * 6 + corner_colors[..., 2]
+    edge_colors: np.ndarray = facelets[..., EDGE_FACELETS]
+    edge_codes: np.ndarray = edge_colors[..., 0] * 6 + edge_colors[..., 1]
+    return (CORNER_LOOKUP[0][corner_codes], CORNER_LOOKUP[1][corner_codes],
+            EDGE_LOOKUP[0][edge_codes], EDGE_LOOKUP[1][edge_codes])
+
+
+# Colors on the stickers of a position holding a piece with an orientation, indexed by piece * 3 + twist or
+# piece * 2 + flip: the sticker k of the piece sits (k + orientation) places further around the position
+CORNER_STICKER_COLORS: np.ndarray = np.array([np.roll(colors, twist) for colors in CORNER_COLORS
+                                              for twist in range(3)], dtype=np.uint8)
+EDGE_STICKER_COLORS: np.ndarray = np.array([np.roll(colors, flip) for colors in EDGE_COLORS for flip in range(2)],
+                                            dtype=np.uint8)
+
+
+def cubies_to_facelets(cp: np.ndarray, co: np.ndarray, ep: np.ndarray, eo: np.ndarray) -> np.ndarray:
+    # Built facelet-major, where every sticker is one contiguous 1-D lookup, then transposed once
+    corners: np.ndarray = np.moveaxis(np.asarray(cp, dtype=np.intp) * 3 + co, -1, 0)
+    edges: np.ndarray = np.moveaxis(np.asarray(ep, dtype=np.intp) * 2 + eo, -1, 0)
+    facelets: np.ndarray = np.empty((FACELET_COUNT,) + corners.shape[1:], dtype=np.uint8)
+    facelets[4::9] = np.arange(6, dtype=np.uint8).reshape((6,) + (1,) * (corners.ndim - 1))
+    for k in range(3):
+        facelets[CORNER_FACELETS[:, k]] = CORNER_STICKER_COLORS[:, k].take(corners)
+    for k in range(2):
+        facelets[EDGE_FACELETS[:, k]] = EDGE_STICKER_COLORS[:, k].take(edges)
+    return np.ascontiguousarray(np.moveaxis(facelets, 0, -1))
+
+
+def get_cubie_moves() -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    return facelets_to_cubies(SOLVED_FACELETS[MOVE_PERMUTATIONS])
+
+
+MOVE_CP, MOVE_CO, MOVE_EP, MOVE_EO = get_cubie_moves()
+
+SOLVED_CUBIES: Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray] = facelets_to_cubies(SOLVED_FACELETS)
+
+
+def apply_cubie_move(cp: np.ndarray, co: np.ndarray, ep: np.ndarray, eo: np.ndarray,
+                     move: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    return (cp[..., MOVE_CP[move]],
+            (co[..., MOVE_CP[move]] + MOVE_CO[move]) % 3,
+            ep[..., MOVE_EP[move]],
+            (eo[..., MOVE_EP[move]] + MOVE_EO[move]) % 2)
+
+
+def permutation_parity(perms: np.ndarray) -> np.ndarray:
+    perms = np.asarray(perms)
+    n: int = perms.shape[-1]
+    inversions: np.ndarray = np.zeros(perms.shape[:-1], dtype=np.int64)
+    for i in range(n - 1):
+        inversions += (perms[..., i + 1:] < perms[..., i:i + 1]).sum(axis=-1)
+    return inversions % 2
+
+
+def verify_cubies(cp: np.ndarray, co: np.ndarray, ep: np.ndarray, eo: np.ndarray) -> np.ndarray:
+    """
+    Returns: Boolean mask of reachable cube states: every piece present once, zero twist and flip sums, equal parity.
+    """
+    corners_ok: np.ndarray = (np.sort(cp, axis=-1) == np.arange(8)).all(axis=-1)
+    edges_ok: np.ndarray = (np.sort(ep, axis=-1) == np.arange(12)).all(axis=-1)
+    twist_ok: np.ndarray = co.sum(axis=-1, dtype=np.int64) % 3 == 0
+    flip_ok: np.ndarray = eo.sum(axis=-1, dtype=np.int64) % 2 == 0
+    parity_ok: np.ndarray = permutation_parity(cp) == permutation_parity(ep)
+    return corners_ok & edges_ok & twist_ok & flip_ok & parity_ok
+
+
+def random_cubies(count: int, rng: 'np.random.Generator') -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Draws states uniformly from the reachable ones, unlike random move sequences. Permutations come from independent
+    Lehmer digits, whose sum is the inversion count; the edge digit that only swaps the last two edges is then set to
+    match the corner parity, which pairs every unreachable permutation with exactly one reachable one. The last twist
+    and flip complete the zero sums.
+
+    Returns: (cp, co, ep, eo) uint8 arrays with `count` rows.
+    """
+    corner_digits: List[np.ndarray] = [rng.integers(0, 8 - i, count, dtype=np.uint8) for i in range(8)]
+    edge_digits: List[np.ndarray] = [rng.integers(0, 12 - i, count, dtype=np.uint8) for i in range(12)]
+    edge_digits[10] = (sum(corner_digits) + sum(edge_digits[:10])) % 2
+    co: np.ndarray = rng.integers(0, 3, size=(count, 8), dtype=np.uint8)
+    eo: np.ndarray = rng.integers(0, 2, size=(count, 12), dtype=np.uint8)
+    co[:, -1] = (3 - co[:, :-1].sum(axis=1, dtype=np.int64) % 3) % 3
+    eo[:, -1] = eo[:, :-1].sum(axis=1, dtype=np.int64) % 2
+    return lehmer_to_permutation(corner_digits), co, lehmer_to_permutation(edge_digits), eo
@@ -1,6 +1,8 @@
 from dataclasses import dataclass, astuple
 from typing import Tuple
 
+import numpy as np
+
 
 @dataclass
 class GluPerspectiveDC:
@@ -22,3 +24,54 @@ class GameState:
 
     mouse_xy_delta: Tuple[float, float] = (0.0, 0.0)
     mouse_pressed: bool = False
+
+    # Set when the next frame must be drawn; when it is clear and nothing animates, the main loop sleeps on events
+    dirty: bool = True
+
+
+@dataclass
+class SearchStats:
+    nodes: int = 0
+    depth: int = 0
+    elapsed_sec: float = 0.0
+
+    @property
+    def nodes_per_sec(self) -> float:
+        return self.nodes / self.elapsed_sec if self.elapsed_sec else 0.0
+
+
+@dataclass
+class ExportStats:
+    width: int = 0
+    height: int = 0
+    frames: int = 0
+    bytes_written: int = 0
+    elapsed_sec: float = 0.0
+
+    @property
+    def frames_per_sec(self) -> float:
+        return self.frames / self.elapsed_sec if self.elapsed_sec else 0.0
+
+
+@dataclass
+class ServiceStats:
+    requests: int = 0
+    cache_hits: int = 0
+    solved: int = 0
+    batches: int = 0
+    batched: int = 0
+    rejected: int = 0
+    expired: int = 0
+    invalid: int = 0
+
+    @property
+    def mean_batch_size(self) -> float:
+        return self.batched / self.batches if self.batches else 0.0
+
+
+@dataclass
+class SessionFrame:
+    index: int
+    time: float
+    facelets: np.ndarray
+    drag: Tuple[int, int] = (0, 0)
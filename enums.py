@@ -31,6 +31,7 @@ class GlColors4f(Enum):
     ORANGE_SOLID = (1, 0.5, 0, 1)
 
     BLACK_SOLID = (0, 0, 0, 1)
+    GRAY_SOLID = (0.5, 0.5, 0.5, 1)
 
 
 @with_dict
@@ -73,6 +74,32 @@ class RubiksCubeRotations(StrEnum):
     R = 'R'
 
 
+@with_values
+class RubiksMoveVariations(StrEnum):
+    CLOCKWISE = ''
+    COUNTER_CLOCKWISE = "'"
+    HALF_TURN = '2'
+
+
+@with_values
+class CubeRenderModes(StrEnum):
+    VBO = 'vbo'
+    IMMEDIATE = 'immediate'
+
+
+@with_values
+class ReplacementPolicies(StrEnum):
+    ALWAYS = 'always'
+    DEPTH = 'depth'
+
+
+@with_values
+class SessionEventKinds(IntEnum):
+    TURN = 0
+    DRAG = 1
+    IDLE = 2
+
+
 @with_dict
 class RubiksAxes(Enum):
     X = (1, 0, 0)
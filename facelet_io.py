@@ -0,0 +1,244 @@
+import argparse
+import sys
+import time
+from typing import Dict, Iterable, List, NamedTuple, Tuple, Union
+
+import numpy as np
+
+from cube_batch import CubeBatch
+from cube_state import FACE_COLORS, FACE_ORDER, FACE_SURFACES, FACELET_COUNT
+from cubie_cube import CORNER_FACELETS, CORNER_LOOKUP, EDGE_FACELETS, EDGE_LOOKUP
+from enums import GlColors4f, Surfaces
+
+# Facelet strings list the 54 stickers in URFDLB order, each as the face its color belongs to, or as the initial of
+# that color's GlColors4f name: WBRYGO for the default color scheme
+FACE_ALPHABET: str = ''.join(FACE_ORDER)
+COLOR_ALPHABET: str = ''.join(FACE_COLORS[face].name[0] for face in FACE_ORDER)
+INVALID_FACELET: int = 255
+INVALID_LETTER: str = '?'
+LINE_BYTES: int = FACELET_COUNT + 1
+# Surface and RGBA color of every color index, and the surface every facelet position lies on
+COLOR_SURFACES: Tuple[Surfaces, ...] = tuple(FACE_SURFACES[face] for face in FACE_ORDER)
+COLOR_VALUES: Tuple[GlColors4f, ...] = tuple(FACE_COLORS[face] for face in FACE_ORDER)
+COLOR_RGBA: np.ndarray = np.array([color.value for color in COLOR_VALUES], dtype=np.float32)
+FACELET_SURFACES: Tuple[Surfaces, ...] = tuple(COLOR_SURFACES[i // 9] for i in range(FACELET_COUNT))
+# Rows are validated in chunks so the per-piece temporaries stay cache sized for any N
+VALIDATE_CHUNK_ROWS: int = 1 << 14
+# Sticker counts of a row packed 6 bits per color, each at most 54, in one sum; other bytes count nowhere
+COLOR_COUNT_BITS: np.ndarray = np.zeros(256, dtype=np.uint64)
+COLOR_COUNT_BITS[:len(FACE_ORDER)] = 1 << 6 * np.arange(len(FACE_ORDER))
+FULL_COLOR_COUNTS: np.uint64 = np.uint64(9) * COLOR_COUNT_BITS.sum()
+# Bit of every piece index, none for INVALID_PIECE
+PIECE_BITS: np.ndarray = np.zeros(256, dtype=np.uint16)
+PIECE_BITS[:12] = 1 << np.arange(12)
+
+CHECKS: Dict[str, str] = {
+    'characters': 'characters outside the alphabet, or not 54 of them',
+    'centers': 'centers not in URFDLB order',
+    'color_counts': 'not 9 stickers of every color',
+    'pieces': 'a corner or edge missing, repeated or with impossible colors',
+    'twist': 'corner twists do not sum to 0 mod 3',
+    'flip': 'edge flips do not sum to 0 mod 2',
+    'parity': 'corner and edge permutation parities differ',
+}
+
+
+def get_alphabet_lookup(alphabet: str) -> np.ndarray:
+    """
+    Returns: Color index of every byte value, INVALID_FACELET for bytes outside the 6 letter alphabet.
+    """
+    if len(alphabet) != len(FACE_ORDER) or len(set(alphabet)) != len(FACE_ORDER):
+        raise ValueError(f'Expected {len(FACE_ORDER)} distinct letters in URFDLB order, got {alphabet!r}')
+    lookup: np.ndarray = np.full(256, INVALID_FACELET, dtype=np.uint8)
+    lookup[np.frombuffer(alphabet.encode('ascii'), dtype=np.uint8)] = np.arange(len(alphabet))
+    return lookup
+
+
+def get_letters(alphabet: str) -> np.ndarray:
+    """
+    Returns: Letter of every facelet value, INVALID_LETTER for those outside the alphabet.
+    """
+    get_alphabet_lookup(alphabet)
+    letters: np.ndarray = np.full(256, ord(INVALID_LETTER), dtype=np.uint8)
+    letters[:len(alphabet)] = np.frombuffer(alphabet.encode('ascii'), dtype=np.uint8)
+    return letters
+
+
+def parse_facelet_lines(data: Union[bytes, Iterable[str]], alphabet: str = FACE_ALPHABET) -> np.ndarray:
+    """
+    Parses newline separated facelet strings, or an iterable of them, in one lookup over all bytes when every line
+    has 54 letters. Blank lines are skipped; other lines of the wrong length parse as rows of INVALID_FACELET, so
+    validate_facelets reports them with their row numbers.
+
+    Returns: (N, 54) uint8 facelets.
+    """
+    if not isinstance(data, (bytes, bytearray, memoryview)):
+        data = '\n'.join(data).encode('ascii', errors='replace')
+    data = bytes(data).replace(b'\r\n', b'\n')
+    if not data.endswith(b'\n'):
+        data += b'\n'
+    lookup: np.ndarray = get_alphabet_lookup(alphabet)
+    raw: np.ndarray = np.frombuffer(data, dtype=np.uint8)
+    if len(raw) % LINE_BYTES == 0 and (raw[FACELET_COUNT::LINE_BYTES] == ord('\n')).all():
+        return lookup[raw.reshape(-1, LINE_BYTES)[:, :FACELET_COUNT]]
+
+    lines: List[bytes] = [line for line in data.split(b'\n') if line.strip()]
+    facelets: np.ndarray = np.full((len(lines), FACELET_COUNT), INVALID_FACELET, dtype=np.uint8)
+    for row, line in enumerate(lines):
+        if len(line) == FACELET_COUNT:
+            facelets[row] = lookup[np.frombuffer(line, dtype=np.uint8)]
+    return facelets
+
+
+def format_facelet_lines(facelets: np.ndarray, alphabet: str = FACE_ALPHABET) -> bytes:
+    """
+    Returns: One newline terminated facelet string per row of (N, 54) facelets.
+    """
+    facelets = np.asarray(facelets)
+    if facelets.ndim != 2 or facelets.shape[1] != FACELET_COUNT:
+        raise ValueError(f'Expected a (N, {FACELET_COUNT}) state matrix, got shape {facelets.shape}')
+    lines: np.ndarray = np.empty((len(facelets), LINE_BYTES), dtype=np.uint8)
+    lines[:, :FACELET_COUNT] = get_letters(alphabet)[facelets]
+    lines[:, FACELET_COUNT] = ord('\n')
+    return lines.tobytes()
+
+
+def to_facelet_strings(facelets: np.ndarray, alphabet: str = FACE_ALPHABET) -> List[str]:
+    return format_facelet_lines(facelets, alphabet).decode('ascii').splitlines()
+
+
+def read_facelet_file(path: str, alphabet: str = FACE_ALPHABET) -> np.ndarray:
+    with open(path, 'rb') as f:
+        return parse_facelet_lines(f.read(), alphabet)
+
+
+def write_facelet_file(path: str, facelets: np.ndarray, alphabet: str = FACE_ALPHABET):
+    with open(path, 'wb') as f:
+        f.write(format_facelet_lines(facelets, alphabet))
+
+
+def get_rgba(facelets: np.ndarray) -> np.ndarray:
+    """
+    Returns: (..., 54, 4) float32 GlColors4f values of the facelets, as the renderers draw them.
+    """
+    return COLOR_RGBA[np.asarray(facelets)]
+
+
+class FaceletReport(NamedTuple):
+    """
+    One boolean per row and check of CHECKS, True where the row passes. Twist, flip and parity are only checked on
+    rows whose pieces are all present once, and pass elsewhere.
+    """
+    characters: np.ndarray
+    centers: np.ndarray
+    color_counts: np.ndarray
+    pieces: np.ndarray
+    twist: np.ndarray
+    flip: np.ndarray
+    parity: np.ndarray
+
+    @property
+    def valid(self) -> np.ndarray:
+        return np.logical_and.reduce(self)
+
+    @property
+    def bad_rows(self) -> np.ndarray:
+        return np.flatnonzero(~self.valid)
+
+    def get_reasons(self, row: int) -> List[str]:
+        return [CHECKS[name] for name, ok in zip(self._fields, self) if not ok[row]]
+
+    def get_counts(self) -> Dict[str, int]:
+        """
+        Returns: Number of rows failing each check.
+        """
+        return {name: int(len(ok) - np.count_nonzero(ok)) for name, ok in zip(self._fields, self)}
+
+
+def validate_chunk(facelets: np.ndarray) -> Tuple[np.ndarray, ...]:
+    # Facelet-major, so every check is a few element-wise passes over contiguous (rows,) columns
+    columns: np.ndarray = np.ascontiguousarray(facelets.T)
+    characters: np.ndarray = columns.max(axis=0) < len(FACE_ORDER)
+    centers: np.ndarray = (columns[4::9] == np.arange(len(FACE_ORDER), dtype=np.uint8)[:, None]).all(axis=0)
+    counts: np.ndarray = np.zeros(columns.shape[1], dtype=np.uint64)
+    for column in columns:
+        counts += COLOR_COUNT_BITS[column]
+    color_counts: np.ndarray = counts == FULL_COLOR_COUNTS
+
+    np.minimum(columns, len(FACE_ORDER) - 1, out=columns)
+    colors: np.ndarray = columns.astype(np.uint16)
+    corner_codes: np.ndarray = colors[CORNER_FACELETS[:, 0]] * 36 + colors[CORNER_FACELETS[:, 1]] * 6 \
+        + colors[CORNER_FACELETS[:, 2]]
+    edge_codes: np.ndarray = colors[EDGE_FACELETS[:, 0]] * 6 + colors[EDGE_FACELETS[:, 1]]
+    cp, co = CORNER_LOOKUP[0][corner_codes], CORNER_LOOKUP[1][corner_codes]
+    ep, eo = EDGE_LOOKUP[0][edge_codes], EDGE_LOOKUP[1][edge_codes]
+    # Every piece exactly once: unrecognized pieces have no bit, so only 8 or 12 distinct pieces fill the mask
+    pieces: np.ndarray = (np.bitwise_or.reduce(PIECE_BITS[cp], axis=0) == (1 << len(cp)) - 1) \
+        & (np.bitwise_or.reduce(PIECE_BITS[ep], axis=0) == (1 << len(ep)) - 1)
+
+    unchecked: np.ndarray = ~pieces
+    twist: np.ndarray = (co.sum(axis=0, dtype=np.uint8) % 3 == 0) | unchecked
+    flip: np.ndarray = (eo.sum(axis=0, dtype=np.uint8) % 2 == 0) | unchecked
+    parity: np.ndarray = (get_column_parity(cp) == get_column_parity(ep)) | unchecked
+    return characters, centers, color_counts, pieces, twist, flip, parity
+
+
+def get_column_parity(perms: np.ndarray) -> np.ndarray:
+    """
+    Returns: Inversion count parity of every column of an (n, rows) permutation array.
+    """
+    inversions: np.ndarray = np.zeros(perms.shape[1], dtype=np.uint8)
+    for i in range(len(perms) - 1):
+        for j in range(i + 1, len(perms)):
+            inversions += perms[j] < perms[i]
+    return inversions & 1
+
+
+def validate_facelets(facelets: np.ndarray) -> FaceletReport:
+    """
+    Checks every row of (N, 54) facelets, as parsed by parse_facelet_lines, for being a reachable cube state.
+    """
+    facelets = np.asarray(facelets, dtype=np.uint8)
+    if facelets.ndim != 2 or facelets.shape[1] != FACELET_COUNT:
+        raise ValueError(f'Expected a (N, {FACELET_COUNT}) state matrix, got shape {facelets.shape}')
+    checks: List[np.ndarray] = [np.empty(len(facelets), dtype=bool) for _ in FaceletReport._fields]
+    for start in range(0, len(facelets), VALIDATE_CHUNK_ROWS):
+        rows = slice(start, start + VALIDATE_CHUNK_ROWS)
+        for check, ok in zip(checks, validate_chunk(facelets[rows])):
+            check[rows] = ok
+    return FaceletReport(*checks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write uniformly random cube states as facelet strings, or '
+                                                 'validate a file of them.')
+    parser.add_argument('path', help='Facelet file, one 54 letter state per line')
+    parser.add_argument('--random', type=int, default=None, metavar='N',
+                        help='Write N uniformly random states to the file instead of validating it')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--colors', action='store_true',
+                        help=f'Use the color initials {COLOR_ALPHABET} instead of the faces {FACE_ALPHABET}')
+    parser.add_argument('--limit', type=int, default=20, help='Bad rows to list')
+    args = parser.parse_args()
+    alphabet: str = COLOR_ALPHABET if args.colors else FACE_ALPHABET
+
+    start: float = time.perf_counter()
+    if args.random is not None:
+        write_facelet_file(args.path, CubeBatch.random(args.random, np.random.default_rng(args.seed)).states, alphabet)
+        print(f'{args.random} states written in {time.perf_counter() - start:.2f} s')
+        return
+
+    facelets: np.ndarray = read_facelet_file(args.path, alphabet)
+    report: FaceletReport = validate_facelets(facelets)
+    bad_rows: np.ndarray = report.bad_rows
+    print(f'{len(facelets)} states read and validated in {time.perf_counter() - start:.2f} s, {len(bad_rows)} bad')
+    for name, count in report.get_counts().items():
+        if count:
+            print(f'  {count:10} {CHECKS[name]}')
+    for row in bad_rows[:args.limit]:
+        print(f'state {row + 1}: {"; ".join(report.get_reasons(row))}')
+    sys.exit(1 if len(bad_rows) else 0)
+
+
+if __name__ == '__main__':
+    main()
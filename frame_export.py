@@ -0,0 +1,267 @@
+import os
+
+# Without a display, let SDL create its window offscreen and PyOpenGL talk EGL; both must be set before the imports
+if not os.environ.get('DISPLAY') and not os.environ.get('WAYLAND_DISPLAY'):
+    os.environ.setdefault('SDL_VIDEODRIVER', 'offscreen')
+    os.environ.setdefault('PYOPENGL_PLATFORM', 'egl')
+
+import argparse
+import ctypes
+import struct
+import sys
+import time
+import zlib
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import BinaryIO, Deque, Iterable, Tuple, Union
+
+import numpy as np
+import pygame
+from OpenGL.GL import *
+from OpenGL.GLU import gluPerspective
+from OpenGL.raw.GL.VERSION.GL_1_0 import glReadPixels as gl_read_pixels_raw
+from pygame.locals import DOUBLEBUF, HIDDEN, OPENGL
+
+from cube_state import CubeState, Move, parse_moves, rotation_from_move
+from data_classes import ExportStats, GluPerspectiveDC
+from enums import GlColors4f
+from vbo_renderer import VboCubeRenderer
+
+PNG_SIGNATURE: bytes = b'\x89PNG\r\n\x1a\n'
+
+
+def png_chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+
+def encode_png(pixels: np.ndarray, compression: int = 3) -> bytes:
+    """
+    Returns: PNG file of a (height, width, 4) RGBA frame read back bottom row first.
+    """
+    height, width = pixels.shape[:2]
+    rows: np.ndarray = np.empty((height, 1 + width * 4), dtype=np.uint8)
+    rows[:, 0] = 0
+    rows[:, 1:] = pixels[::-1].reshape(height, -1)
+    header: bytes = struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)
+    return (PNG_SIGNATURE + png_chunk(b'IHDR', header)
+            + png_chunk(b'IDAT', zlib.compress(rows.tobytes(), compression)) + png_chunk(b'IEND', b''))
+
+
+def encode_raw(pixels: np.ndarray) -> bytes:
+    return pixels[::-1].tobytes()
+
+
+class OffscreenContext:
+    """
+    A hidden GL context rendering into a framebuffer object of any size, so no visible window or display is needed.
+    """
+
+    def __init__(self, width: int, height: int):
+        self.width: int = width
+        self.height: int = height
+        pygame.init()
+        pygame.display.set_mode((1, 1), DOUBLEBUF | OPENGL | HIDDEN)
+
+        self.__framebuffer = glGenFramebuffers(1)
+        glBindFramebuffer(GL_FRAMEBUFFER, self.__framebuffer)
+        self.__renderbuffers = glGenRenderbuffers(2)
+        for renderbuffer, storage, attachment in zip(self.__renderbuffers,
+                                                     (GL_RGBA8, GL_DEPTH_COMPONENT24),
+                                                     (GL_COLOR_ATTACHMENT0, GL_DEPTH_ATTACHMENT)):
+            glBindRenderbuffer(GL_RENDERBUFFER, renderbuffer)
+            glRenderbufferStorage(GL_RENDERBUFFER, storage, width, height)
+            glFramebufferRenderbuffer(GL_FRAMEBUFFER, attachment, GL_RENDERBUFFER, renderbuffer)
+        if glCheckFramebufferStatus(GL_FRAMEBUFFER) != GL_FRAMEBUFFER_COMPLETE:
+            raise RuntimeError('Offscreen framebuffer is incomplete')
+        glViewport(0, 0, width, height)
+
+    def release(self):
+        glBindFramebuffer(GL_FRAMEBUFFER, 0)
+        glDeleteRenderbuffers(2, self.__renderbuffers)
+        glDeleteFramebuffers(1, [self.__framebuffer])
+        pygame.quit()
+
+
+class PboReader:
+    """
+    Double-buffered asynchronous readback: frame i is read into one pixel pack buffer while frame i - 1 is mapped
+    from the other, so the CPU never waits for the GPU to finish the frame it just submitted.
+    """
+
+    def __init__(self, width: int, height: int):
+        self.__width: int = width
+        self.__height: int = height
+        self.__size: int = width * height * 4
+        self.__buffers = glGenBuffers(2)
+        for buffer in self.__buffers:
+            glBindBuffer(GL_PIXEL_PACK_BUFFER, buffer)
+            glBufferData(GL_PIXEL_PACK_BUFFER, self.__size, None, GL_STREAM_READ)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+        self.__next: int = 0
+        self.__pending: int = 0
+
+    def read(self) -> Union[np.ndarray, None]:
+        """
+        Starts reading the current frame. Returns: The previous frame, or None after the first read.
+        """
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, self.__buffers[self.__next])
+        gl_read_pixels_raw(0, 0, self.__width, self.__height, GL_RGBA, GL_UNSIGNED_BYTE, ctypes.c_void_p(0))
+        self.__next ^= 1
+        self.__pending += 1
+        previous: Union[np.ndarray, None] = self.__map(self.__buffers[self.__next]) if self.__pending > 1 else None
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+        return previous
+
+    def flush(self) -> Union[np.ndarray, None]:
+        """
+        Returns: The last frame started by read(), if it has not been returned yet.
+        """
+        if not self.__pending:
+            return None
+        frame: np.ndarray = self.__map(self.__buffers[self.__next ^ 1])
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+        self.__pending = 0
+        return frame
+
+    def __map(self, buffer) -> np.ndarray:
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, buffer)
+        address: int = glMapBuffer(GL_PIXEL_PACK_BUFFER, GL_READ_ONLY)
+        frame: np.ndarray = np.frombuffer((ctypes.c_ubyte * self.__size).from_address(address),
+                                          dtype=np.uint8).reshape(self.__height, self.__width, 4).copy()
+        glUnmapBuffer(GL_PIXEL_PACK_BUFFER)
+        return frame
+
+    def release(self):
+        glDeleteBuffers(2, self.__buffers)
+
+
+class FrameExporter:
+    """
+    Renders a move sequence offscreen and writes every frame as a PNG file or into one raw RGBA stream. Frames are
+    encoded on a thread pool (zlib releases the GIL) while the GPU renders the next ones; at most a few frames per
+    worker are in flight, so memory stays bounded for any sequence length.
+    """
+
+    def __init__(self, width: int = 640, height: int = 480, workers: int = None, compression: int = 3,
+                 glu_perspective: GluPerspectiveDC = None,
+                 camera_pos: Tuple[float, float, float] = (0.0, 0.0, -10.0)):
+        self.__context: OffscreenContext = OffscreenContext(width, height)
+        self.__reader: PboReader = PboReader(width, height)
+        self.__workers: int = workers or os.cpu_count()
+        self.__compression: int = compression
+
+        glEnable(GL_DEPTH_TEST)
+        # Gray rather than the window's white, so the white face stays visible
+        glClearColor(*GlColors4f.GRAY_SOLID.value)
+        glMatrixMode(GL_PROJECTION)
+        glLoadIdentity()
+        gluPerspective(*(glu_perspective or GluPerspectiveDC(fov_y=45, aspect_ratio=width / height,
+                                                             z_near=0.1, z_far=50.0)))
+        glTranslatef(*camera_pos)
+        glMatrixMode(GL_MODELVIEW)
+        glLoadIdentity()
+        # A three-quarter view, so three faces are visible
+        glRotatef(30, 1, 0, 0)
+        glRotatef(-40, 0, 1, 0)
+        self.__renderer: VboCubeRenderer = VboCubeRenderer(center_pos=(0.0, 0.0, 0.0))
+
+    def frames(self, moves: Union[str, Iterable[Move]], frames_per_turn: int,
+               state: CubeState = None) -> Iterable[Tuple[str, float, np.ndarray]]:
+        """
+        Yields: (rotation face, elapsed angle, facelets on screen) of every frame, ending on the final state at rest.
+        """
+        state = (state or CubeState()).copy()
+        for move in parse_moves(moves):
+            face, angle = rotation_from_move(move)
+            for frame in range(frames_per_turn):
+                yield face, angle * frame / frames_per_turn, state.facelets
+            state.apply_move(move)
+        yield None, 0.0, state.facelets
+
+    def export(self, moves: Union[str, Iterable[Move]], output: Union[str, BinaryIO], frames_per_turn: int = 15,
+               raw: bool = False, state: CubeState = None) -> ExportStats:
+        """
+        Writes the frames to output: a directory of frame_00000.png files, or with raw a binary stream (or path) of
+        width * height * 4 byte RGBA frames, top row first.
+        """
+        stream: BinaryIO = None
+        if raw:
+            stream = open(output, 'wb') if isinstance(output, str) else output
+        else:
+            os.makedirs(output, exist_ok=True)
+
+        stats: ExportStats = ExportStats(width=self.__context.width, height=self.__context.height)
+        pending: Deque[Future] = deque()
+
+        def write(frame: np.ndarray):
+            if raw:
+                pending.append(pool.submit(encode_raw, frame))
+            else:
+                pending.append(pool.submit(self.__write_png, frame,
+                                           os.path.join(output, f'frame_{stats.frames:05d}.png')))
+            stats.frames += 1
+            while len(pending) > 2 * self.__workers or (pending and pending[0].done()):
+                self.__finish(pending.popleft(), stream, stats)
+
+        start: float = time.perf_counter()
+        with ThreadPoolExecutor(self.__workers) as pool:
+            for face, angle, facelets in self.frames(moves, frames_per_turn, state):
+                glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+                self.__renderer.set_facelets(facelets)
+                self.__renderer.render(rotation_face=face, elapsed_angle=angle)
+                previous: np.ndarray = self.__reader.read()
+                if previous is not None:
+                    write(previous)
+            last: np.ndarray = self.__reader.flush()
+            if last is not None:
+                write(last)
+            while pending:
+                self.__finish(pending.popleft(), stream, stats)
+        stats.elapsed_sec = time.perf_counter() - start
+
+        if stream is not None:
+            stream.flush()
+            if isinstance(output, str):
+                stream.close()
+        return stats
+
+    def __write_png(self, frame: np.ndarray, path: str) -> bytes:
+        data: bytes = encode_png(frame, self.__compression)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return data
+
+    @staticmethod
+    def __finish(future: Future, stream: BinaryIO, stats: ExportStats):
+        data: bytes = future.result()
+        stats.bytes_written += len(data)
+        if stream is not None:
+            stream.write(data)
+
+    def release(self):
+        self.__renderer.release()
+        self.__reader.release()
+        self.__context.release()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Render a move sequence offscreen to PNG frames or raw RGBA.')
+    parser.add_argument('moves', help="Move sequence, e.g. \"R U R' U'\"")
+    parser.add_argument('output', help="Directory for PNG frames, or with --raw a file path or '-' for stdout")
+    parser.add_argument('--raw', action='store_true', help='Write one raw RGBA stream instead of PNG files')
+    parser.add_argument('--size', type=int, nargs=2, default=(640, 480), metavar=('WIDTH', 'HEIGHT'))
+    parser.add_argument('--frames-per-turn', type=int, default=15)
+    parser.add_argument('--workers', type=int, default=None, help='Encoder threads, default one per CPU')
+    parser.add_argument('--compression', type=int, default=3, help='zlib level of the PNG frames')
+    args = parser.parse_args()
+
+    output: Union[str, BinaryIO] = sys.stdout.buffer if args.raw and args.output == '-' else args.output
+    exporter: FrameExporter = FrameExporter(*args.size, workers=args.workers, compression=args.compression)
+    stats: ExportStats = exporter.export(args.moves, output, args.frames_per_turn, raw=args.raw)
+    exporter.release()
+    print(f'{stats.frames} frames {stats.width}x{stats.height} in {stats.elapsed_sec:.2f} s: '
+          f'{stats.frames_per_sec:.1f} frames/s, {stats.bytes_written / 1e6:.1f} MB', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+import json
+import time
+from contextlib import nullcontext
+from typing import Dict, List
+
+import numpy as np
+
+DEFAULT_CAPACITY: int = 1024
+MAX_SPANS: int = 16
+
+# Shared no-op context, so a disabled profiler costs one attribute check per span
+NULL_SPAN = nullcontext()
+
+
+class Span:
+    """
+    Reusable timer for one span name; spans of the same name do not nest.
+    """
+
+    __slots__ = ('_profiler', '_column', '_start')
+
+    def __init__(self, profiler: 'FrameProfiler', column: int):
+        self._profiler: FrameProfiler = profiler
+        self._column: int = column
+        self._start: float = 0.0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._profiler.record(self._column, self._start, time.perf_counter())
+        return False
+
+
+class FrameProfiler:
+    """
+    Named timing spans per frame, kept in a ring buffer of the last `capacity` frames. The main loop is the only
+    writer: a frame's row is filled in place and published by advancing the frame counter, so readers never take a
+    lock and see every completed frame whole, as long as they read it before it is overwritten.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, enabled: bool = False):
+        self.enabled: bool = enabled
+        self.capacity: int = capacity
+        self.__names: List[str] = []
+        self.__spans: Dict[str, Span] = {}
+
+        self.__frame_starts: np.ndarray = np.zeros(capacity, dtype=np.float64)
+        self.__frame_durations: np.ndarray = np.zeros(capacity, dtype=np.float64)
+        self.__span_starts: np.ndarray = np.zeros((capacity, MAX_SPANS), dtype=np.float64)
+        self.__span_durations: np.ndarray = np.zeros((capacity, MAX_SPANS), dtype=np.float64)
+        self.__frame_count: int = 0
+        self.__frame_start: float = 0.0
+        # Profiling can be switched on between begin_frame and end_frame; that frame has no start and is not kept
+        self.__frame_open: bool = False
+
+    @property
+    def frame_count(self) -> int:
+        return self.__frame_count
+
+    def span(self, name: str):
+        if not self.enabled:
+            return NULL_SPAN
+        span: Span = self.__spans.get(name)
+        if span is None:
+            if len(self.__names) == MAX_SPANS:
+                raise ValueError(f'At most {MAX_SPANS} span names are supported')
+            span = self.__spans[name] = Span(self, len(self.__names))
+            self.__names.append(name)
+        return span
+
+    def begin_frame(self):
+        if not self.enabled:
+            return
+        row: int = self.__frame_count % self.capacity
+        self.__span_durations[row] = 0.0
+        self.__frame_start = time.perf_counter()
+        self.__frame_open = True
+
+    def record(self, column: int, start: float, stop: float):
+        row: int = self.__frame_count % self.capacity
+        # A span entered several times in one frame is traced once, from its first start, with the summed duration
+        if not self.__span_durations[row, column]:
+            self.__span_starts[row, column] = start
+        self.__span_durations[row, column] += stop - start
+
+    def end_frame(self):
+        # A frame left open while profiling was switched off would be recorded with the whole time it was off
+        frame_open: bool = self.__frame_open
+        self.__frame_open = False
+        if not self.enabled or not frame_open:
+            return
+        row: int = self.__frame_count % self.capacity
+        self.__frame_starts[row] = self.__frame_start
+        self.__frame_durations[row] = time.perf_counter() - self.__frame_start
+        self.__frame_count += 1
+
+    def __rows(self) -> np.ndarray:
+        """
+        Returns: Ring buffer rows of the completed frames still held, oldest first.
+        """
+        count: int = self.__frame_count
+        held: int = min(count, self.capacity)
+        return np.arange(count - held, count) % self.capacity
+
+    def frame_times(self) -> np.ndarray:
+        return self.__frame_durations[self.__rows()]
+
+    def span_times(self, name: str) -> np.ndarray:
+        return self.__span_durations[self.__rows(), self.__names.index(name)]
+
+    def percentiles(self, quantiles=(50, 95, 99)) -> Dict[str, np.ndarray]:
+        """
+        Returns: Seconds at each percentile for 'frame' and every span name, over the frames in the buffer.
+        """
+        rows: np.ndarray = self.__rows()
+        if rows.size == 0:
+            return {}
+        result: Dict[str, np.ndarray] = {'frame': np.percentile(self.__frame_durations[rows], quantiles)}
+        for column, name in enumerate(self.__names):
+            result[name] = np.percentile(self.__span_durations[rows, column], quantiles)
+        return result
+
+    def summary(self) -> str:
+        """
+        Returns: One line of frame time p50/p95/p99 in ms, for the on-screen overlay.
+        """
+        stats: Dict[str, np.ndarray] = self.percentiles()
+        if not stats:
+            return 'no frames'
+        p50, p95, p99 = stats['frame'] * 1000
+        return f'frame ms p50 {p50:.1f} p95 {p95:.1f} p99 {p99:.1f}'
+
+    def chrome_trace(self) -> dict:
+        """
+        Returns: The buffered frames in Chrome trace event format (chrome://tracing, Perfetto), times in microseconds.
+        """
+        events: List[dict] = []
+        for row in self.__rows():
+            events.append({'name': 'frame', 'ph': 'X', 'pid': 0, 'tid': 0,
+                           'ts': self.__frame_starts[row] * 1e6, 'dur': self.__frame_durations[row] * 1e6})
+            for column, name in enumerate(self.__names):
+                duration: float = self.__span_durations[row, column]
+                if duration:
+                    events.append({'name': name, 'ph': 'X', 'pid': 0, 'tid': 0,
+                                   'ts': self.__span_starts[row, column] * 1e6, 'dur': duration * 1e6})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def save_chrome_trace(self, path: str):
+        with open(path, 'w') as f:
+            json.dump(self.chrome_trace(), f)
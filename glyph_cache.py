@@ -0,0 +1,133 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+import pygame
+from OpenGL.GL import *
+
+LabelKey = Tuple[str, Tuple[int, int, int, int], Tuple[int, int, int, int], int]
+
+
+@dataclass
+class AtlasRegion:
+    slot: int
+    u0: float
+    v0: float
+    u1: float
+    v1: float
+
+    @property
+    def quad_tex_coords(self) -> List[Tuple[float, float]]:
+        # Same corner order as Button vertices: top left, bottom left, bottom right, top right
+        return [(self.u0, self.v1), (self.u0, self.v0), (self.u1, self.v0), (self.u1, self.v1)]
+
+
+class GlyphAtlas:
+    """
+    Rendered labels packed into one texture of equally sized cells. Every (text, color, background, size) label is
+    rasterized and uploaded once; when the atlas is full the least recently drawn label gives up its cell.
+    """
+
+    def __init__(self, width: int = 1024, height: int = 1024, cell_width: int = 256, cell_height: int = 160):
+        self.__width: int = width
+        self.__height: int = height
+        self.__cell_width: int = cell_width
+        self.__cell_height: int = cell_height
+        self.__columns: int = width // cell_width
+        self.__capacity: int = self.__columns * (height // cell_height)
+
+        self.__texture = None
+        self.__fonts: Dict[int, pygame.font.Font] = {}
+        self.__regions: 'OrderedDict[LabelKey, AtlasRegion]' = OrderedDict()
+        self.__free_slots: List[int] = list(range(self.__capacity))
+        self.uploads: int = 0
+        self.evictions: int = 0
+
+    @property
+    def capacity(self) -> int:
+        return self.__capacity
+
+    def __len__(self) -> int:
+        return len(self.__regions)
+
+    def __create_texture(self):
+        self.__texture = glGenTextures(1)
+        glBindTexture(GL_TEXTURE_2D, self.__texture)
+        glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, self.__width, self.__height, 0, GL_RGBA, GL_UNSIGNED_BYTE, None)
+        glTexParameterf(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+        glTexParameterf(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
+
+    def __font(self, size: int) -> pygame.font.Font:
+        if size not in self.__fonts:
+            self.__fonts[size] = pygame.font.Font(None, size=size)
+        return self.__fonts[size]
+
+    def get(self, key: LabelKey) -> AtlasRegion:
+        region: AtlasRegion = self.__regions.get(key)
+        if region is not None:
+            self.__regions.move_to_end(key)
+            return region
+
+        if not self.__free_slots:
+            _, evicted = self.__regions.popitem(last=False)
+            self.__free_slots.append(evicted.slot)
+            self.evictions += 1
+        region = self.__upload(key, self.__free_slots.pop())
+        self.__regions[key] = region
+        return region
+
+    def __upload(self, key: LabelKey, slot: int) -> AtlasRegion:
+        text, text_color, background_color, size = key
+        text_surface: pygame.Surface = self.__font(size).render(text, True, text_color, background_color)
+        width, height = text_surface.get_size()
+        if width > self.__cell_width or height > self.__cell_height:
+            scale: float = min(self.__cell_width / width, self.__cell_height / height)
+            width, height = max(1, int(width * scale)), max(1, int(height * scale))
+            text_surface = pygame.transform.scale(text_surface, (width, height))
+
+        if self.__texture is None:
+            self.__create_texture()
+        x: int = (slot % self.__columns) * self.__cell_width
+        y: int = (slot // self.__columns) * self.__cell_height
+        glBindTexture(GL_TEXTURE_2D, self.__texture)
+        glTexSubImage2D(GL_TEXTURE_2D, 0, x, y, width, height, GL_RGBA, GL_UNSIGNED_BYTE,
+                        pygame.image.tostring(text_surface, "RGBA", True))
+        self.uploads += 1
+        return AtlasRegion(slot=slot,
+                           u0=x / self.__width, v0=y / self.__height,
+                           u1=(x + width) / self.__width, v1=(y + height) / self.__height)
+
+    def draw(self, labels: Sequence[Tuple[LabelKey, Sequence[Tuple[float, float, float]]]]):
+        """
+        Draws every (label, quad vertices) pair from the atlas texture with a single draw call.
+        """
+        if not labels:
+            return
+        regions: List[AtlasRegion] = [self.get(key) for key, _ in labels]
+        vertices: np.ndarray = np.array([vertex for _, quad in labels for vertex in quad], dtype=np.float32)
+        tex_coords: np.ndarray = np.array([uv for region in regions for uv in region.quad_tex_coords],
+                                          dtype=np.float32)
+
+        glEnable(GL_BLEND)
+        glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+        glEnable(GL_TEXTURE_2D)
+        glBindTexture(GL_TEXTURE_2D, self.__texture)
+        glColor4f(1, 1, 1, 1)
+
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glEnableClientState(GL_TEXTURE_COORD_ARRAY)
+        glVertexPointer(3, GL_FLOAT, 0, vertices)
+        glTexCoordPointer(2, GL_FLOAT, 0, tex_coords)
+        glDrawArrays(GL_QUADS, 0, len(vertices))
+        glDisableClientState(GL_TEXTURE_COORD_ARRAY)
+        glDisableClientState(GL_VERTEX_ARRAY)
+
+        glDisable(GL_TEXTURE_2D)
+
+    def release(self):
+        if self.__texture is not None:
+            glDeleteTextures([self.__texture])
+            self.__texture = None
+        self.__regions.clear()
+        self.__free_slots = list(range(self.__capacity))
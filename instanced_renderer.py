@@ -0,0 +1,349 @@
+import ctypes
+from math import ceil, sqrt
+from typing import List, Optional, Tuple, Union
+
+import numpy as np
+from OpenGL.GL import *
+
+from cube_state import FACE_FRAMES, FACE_ORDER, FACELET_COUNT, MOVE_COUNT, rotation_from_move
+from vbo_renderer import BODY_COLOR_RGBA, FACE_COLORS_RGBA, PIECE_SPACING, QUAD_COUNT, QUAD_PIECES, VERTEX_SCALE, \
+    VboCubeRenderer, get_box_vertices, get_changed_runs, get_piece_grid
+
+# Shared cubie geometry: cube-local position, the piece it belongs to, and its facelet (-1 for the black body)
+SHARED_VERTEX_DTYPE: np.dtype = np.dtype([('position', np.float32, 3), ('piece', np.float32, 3),
+                                          ('facelet', np.float32)])
+# Per cube: offset xyz and scale, then the outward normal of the turning face and the turned angle in degrees
+INSTANCE_DTYPE: np.dtype = np.dtype([('placement', np.float32, 4), ('turn', np.float32, 4)])
+
+# Generic attribute locations, bound before linking
+ATTRIBUTE_LOCATIONS = {'position': 0, 'piece': 1, 'facelet': 2, 'placement': 3, 'turn': 4}
+
+# The shared buffer holds a black core box, the pieces' quads with the stickers first, then per face the core split
+# into the turning layer and the rest. Software drivers are bound by vertex count here, so at rest a cube is drawn as
+# the core and the stickers, a third of the vertices of all pieces, and while a face turns as the stickers and the
+# split core of that face. All pieces are only drawn when cubes turn different faces at once.
+CORE_QUAD_COUNT: int = 6
+SPLIT_CORE_QUAD_COUNT: int = 2 * CORE_QUAD_COUNT
+IDLE_QUADS: Tuple[int, int] = (0, CORE_QUAD_COUNT + FACELET_COUNT)
+STICKER_QUADS: Tuple[int, int] = (CORE_QUAD_COUNT, CORE_QUAD_COUNT + FACELET_COUNT)
+PIECE_QUADS: Tuple[int, int] = (CORE_QUAD_COUNT, CORE_QUAD_COUNT + QUAD_COUNT)
+SPLIT_CORE_START: int = CORE_QUAD_COUNT + QUAD_COUNT
+# The core sits just inside the sticker surface, so it fills the gaps between pieces without covering stickers
+CORE_INSET: float = 0.01
+
+# Centers of neighboring cubes in a grid are this many piece edges apart
+GRID_SPACING: float = 4.0
+
+VERTEX_SHADER: str = f'''
+#version 140
+uniform mat4 model_view_projection;
+uniform vec4 palette[{len(FACE_ORDER) + 1}];
+uniform usamplerBuffer facelets;
+in vec3 position;
+in vec3 piece;
+in float facelet;
+in vec4 placement;
+in vec4 turn;
+out vec4 color;
+
+void main() {{
+    vec3 p = position;
+    // Pieces of the turning layer rotate about the face's positive axis, like glRotatef
+    if (turn.w != 0.0 && dot(piece, turn.xyz) > 0.5) {{
+        vec3 axis = abs(turn.xyz);
+        float angle = radians(turn.w);
+        p = p * cos(angle) + cross(axis, p) * sin(angle) + axis * dot(axis, p) * (1.0 - cos(angle));
+    }}
+    gl_Position = model_view_projection * vec4(placement.xyz + p * placement.w, 1.0);
+    int sticker = int(facelet);
+    color = sticker < 0 ? palette[{len(FACE_ORDER)}]
+                        : palette[texelFetch(facelets, gl_InstanceID * {FACELET_COUNT} + sticker).r];
+}}
+'''
+
+FRAGMENT_SHADER: str = '''
+#version 140
+in vec4 color;
+out vec4 frag_color;
+
+void main() {
+    frag_color = color;
+}
+'''
+
+
+def get_move_turns() -> np.ndarray:
+    """
+    Returns: (MOVE_COUNT + 1, 4) instance turn of every move at its full angle; the last row, for move -1, is no turn.
+    """
+    turns: np.ndarray = np.zeros((MOVE_COUNT + 1, 4), dtype=np.float32)
+    for move in range(MOVE_COUNT):
+        face, angle = rotation_from_move(move)
+        turns[move] = (*FACE_FRAMES[face][0], angle)
+    return turns
+
+
+MOVE_TURNS: np.ndarray = get_move_turns()
+
+
+def get_grid_offsets(count: int, spacing: float, columns: int = None) -> np.ndarray:
+    """
+    Returns: (count, 3) centers of a grid of cubes in the x-y plane, filled row by row from the top left and centered
+    on the origin.
+    """
+    columns = columns or max(1, ceil(sqrt(count)))
+    rows: int = ceil(count / columns)
+    row, column = np.divmod(np.arange(count), columns)
+    offsets: np.ndarray = np.zeros((count, 3), dtype=np.float32)
+    offsets[:, 0] = (column - (columns - 1) / 2) * spacing
+    offsets[:, 1] = ((rows - 1) / 2 - row) * spacing
+    return offsets
+
+
+def compile_program(vertex_source: str, fragment_source: str):
+    shaders = []
+    for kind, source in ((GL_VERTEX_SHADER, vertex_source), (GL_FRAGMENT_SHADER, fragment_source)):
+        shader = glCreateShader(kind)
+        glShaderSource(shader, source)
+        glCompileShader(shader)
+        if not glGetShaderiv(shader, GL_COMPILE_STATUS):
+            raise RuntimeError(f'Shader compilation failed: {glGetShaderInfoLog(shader).decode()}')
+        shaders.append(shader)
+
+    program = glCreateProgram()
+    for shader in shaders:
+        glAttachShader(program, shader)
+    for name, location in ATTRIBUTE_LOCATIONS.items():
+        glBindAttribLocation(program, location, name)
+    glBindFragDataLocation(program, 0, 'frag_color')
+    glLinkProgram(program)
+    for shader in shaders:
+        glDeleteShader(shader)
+    if not glGetProgramiv(program, GL_LINK_STATUS):
+        raise RuntimeError(f'Shader linking failed: {glGetProgramInfoLog(program).decode()}')
+    return program
+
+
+class InstancedCubeRenderer:
+    """
+    Draws up to `capacity` 3x3x3 cubes in one instanced draw call. The cubie geometry of one cube is uploaded once;
+    each cube's placement and turn live in an instance buffer, and its 54 facelets in a texture buffer that is
+    updated in bulk from a (N, 54) state matrix, so a frame costs the same few GL calls for any number of cubes.
+    """
+
+    def __init__(self, capacity: int, piece_edge_length: float = 1.0):
+        self.__capacity: int = capacity
+        self.__shared_vertices: np.ndarray = self.get_shared_vertices(piece_edge_length)
+        self.__instances: np.ndarray = np.zeros(capacity, dtype=INSTANCE_DTYPE)
+        self.__instances['placement'][:, 3] = 1.0
+        self.__instances_dirty: bool = True
+        self.__draw_ranges: List[Tuple[int, int]] = [IDLE_QUADS]
+        self.__states: Optional[np.ndarray] = None
+        self.count: int = 0
+
+        self.__program = None
+        self.__vertex_array = None
+        self.__buffers = None
+        self.__facelet_texture = None
+        self.__uniforms = {}
+        self.uploads: int = 0
+
+    @property
+    def capacity(self) -> int:
+        return self.__capacity
+
+    @staticmethod
+    def get_shared_vertices(piece_edge_length: float) -> np.ndarray:
+        vertices: np.ndarray = np.zeros((SPLIT_CORE_START + len(FACE_ORDER) * SPLIT_CORE_QUAD_COUNT) * 4,
+                                        dtype=SHARED_VERTEX_DTYPE)
+        vertices['facelet'] = -1
+        core_half: float = ((PIECE_SPACING + 0.5) * VERTEX_SCALE - CORE_INSET) * piece_edge_length
+        vertices[:CORE_QUAD_COUNT * 4]['position'] = get_box_vertices(np.full(3, -core_half), np.full(3, core_half))
+
+        # The turning layer ends where its pieces do, the rest where the middle layer's pieces do
+        layer_inner: float = (PIECE_SPACING - 0.5) * VERTEX_SCALE * piece_edge_length
+        middle_outer: float = 0.5 * VERTEX_SCALE * piece_edge_length
+        for f, face in enumerate(FACE_ORDER):
+            normal: np.ndarray = np.array(FACE_FRAMES[face][0])
+            axis: int = int(np.flatnonzero(normal)[0])
+            start: int = (SPLIT_CORE_START + f * SPLIT_CORE_QUAD_COUNT) * 4
+            for near, far, piece in ((layer_inner, core_half, normal), (-core_half, middle_outer, np.zeros(3))):
+                low, high = np.full(3, -core_half), np.full(3, core_half)
+                low[axis], high[axis] = sorted((near * normal[axis], far * normal[axis]))
+                box: np.ndarray = vertices[start:start + CORE_QUAD_COUNT * 4]
+                box['position'] = get_box_vertices(low, high)
+                box['piece'] = piece
+                start += CORE_QUAD_COUNT * 4
+
+        pieces: np.ndarray = vertices[CORE_QUAD_COUNT * 4:SPLIT_CORE_START * 4]
+        pieces['position'] = VboCubeRenderer.get_vertices((0.0, 0.0, 0.0), piece_edge_length)['position']
+        pieces['piece'] = np.repeat(get_piece_grid()[QUAD_PIECES], 4, axis=0)
+        # Piece quads start with the stickers in facelet order, see vbo_renderer.get_quad_layout
+        quad_facelets: np.ndarray = np.full(QUAD_COUNT, -1)
+        quad_facelets[:FACELET_COUNT] = np.arange(FACELET_COUNT)
+        pieces['facelet'] = np.repeat(quad_facelets, 4)
+
+        # Every quad winds counterclockwise seen from outside its box or piece, so back faces can be culled
+        quads: np.ndarray = vertices.reshape(-1, 4)
+        corners: np.ndarray = quads['position']
+        centers: np.ndarray = np.zeros((len(quads), 3))
+        centers[CORE_QUAD_COUNT:SPLIT_CORE_START] = (get_piece_grid()[QUAD_PIECES] * PIECE_SPACING * VERTEX_SCALE
+                                                     * piece_edge_length)
+        split_boxes: np.ndarray = corners[SPLIT_CORE_START:].reshape(-1, CORE_QUAD_COUNT * 4, 3)
+        centers[SPLIT_CORE_START:] = np.repeat(split_boxes.mean(axis=1), CORE_QUAD_COUNT, axis=0)
+        normals: np.ndarray = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 1])
+        inward: np.ndarray = np.einsum('ij,ij->i', normals, corners.mean(axis=1) - centers) < 0
+        quads[inward] = quads[inward][:, ::-1]
+        return vertices
+
+    def get_draw_ranges(self) -> List[Tuple[int, int]]:
+        """
+        Returns: (first, stop) quad ranges of the shared buffer to draw for the current turns.
+        """
+        turns: np.ndarray = self.__instances['turn'][:self.count]
+        faces: np.ndarray = np.unique(turns[turns[:, 3] != 0, :3], axis=0)
+        if len(faces) == 0:
+            return [IDLE_QUADS]
+        if len(faces) > 1:
+            return [PIECE_QUADS]
+        # Cubes at rest are drawn correctly by the split core too
+        face: int = next(f for f, name in enumerate(FACE_ORDER) if (faces[0] == FACE_FRAMES[name][0]).all())
+        split_core: int = SPLIT_CORE_START + face * SPLIT_CORE_QUAD_COUNT
+        return [STICKER_QUADS, (split_core, split_core + SPLIT_CORE_QUAD_COUNT)]
+
+    def __create_resources(self):
+        if self.__capacity * FACELET_COUNT > glGetIntegerv(GL_MAX_TEXTURE_BUFFER_SIZE):
+            raise ValueError(f'{self.__capacity} cubes exceed the texture buffer size of this GL driver')
+        self.__program = compile_program(VERTEX_SHADER, FRAGMENT_SHADER)
+        self.__uniforms = {name: glGetUniformLocation(self.__program, name)
+                           for name in ('model_view_projection', 'palette', 'facelets')}
+        palette: np.ndarray = np.vstack([FACE_COLORS_RGBA, BODY_COLOR_RGBA]).astype(np.float32) / 255
+        glUseProgram(self.__program)
+        glUniform4fv(self.__uniforms['palette'], len(palette), palette)
+        glUniform1i(self.__uniforms['facelets'], 0)
+        glUseProgram(0)
+
+        shared_buffer, instance_buffer, facelet_buffer = self.__buffers = glGenBuffers(3)
+        glBindBuffer(GL_ARRAY_BUFFER, shared_buffer)
+        glBufferData(GL_ARRAY_BUFFER, self.__shared_vertices.nbytes, self.__shared_vertices.view(np.uint8),
+                     GL_STATIC_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, instance_buffer)
+        glBufferData(GL_ARRAY_BUFFER, self.__instances.nbytes, None, GL_DYNAMIC_DRAW)
+        glBindBuffer(GL_TEXTURE_BUFFER, facelet_buffer)
+        glBufferData(GL_TEXTURE_BUFFER, self.__capacity * FACELET_COUNT, None, GL_DYNAMIC_DRAW)
+        glBindBuffer(GL_TEXTURE_BUFFER, 0)
+        self.__facelet_texture = glGenTextures(1)
+        glBindTexture(GL_TEXTURE_BUFFER, self.__facelet_texture)
+        glTexBuffer(GL_TEXTURE_BUFFER, GL_R8UI, facelet_buffer)
+        glBindTexture(GL_TEXTURE_BUFFER, 0)
+
+        # The attribute layout is recorded once in a vertex array object
+        self.__vertex_array = glGenVertexArrays(1)
+        glBindVertexArray(self.__vertex_array)
+        for buffer, dtype, divisor in ((shared_buffer, SHARED_VERTEX_DTYPE, 0), (instance_buffer, INSTANCE_DTYPE, 1)):
+            glBindBuffer(GL_ARRAY_BUFFER, buffer)
+            for name in dtype.names:
+                field_dtype, offset = dtype.fields[name][:2]
+                location: int = ATTRIBUTE_LOCATIONS[name]
+                glEnableVertexAttribArray(location)
+                glVertexAttribPointer(location, int(np.prod(field_dtype.shape or 1)), GL_FLOAT, GL_FALSE,
+                                      dtype.itemsize, ctypes.c_void_p(offset))
+                glVertexAttribDivisor(location, divisor)
+        glBindVertexArray(0)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        self.uploads += 1
+
+    def set_states(self, states: np.ndarray):
+        """
+        Recolors the cubes from a (N, 54) state matrix, uploading each contiguous run of changed cubes with one buffer
+        update. Only the first N cubes are drawn from then on.
+        """
+        states = np.ascontiguousarray(states, dtype=np.uint8)
+        if states.ndim != 2 or states.shape[1] != FACELET_COUNT or len(states) > self.__capacity:
+            raise ValueError(f'Expected a (N <= {self.__capacity}, {FACELET_COUNT}) state matrix, '
+                             f'got shape {states.shape}')
+        if self.__program is None:
+            self.__create_resources()
+        if self.__states is None or self.__states.shape != states.shape:
+            changed: np.ndarray = np.arange(len(states))
+        else:
+            changed = np.flatnonzero((states != self.__states).any(axis=1))
+        if len(states) != self.count:
+            self.__instances_dirty = True
+        self.count = len(states)
+        if changed.size == 0:
+            return
+        self.__states = states.copy()
+
+        glBindBuffer(GL_TEXTURE_BUFFER, self.__buffers[2])
+        for start, stop in get_changed_runs(changed):
+            glBufferSubData(GL_TEXTURE_BUFFER, start * FACELET_COUNT, (stop - start) * FACELET_COUNT,
+                            states[start:stop])
+            self.uploads += 1
+        glBindBuffer(GL_TEXTURE_BUFFER, 0)
+
+    def set_placements(self, offsets: np.ndarray, scales: Union[float, np.ndarray] = 1.0):
+        """
+        Places cube i at offsets[i], scaled by scales[i] (or one scale for all).
+        """
+        offsets = np.asarray(offsets, dtype=np.float32)
+        placements: np.ndarray = self.__instances['placement'][:len(offsets)]
+        placements[:, :3] = offsets
+        placements[:, 3] = scales
+        self.__instances_dirty = True
+
+    def set_turns(self, moves: Union[int, np.ndarray], fractions: Union[float, np.ndarray] = 0.0):
+        """
+        Shows cube i turning moves[i] (-1 for none), fractions[i] of the way; a single move or fraction applies to
+        every cube drawn.
+        """
+        moves, fractions = np.broadcast_arrays(np.asarray(moves), np.asarray(fractions, dtype=np.float32))
+        if moves.ndim == 0:
+            moves, fractions = (np.broadcast_to(_, self.count) for _ in (moves, fractions))
+        turns: np.ndarray = MOVE_TURNS[moves]
+        turns[:, 3] *= fractions
+        self.__instances['turn'][:len(turns)] = turns
+        self.__instances_dirty = True
+
+    def render(self):
+        if self.__program is None:
+            self.__create_resources()
+        if not self.count:
+            return
+        if self.__instances_dirty:
+            glBindBuffer(GL_ARRAY_BUFFER, self.__buffers[1])
+            glBufferSubData(GL_ARRAY_BUFFER, 0, self.count * INSTANCE_DTYPE.itemsize,
+                            self.__instances[:self.count].view(np.uint8))
+            glBindBuffer(GL_ARRAY_BUFFER, 0)
+            self.__instances_dirty = False
+            self.__draw_ranges = self.get_draw_ranges()
+            self.uploads += 1
+
+        # The fixed-function matrices stay the source of truth, so the scene follows the app's camera
+        model_view: np.ndarray = np.asarray(glGetFloatv(GL_MODELVIEW_MATRIX), dtype=np.float32)
+        projection: np.ndarray = np.asarray(glGetFloatv(GL_PROJECTION_MATRIX), dtype=np.float32)
+        glUseProgram(self.__program)
+        glUniformMatrix4fv(self.__uniforms['model_view_projection'], 1, GL_FALSE, model_view @ projection)
+        glActiveTexture(GL_TEXTURE0)
+        glBindTexture(GL_TEXTURE_BUFFER, self.__facelet_texture)
+        glBindVertexArray(self.__vertex_array)
+        glEnable(GL_CULL_FACE)
+        for first, stop in self.__draw_ranges:
+            glDrawArraysInstanced(GL_QUADS, first * 4, (stop - first) * 4, self.count)
+        glDisable(GL_CULL_FACE)
+        glBindVertexArray(0)
+        glBindTexture(GL_TEXTURE_BUFFER, 0)
+        glUseProgram(0)
+
+    def release(self):
+        if self.__program is not None:
+            glDeleteVertexArrays(1, [self.__vertex_array])
+            glDeleteTextures(1, [self.__facelet_texture])
+            glDeleteBuffers(len(self.__buffers), self.__buffers)
+            glDeleteProgram(self.__program)
+        self.__program = None
+        self.__vertex_array = None
+        self.__buffers = None
+        self.__facelet_texture = None
+        self.__states = None
+        self.__instances_dirty = True
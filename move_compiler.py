@@ -0,0 +1,141 @@
+from itertools import islice
+from typing import Dict, Iterable, List, MutableSequence, Sequence, Set, Tuple, Union
+
+import numpy as np
+
+from cube_state import MOVE_AXES, MOVE_NAMES, QUARTER_TURNS, Move, compose_moves, parse_moves
+from enums import RubiksCubeRotations
+
+FACE_COUNT: int = len(RubiksCubeRotations)
+FACE_AXES: List[int] = [int(MOVE_AXES[face * 3]) for face in range(FACE_COUNT)]
+# Move index of face * 3 + variation, looked up by (face, quarter turns clockwise)
+VARIATION_OF_QUARTERS: Dict[int, int] = {quarters: variation for variation, quarters in enumerate(QUARTER_TURNS)}
+MOVE_QUARTERS: List[int] = [QUARTER_TURNS[m % 3] for m in range(len(MOVE_NAMES))]
+
+
+def get_default_rewrites() -> List[Tuple[str, str]]:
+    """
+    Returns: Identities of commutator-like cycles on every pair of faces on different axes: (A2 B2)^6 and
+    (A B A' B')^6 are the identity, so four repetitions equal two repetitions of the inverse.
+    """
+    rules: List[Tuple[str, str]] = []
+    faces: List[str] = RubiksCubeRotations.values()
+    for a, first in enumerate(faces):
+        for b, second in enumerate(faces):
+            if FACE_AXES[a] == FACE_AXES[b]:
+                continue
+            rules.append((' '.join([f'{first}2 {second}2'] * 4), ' '.join([f'{second}2 {first}2'] * 2)))
+            rules.append((' '.join([f"{first} {second} {first}' {second}'"] * 4),
+                          ' '.join([f"{second} {first} {second}' {first}'"] * 2)))
+    return rules
+
+
+class RewriteTable:
+    """
+    Known shorter equivalents of move sequences. Every rule is checked to be an identity and to shorten the sequence,
+    and its pattern is canonicalized so it matches compiled output.
+    """
+
+    def __init__(self, rules: Iterable[Tuple[Union[str, Sequence[Move]], Union[str, Sequence[Move]]]] = ()):
+        self.__rules: Dict[Tuple[int, ...], Tuple[int, ...]] = {}
+        for pattern, replacement in rules:
+            self.add(pattern, replacement)
+
+    def add(self, pattern: Union[str, Sequence[Move]], replacement: Union[str, Sequence[Move]]):
+        pattern_moves: Tuple[int, ...] = tuple(compile_moves(pattern))
+        replacement_moves: Tuple[int, ...] = tuple(compile_moves(replacement))
+        if len(pattern_moves) < 2 or len(replacement_moves) >= len(pattern_moves):
+            raise ValueError(f'Rewrite does not shorten {pattern!r}')
+        if not np.array_equal(compose_moves(pattern_moves), compose_moves(replacement_moves)):
+            raise ValueError(f'{pattern!r} and {replacement!r} are not equivalent')
+        self.__rules[pattern_moves] = replacement_moves
+
+    @property
+    def lengths(self) -> List[int]:
+        return sorted({len(pattern) for pattern in self.__rules})
+
+    @property
+    def ends(self) -> Set[Tuple[int, int]]:
+        return {pattern[-2:] for pattern in self.__rules}
+
+    def get(self, suffix: Tuple[int, ...]):
+        return self.__rules.get(suffix)
+
+    def __len__(self) -> int:
+        return len(self.__rules)
+
+
+class MoveCompiler:
+    """
+    Canonicalizes move sequences in one pass over a stack of output moves. The turns at the top of the stack on one
+    axis hold at most one turn per face, in canonical order (F before B, U before D, L before R). A new turn only ever
+    merges into that group, so same-face turns and turns separated by commuting opposite-face turns cancel in O(1),
+    and the output is a sequence that cube_state.is_canonical_successor accepts at every step.
+    """
+
+    def __init__(self, rewrites: RewriteTable = None):
+        self.__rewrites: RewriteTable = rewrites
+        self.__rewrite_lengths: List[int] = rewrites.lengths if rewrites else []
+        # Last two moves of every pattern, so most pushes skip the suffix lookups
+        self.__rewrite_ends: Set[Tuple[int, int]] = rewrites.ends if rewrites else set()
+
+    def push(self, stack: MutableSequence[int], move: int, floor: int = 0):
+        """
+        Appends one move index to a compiled stack. The first `floor` moves are fixed and never merged into.
+        """
+        face: int = move // 3
+        axis: int = FACE_AXES[face]
+        size: int = len(stack)
+        depth: int = 0
+        merged: bool = False
+        while depth < 2 and size - depth > floor and FACE_AXES[stack[size - 1 - depth] // 3] == axis:
+            top: int = stack[size - 1 - depth]
+            if top // 3 == face:
+                quarters: int = (MOVE_QUARTERS[top] + MOVE_QUARTERS[move]) % 4
+                del stack[size - 1 - depth]
+                if quarters:
+                    stack.insert(size - 1 - depth, face * 3 + VARIATION_OF_QUARTERS[quarters])
+                merged = True
+                break
+            depth += 1
+        if not merged:
+            if depth == 1 and stack[size - 1] // 3 > face:
+                # The opposite face on top comes later in canonical order
+                stack.insert(size - 1, move)
+            else:
+                stack.append(move)
+        if self.__rewrite_lengths and len(stack) - floor >= 2 and (stack[-2], stack[-1]) in self.__rewrite_ends:
+            self.__rewrite(stack, floor)
+
+    def __rewrite(self, stack: MutableSequence[int], floor: int):
+        for length in self.__rewrite_lengths:
+            if len(stack) - floor < length:
+                return
+            suffix: Tuple[int, ...] = tuple(islice(reversed(stack), length))[::-1]
+            replacement = self.__rewrites.get(suffix)
+            if replacement is not None:
+                for _ in range(length):
+                    stack.pop()
+                # Every rewrite shortens the stack, so replaying the replacement through push() terminates
+                for move in replacement:
+                    self.push(stack, move, floor)
+                return
+
+    def extend(self, stack: MutableSequence[int], moves: Union[str, Iterable[Move]], floor: int = 0):
+        for move in parse_moves(moves):
+            self.push(stack, move, floor)
+
+    def compile(self, moves: Union[str, Iterable[Move]]) -> List[int]:
+        stack: List[int] = []
+        self.extend(stack, moves)
+        return stack
+
+
+def compile_moves(moves: Union[str, Iterable[Move]], rewrites: RewriteTable = None) -> List[int]:
+    """
+    Returns: Canonical, merged form of the moves as move indices.
+    """
+    return MoveCompiler(rewrites).compile(moves)
+
+
+DEFAULT_REWRITES: RewriteTable = RewriteTable(get_default_rewrites())
@@ -0,0 +1,136 @@
+from typing import List, Optional
+
+import numpy as np
+
+from cube_state import INVERSE_MOVES, CubeState, Move, compose_moves, parse_move
+
+DEFAULT_SNAPSHOT_INTERVAL: int = 1024
+DEFAULT_MAX_STEPS: int = 1 << 22
+
+
+class MoveHistory:
+    """
+    Undo/redo history of a 3x3x3 cube. Every step is stored as its inverse move in one byte, and the state is
+    snapshotted every `snapshot_interval` steps, so a jump to any step starts from the nearest snapshot and composes
+    at most half an interval of moves into one permutation. Past `max_steps`, the oldest whole intervals are trimmed.
+    """
+
+    def __init__(self, state: CubeState = None, snapshot_interval: int = DEFAULT_SNAPSHOT_INTERVAL,
+                 max_steps: int = DEFAULT_MAX_STEPS):
+        if snapshot_interval < 1 or max_steps < snapshot_interval:
+            raise ValueError(f'Need 1 <= snapshot_interval <= max_steps, got {snapshot_interval} and {max_steps}')
+        self.snapshot_interval: int = snapshot_interval
+        self.max_steps: int = max_steps
+        self.reset(state)
+
+    def reset(self, state: CubeState = None):
+        """
+        Forgets every step, starting over from `state`.
+        """
+        self.__state: CubeState = (state or CubeState()).copy()
+        self.__inverses: bytearray = bytearray()
+        # Snapshot k is the state after step k * snapshot_interval
+        self.__snapshots: List[np.ndarray] = [self.__state.facelets.copy()]
+        self.__cursor: int = 0
+        self.trimmed: int = 0
+
+    def __len__(self) -> int:
+        return len(self.__inverses)
+
+    @property
+    def cursor(self) -> int:
+        """
+        Number of steps applied; the steps after it can be redone.
+        """
+        return self.__cursor
+
+    @property
+    def state(self) -> CubeState:
+        """
+        The cube after the steps up to the cursor.
+        """
+        return self.__state
+
+    @property
+    def can_undo(self) -> bool:
+        return self.__cursor > 0
+
+    @property
+    def can_redo(self) -> bool:
+        return self.__cursor < len(self.__inverses)
+
+    def record(self, move: Move):
+        """
+        Adds a step at the cursor, dropping the steps that could have been redone.
+        """
+        move = parse_move(move)
+        if self.__cursor < len(self.__inverses):
+            del self.__inverses[self.__cursor:]
+            del self.__snapshots[self.__cursor // self.snapshot_interval + 1:]
+        self.__inverses.append(INVERSE_MOVES[move])
+        self.__state.apply_move(move)
+        self.__cursor += 1
+        if self.__cursor % self.snapshot_interval == 0:
+            self.__snapshots.append(self.__state.facelets.copy())
+        if len(self.__inverses) > self.max_steps:
+            self.__trim()
+
+    def undo(self) -> Optional[int]:
+        """
+        Returns: The move that takes the cube one step back, or None at the start of the history.
+        """
+        if not self.can_undo:
+            return None
+        self.__cursor -= 1
+        move: int = self.__inverses[self.__cursor]
+        self.__state.apply_move(move)
+        return move
+
+    def redo(self) -> Optional[int]:
+        """
+        Returns: The move that takes the cube one step forward, or None at the end of the history.
+        """
+        if not self.can_redo:
+            return None
+        move: int = int(INVERSE_MOVES[self.__inverses[self.__cursor]])
+        self.__state.apply_move(move)
+        self.__cursor += 1
+        return move
+
+    def get_state(self, step: int) -> CubeState:
+        """
+        Returns: The cube after the first `step` steps, without moving the cursor.
+        """
+        if not 0 <= step <= len(self.__inverses):
+            raise IndexError(f'Step {step} out of range for {len(self.__inverses)} steps')
+        block, rest = divmod(step, self.snapshot_interval)
+        if rest > self.snapshot_interval // 2 and block + 1 < len(self.__snapshots):
+            # Closer to the next snapshot: walk back from it along the stored inverses
+            start: int = (block + 1) * self.snapshot_interval
+            moves: bytes = bytes(self.__inverses[step:start][::-1])
+            block += 1
+        else:
+            moves = bytes(INVERSE_MOVES[np.frombuffer(self.__inverses[step - rest:step], dtype=np.uint8)]
+                          .astype(np.uint8))
+        state: CubeState = CubeState(self.__snapshots[block])
+        if moves:
+            state.apply_permutation(compose_moves(moves))
+        return state
+
+    def jump(self, step: int) -> CubeState:
+        """
+        Moves the cursor to `step`.
+
+        Returns: The cube after the first `step` steps.
+        """
+        self.__state = self.get_state(step)
+        self.__cursor = step
+        return self.__state
+
+    def __trim(self):
+        # Whole intervals, so the first step left starts at a snapshot; the cursor is at the end after a record
+        blocks: int = -(-(len(self.__inverses) - self.max_steps) // self.snapshot_interval)
+        del self.__inverses[:blocks * self.snapshot_interval]
+        del self.__snapshots[:blocks]
+        self.__cursor -= blocks * self.snapshot_interval
+        self.trimmed += blocks * self.snapshot_interval
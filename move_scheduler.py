@@ -0,0 +1,233 @@
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from cube_nxn import (AnyCubeState, CubeStateNxN, LayerMove, LayerTurn, get_quarter_rotation, layer_turn_from_move,
+                      move_from_layer_turn, parse_layer_move, reorient_turn, rotation_from_layer_move, split_turn)
+from cube_state import CubeState, Move, compose_moves, parse_move, rotation_from_move
+from move_compiler import MoveCompiler
+
+Clock = Callable[[], float]
+
+DEFAULT_TURN_DURATION: float = 0.5
+
+
+class ManualClock:
+    """
+    Deterministic clock for tests and offline playback: time only moves when advance() is called.
+    """
+
+    def __init__(self, start: float = 0.0):
+        self.__now: float = start
+
+    def __call__(self) -> float:
+        return self.__now
+
+    def advance(self, seconds: float):
+        self.__now += seconds
+
+
+class MoveScheduler:
+    """
+    FIFO queue of pending turns, animated one after another. The state is the cube as drawn at rest: a turn is
+    applied when its animation ends. Time left over when a turn ends carries into the next one, so playback does not
+    depend on the frame rate, and every turn that fully elapsed between two updates is applied in one gather.
+
+    With `merge`, queued turns are merged as they arrive (R R R' plays as R, U D U' as D); the turn being animated
+    is never merged into, and neither is a LayerTurn, nor anything queued before one.
+    """
+
+    def __init__(self, state: AnyCubeState = None, clock: Clock = time.perf_counter,
+                 turn_duration: float = DEFAULT_TURN_DURATION, speed: float = 1.0, merge: bool = True,
+                 compiler: MoveCompiler = None):
+        self.__state: AnyCubeState = state if state is not None else CubeState()
+        self.__clock: Clock = clock
+        self.__queue: Deque[Any] = deque()
+        # Built per scheduler rather than once as a default argument shared by all of them
+        self.__compiler: Optional[MoveCompiler] = (compiler or MoveCompiler()) if merge else None
+        self.__elapsed: float = 0.0
+        # Queued turns up to the last LayerTurn, which the compiler leaves alone
+        self.__frozen: int = 0
+        self.__last_update: Optional[float] = None
+        self.turn_duration: float = turn_duration
+        self.speed: float = speed
+        self.instant: bool = False
+
+    @property
+    def state(self) -> AnyCubeState:
+        return self.__state
+
+    @property
+    def pending(self) -> List[Union[int, LayerTurn]]:
+        return list(self.__queue)
+
+    @property
+    def head(self):
+        """
+        The turn being animated, or None.
+        """
+        return self.__queue[0] if self.__queue else None
+
+    @property
+    def is_rotating(self) -> bool:
+        return bool(self.__queue)
+
+    def __len__(self) -> int:
+        return len(self.__queue)
+
+    def enqueue(self, move: Move):
+        if not self.__queue:
+            self.__elapsed = 0.0
+            self.__last_update = self.__clock()
+        entry = self._parse_move(move)
+        if self.__compiler is None or isinstance(entry, LayerTurn):
+            self.__queue.append(entry)
+            self.__frozen = len(self.__queue)
+        else:
+            self.__compiler.push(self.__queue, entry, floor=max(1 if self.__elapsed else 0, self.__frozen))
+
+    def enqueue_many(self, moves: Union[str, Iterable[Move]]):
+        for move in moves.split() if isinstance(moves, str) else moves:
+            self.enqueue(move)
+
+    def fast_forward(self) -> int:
+        """
+        Applies every queued turn, including the one being animated, as a single state update.
+
+        Returns: Number of turns applied.
+        """
+        count: int = len(self.__queue)
+        if count:
+            self._apply(self.__queue)
+            self.__queue.clear()
+        self.__elapsed = 0.0
+        self.__frozen = 0
+        return count
+
+    def clear(self):
+        """
+        Drops every queued turn, leaving the state as it is.
+        """
+        self.__queue.clear()
+        self.__elapsed = 0.0
+        self.__frozen = 0
+
+    def update(self) -> Optional[Tuple[str, float]]:
+        """
+        Advances playback to the current clock time.
+
+        Returns: (face, elapsed angle) of the turn being animated, or None when the queue is empty.
+        """
+        now: float = self.__clock()
+        if self.instant:
+            self.fast_forward()
+        if not self.__queue:
+            self.__last_update = now
+            return None
+
+        self.__elapsed += (now - self.__last_update) * self.speed
+        self.__last_update = now
+        finished: int = min(int(self.__elapsed // self.turn_duration), len(self.__queue))
+        if finished:
+            self._apply([self.__queue.popleft() for _ in range(finished)])
+            self.__elapsed -= finished * self.turn_duration
+            self.__frozen = max(0, self.__frozen - finished)
+            if not self.__queue:
+                self.__elapsed = 0.0
+                return None
+
+        face, angle = self._get_rotation(self.__queue[0])
+        return face, angle * self.__elapsed / self.turn_duration
+
+    # Move handling hooks, so subclasses can queue another kind of move
+
+    def _parse_move(self, move: Move) -> int:
+        return parse_move(move)
+
+    def _apply(self, moves: Sequence[int]):
+        self.__state.apply_permutation(compose_moves(moves))
+
+    def _get_rotation(self, move: int) -> Tuple[str, float]:
+        return rotation_from_move(move)
+
+
+class LayerMoveScheduler(MoveScheduler):
+    """
+    MoveScheduler of an NxNxN cube: the queue holds LayerTurns, including slice and wide turns, and is not compiled.
+    """
+
+    def __init__(self, state: CubeStateNxN, clock: Clock = time.perf_counter,
+                 turn_duration: float = DEFAULT_TURN_DURATION, speed: float = 1.0):
+        super().__init__(state, clock, turn_duration, speed, merge=False)
+
+    def _parse_move(self, move: LayerMove) -> LayerTurn:
+        return parse_layer_move(move, self.state.n)
+
+    def _apply(self, moves: Sequence[LayerTurn]):
+        self.state.apply_moves(moves)
+
+    def _get_rotation(self, move: LayerTurn) -> Tuple[str, float]:
+        return rotation_from_layer_move(move)
+
+
+class SliceMoveScheduler(MoveScheduler):
+    """
+    MoveScheduler of the 3x3x3 that also queues slice and wide LayerTurns. The state keeps its centres fixed, as the
+    solvers and the move history need, so such a turn reaches it as the outer-layer turns it leaves behind; the
+    whole-cube rotation making up the rest is kept as the orientation the cube is drawn in. Queued turns name faces
+    by their centres, and are animated about the face they are drawn on.
+    """
+
+    def __init__(self, state: CubeState = None, clock: Clock = time.perf_counter,
+                 turn_duration: float = DEFAULT_TURN_DURATION, speed: float = 1.0):
+        super().__init__(state, clock, turn_duration, speed)
+        self.__orientation: np.ndarray = np.eye(3, dtype=np.int64)
+        self.__queued_orientation: np.ndarray = self.__orientation
+
+    @property
+    def orientation(self) -> np.ndarray:
+        """
+        (3, 3) rotation from the frame of the state to the one it is drawn in. Replaced, never changed in place.
+        """
+        return self.__orientation
+
+    @property
+    def queued_orientation(self) -> np.ndarray:
+        """
+        The orientation once the queued turns have been applied.
+        """
+        return self.__queued_orientation
+
+    def enqueue(self, move: Union[Move, LayerTurn]):
+        super().enqueue(move)
+        if isinstance(move, LayerTurn):
+            self.__queued_orientation = self.__queued_orientation @ get_quarter_rotation(move.face,
+                                                                                        split_turn(move)[1])
+
+    def clear(self):
+        super().clear()
+        self.__queued_orientation = self.__orientation
+
+    def _parse_move(self, move: Union[Move, LayerTurn]) -> Union[int, LayerTurn]:
+        if not isinstance(move, LayerTurn):
+            return parse_move(move)
+        outer, quarters = split_turn(parse_layer_move(move, 3))
+        # Turns of one outer layer queue as face turns, so the compiler can merge them
+        return move if quarters else move_from_layer_turn(outer[0])
+
+    def _apply(self, moves: Sequence[Union[int, LayerTurn]]):
+        face_moves: List[int] = []
+        for move in moves:
+            if isinstance(move, LayerTurn):
+                outer, quarters = split_turn(move)
+                face_moves += [move_from_layer_turn(turn) for turn in outer]
+                self.__orientation = self.__orientation @ get_quarter_rotation(move.face, quarters)
+            else:
+                face_moves.append(move)
+        super()._apply(face_moves)
+
+    def _get_rotation(self, move: Union[int, LayerTurn]) -> Tuple[str, float]:
+        turn: LayerTurn = move if isinstance(move, LayerTurn) else layer_turn_from_move(move)
+        return rotation_from_layer_move(reorient_turn(turn, self.__orientation))
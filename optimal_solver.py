@@ -0,0 +1,229 @@
+import time
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+from bitset_bfs import StateSpace, build_distance_table
+from coordinates import (count_partial_permutations, get_columns, rank_orientation, rank_orientation_columns,
+                         rank_partial_permutation, rank_partial_permutation_columns, unrank_orientation,
+                         unrank_partial_permutation)
+from cube_state import CANONICAL_SUCCESSORS, MOVE_COUNT, NO_PREVIOUS_MOVE, StateLike, format_moves, to_facelets
+from cubie_cube import MOVE_CO, MOVE_CP, MOVE_EO, MOVE_EP, facelets_to_cubies, verify_cubies
+from data_classes import SearchStats
+from table_store import TableStore
+
+TABLE_VERSION: int = 1
+
+
+def get_destinations(move_perms: np.ndarray) -> np.ndarray:
+    """
+    Returns: (moves, n) new position of the piece at each old position. Cubie moves store the inverse mapping.
+    """
+    destinations: np.ndarray = np.empty_like(move_perms)
+    for m, perm in enumerate(move_perms):
+        destinations[m, perm] = np.arange(perm.size)
+    return destinations
+
+
+CORNER_DESTINATIONS: np.ndarray = get_destinations(MOVE_CP)
+EDGE_DESTINATIONS: np.ndarray = get_destinations(MOVE_EP)
+# Orientation change of a piece leaving each old position, looked up at its new position
+CORNER_TWISTS: np.ndarray = np.take_along_axis(MOVE_CO, CORNER_DESTINATIONS, axis=1)
+EDGE_FLIPS: np.ndarray = np.take_along_axis(MOVE_EO, EDGE_DESTINATIONS, axis=1)
+
+SOLVED_CORNER_POS: List[int] = list(range(8))
+SOLVED_EDGE_POS: List[int] = list(range(12))
+CORNER_DESTINATION_LISTS: List[List[int]] = CORNER_DESTINATIONS.tolist()
+CORNER_TWIST_LISTS: List[List[int]] = CORNER_TWISTS.tolist()
+EDGE_DESTINATION_LISTS: List[List[int]] = EDGE_DESTINATIONS.tolist()
+EDGE_FLIP_LISTS: List[List[int]] = EDGE_FLIPS.tolist()
+
+
+class PiecePattern(StateSpace):
+    """
+    Positions and orientations of a subset of the corners or of the edges, every other piece is ignored.
+    """
+
+    def __init__(self, kind: str, pieces: Sequence[int]):
+        if kind not in ('corner', 'edge'):
+            raise ValueError(f'Unknown piece kind: {kind}')
+        self.kind: str = kind
+        self.pieces: Tuple[int, ...] = tuple(pieces)
+        self.n: int = 8 if kind == 'corner' else 12
+        self.base: int = 3 if kind == 'corner' else 2
+        # With every piece tracked the last orientation follows from the others
+        self.free: int = len(self.pieces) - 1 if len(self.pieces) == self.n else len(self.pieces)
+
+        self.__destinations: np.ndarray = CORNER_DESTINATIONS if kind == 'corner' else EDGE_DESTINATIONS
+        self.__orientation_changes: np.ndarray = CORNER_TWISTS if kind == 'corner' else EDGE_FLIPS
+        self.__orientation_count: int = self.base ** self.free
+
+        k: int = len(self.pieces)
+        self.__position_weights: List[int] = [count_partial_permutations(self.n - 1 - i, k - 1 - i) for i in range(k)]
+
+    @property
+    def name(self) -> str:
+        return f'{self.kind}_' + '_'.join(str(p) for p in self.pieces)
+
+    @property
+    def size(self) -> int:
+        return count_partial_permutations(self.n, len(self.pieces)) * self.__orientation_count
+
+    def rank(self, positions: np.ndarray, orientations: np.ndarray) -> np.ndarray:
+        return (rank_partial_permutation(positions, self.n) * self.__orientation_count
+                + rank_orientation(orientations, self.base, self.free))
+
+    def unrank(self, indices: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        position_ranks, orientation_ranks = np.divmod(np.asarray(indices, dtype=np.int64), self.__orientation_count)
+        return (unrank_partial_permutation(position_ranks, self.n, len(self.pieces)),
+                unrank_orientation(orientation_ranks, self.base, self.free, len(self.pieces)))
+
+    def neighbours(self, indices: np.ndarray) -> np.ndarray:
+        positions, orientations = (get_columns(a) for a in self.unrank(indices))
+        result: np.ndarray = np.empty((len(indices), MOVE_COUNT), dtype=np.int64)
+        for m in range(MOVE_COUNT):
+            destinations: np.ndarray = self.__destinations[m].astype(np.int64)
+            changes: np.ndarray = self.__orientation_changes[m].astype(np.int64)
+            new_positions: List[np.ndarray] = [destinations.take(p) for p in positions]
+            new_orientations: List[np.ndarray] = [(o + changes.take(p)) % self.base
+                                                  for p, o in zip(positions, orientations)]
+            result[:, m] = (rank_partial_permutation_columns(new_positions, self.n) * self.__orientation_count
+                            + rank_orientation_columns(new_orientations, self.base, self.free))
+        return result
+
+    def rank_one(self, positions: List[int], orientations: List[int]) -> int:
+        """
+        Scalar rank of full per-piece position/orientation lists, for use inside the search.
+        """
+        rank: int = 0
+        seen: List[int] = []
+        for weight, piece in zip(self.__position_weights, self.pieces):
+            position: int = positions[piece]
+            rank += (position - sum(1 for s in seen if s < position)) * weight
+            seen.append(position)
+        orientation_rank: int = 0
+        for piece in self.pieces[:self.free]:
+            orientation_rank = orientation_rank * self.base + orientations[piece]
+        return rank * self.__orientation_count + orientation_rank
+
+    def goal(self) -> int:
+        return int(self.rank(np.array(self.pieces), np.zeros(len(self.pieces), dtype=np.int64)))
+
+
+DEFAULT_PATTERNS: Tuple[PiecePattern, ...] = (
+    PiecePattern('corner', range(8)),
+    PiecePattern('edge', range(0, 6)),
+    PiecePattern('edge', range(6, 12)),
+)
+
+
+class OptimalSolver:
+    """
+    IDA* in the half-turn metric. The heuristic is the maximum over pattern databases, each an exact distance table
+    for a subset of the pieces, so it never overestimates and the first solution found is optimal.
+    """
+
+    def __init__(self, store: TableStore = None, patterns: Sequence[PiecePattern] = DEFAULT_PATTERNS,
+                 processes: int = None):
+        self.__store: TableStore = store or TableStore()
+        self.__patterns: Tuple[PiecePattern, ...] = tuple(patterns)
+        self.__tables: List[np.ndarray] = [
+            self.__store.get(f'pdb_v{TABLE_VERSION}_{p.name}',
+                             lambda p=p: build_distance_table(p, [p.goal()], processes))
+            for p in self.__patterns]
+        self.__corner_patterns: List[Tuple[PiecePattern, memoryview]] = [
+            (p, memoryview(t)) for p, t in zip(self.__patterns, self.__tables) if p.kind == 'corner']
+        self.__edge_patterns: List[Tuple[PiecePattern, memoryview]] = [
+            (p, memoryview(t)) for p, t in zip(self.__patterns, self.__tables) if p.kind == 'edge']
+        self.__stats: SearchStats = SearchStats()
+
+    @property
+    def stats(self) -> SearchStats:
+        return self.__stats
+
+    def heuristic(self, corner_pos: List[int], corner_ori: List[int], edge_pos: List[int],
+                  edge_ori: List[int]) -> int:
+        bound: int = 0
+        for pattern, table in self.__corner_patterns:
+            index: int = pattern.rank_one(corner_pos, corner_ori)
+            bound = max(bound, (table[index >> 1] >> ((index & 1) << 2)) & 0xF)
+        for pattern, table in self.__edge_patterns:
+            index = pattern.rank_one(edge_pos, edge_ori)
+            bound = max(bound, (table[index >> 1] >> ((index & 1) << 2)) & 0xF)
+        return bound
+
+    def solve(self, state: StateLike, max_depth: int = 20) -> str:
+        return format_moves(self.solve_moves(state, max_depth))
+
+    def solve_moves(self, state: StateLike, max_depth: int = 20) -> List[int]:
+        cp, co, ep, eo = facelets_to_cubies(to_facelets(state))
+        if not verify_cubies(cp, co, ep, eo):
+            raise ValueError('Cube state is not solvable')
+
+        # The search tracks where every piece is, rather than which piece is at every position
+        corner_pos: List[int] = np.argsort(cp).tolist()
+        corner_ori: List[int] = co[np.argsort(cp)].tolist()
+        edge_pos: List[int] = np.argsort(ep).tolist()
+        edge_ori: List[int] = eo[np.argsort(ep)].tolist()
+
+        self.__stats = SearchStats()
+        start: float = time.perf_counter()
+        path: List[int] = []
+        bound: int = self.heuristic(corner_pos, corner_ori, edge_pos, edge_ori)
+        while bound <= max_depth:
+            self.__stats.depth = bound
+            next_bound: int = self.__search(corner_pos, corner_ori, edge_pos, edge_ori, 0, bound,
+                                            NO_PREVIOUS_MOVE, path)
+            if next_bound < 0:
+                self.__stats.elapsed_sec = time.perf_counter() - start
+                return path
+            bound = next_bound
+        self.__stats.elapsed_sec = time.perf_counter() - start
+        raise ValueError(f'No solution within {max_depth} moves')
+
+    def __search(self, corner_pos: List[int], corner_ori: List[int], edge_pos: List[int], edge_ori: List[int],
+                 depth: int, bound: int, previous: int, path: List[int]) -> int:
+        """
+        Returns: -1 once solved with the solution left in path, otherwise the smallest f-cost that exceeded bound.
+        """
+        self.__stats.nodes += 1
+        estimate: int = self.heuristic(corner_pos, corner_ori, edge_pos, edge_ori)
+        if depth + estimate > bound:
+            return depth + estimate
+        if estimate == 0 and corner_pos == SOLVED_CORNER_POS and edge_pos == SOLVED_EDGE_POS \
+                and not any(corner_ori) and not any(edge_ori):
+            return -1
+
+        minimum: int = 1 << 30
+        for m in CANONICAL_SUCCESSORS[previous]:
+            corner_dest: List[int] = CORNER_DESTINATION_LISTS[m]
+            corner_twist: List[int] = CORNER_TWIST_LISTS[m]
+            edge_dest: List[int] = EDGE_DESTINATION_LISTS[m]
+            edge_flip: List[int] = EDGE_FLIP_LISTS[m]
+            path.append(m)
+            result: int = self.__search([corner_dest[p] for p in corner_pos],
+                                        [(o + corner_twist[p]) % 3 for p, o in zip(corner_pos, corner_ori)],
+                                        [edge_dest[p] for p in edge_pos],
+                                        [o ^ edge_flip[p] for p, o in zip(edge_pos, edge_ori)],
+                                        depth + 1, bound, m, path)
+            if result < 0:
+                return result
+            path.pop()
+            minimum = min(minimum, result)
+        return minimum
+
+
+def build_pattern_databases(store: TableStore = None, patterns: Sequence[PiecePattern] = DEFAULT_PATTERNS,
+                            processes: int = None):
+    store = store or TableStore()
+    for pattern in patterns:
+        name: str = f'pdb_v{TABLE_VERSION}_{pattern.name}'
+        if store.exists(name):
+            continue
+        start: float = time.perf_counter()
+        store.save(name, build_distance_table(pattern, [pattern.goal()], processes, verbose=True))
+        print(f'{name}: {pattern.size} entries in {time.perf_counter() - start:.1f} s')
+
+
+if __name__ == '__main__':
+    build_pattern_databases()
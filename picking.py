@@ -0,0 +1,224 @@
+from math import cos, radians, sin, tan
+from typing import NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from cube_nxn import LayerTurn
+from cube_state import FACE_FRAMES, FACE_ORDER
+from data_classes import GluPerspectiveDC
+
+# Face of every outward normal, as (axis, sign)
+NORMAL_FACES = {(int(np.flatnonzero(FACE_FRAMES[face][0])[0]), sum(FACE_FRAMES[face][0])): face for face in FACE_ORDER}
+# Share of a sticker a drag has to cover on the face before it picks a direction
+DEFAULT_DRAG_THRESHOLD: float = 0.3
+
+
+def get_perspective_matrix(glu_perspective: GluPerspectiveDC) -> np.ndarray:
+    """
+    Returns: The 4x4 matrix of gluPerspective, row-major like the math.
+    """
+    fov_y, aspect_ratio, z_near, z_far = glu_perspective
+    f: float = 1 / tan(radians(fov_y) / 2)
+    return np.array([[f / aspect_ratio, 0, 0, 0],
+                     [0, f, 0, 0],
+                     [0, 0, (z_far + z_near) / (z_near - z_far), 2 * z_far * z_near / (z_near - z_far)],
+                     [0, 0, -1, 0]])
+
+
+def get_translation_matrix(offset: Sequence[float]) -> np.ndarray:
+    matrix: np.ndarray = np.eye(4)
+    matrix[:3, 3] = offset
+    return matrix
+
+
+def get_rotation_matrix(angle: float, axis: Sequence[float]) -> np.ndarray:
+    """
+    Returns: The 4x4 matrix of glRotatef(angle, *axis), angle in degrees about a unit axis.
+    """
+    x, y, z = axis
+    c, s = cos(radians(angle)), sin(radians(angle))
+    matrix: np.ndarray = np.eye(4)
+    matrix[:3, :3] = [[x * x * (1 - c) + c, x * y * (1 - c) - z * s, x * z * (1 - c) + y * s],
+                      [y * x * (1 - c) + z * s, y * y * (1 - c) + c, y * z * (1 - c) - x * s],
+                      [z * x * (1 - c) - y * s, z * y * (1 - c) + x * s, z * z * (1 - c) + c]]
+    return matrix
+
+
+def to_gl_matrix(matrix: np.ndarray) -> np.ndarray:
+    """
+    Returns: The matrix in the column-major order of glLoadMatrixd.
+    """
+    return np.ascontiguousarray(matrix.T)
+
+
+class Camera:
+    """
+    CPU-side copy of the app's matrices: the projection, gluPerspective then the camera offset, and the model view
+    that orbits the cube about `pivot` by the dragged yaw and pitch. Each is rebuilt, with its inverse for
+    unprojecting, only when the window size or the angles change, so picking needs no GL readback.
+    """
+
+    def __init__(self, window_size: Tuple[int, int], glu_perspective: GluPerspectiveDC,
+                 camera_pos: Tuple[float, float, float], pivot: Tuple[float, float, float] = (0.0, 0.0, 0.0)):
+        self.__window_size: Tuple[int, int] = tuple(window_size)
+        self.__glu_perspective: GluPerspectiveDC = glu_perspective
+        self.__camera_pos: Tuple[float, float, float] = camera_pos
+        self.__pivot: Tuple[float, float, float] = tuple(pivot)
+        self.__angles: Tuple[float, float] = (0.0, 0.0)
+        self.__projection: Optional[np.ndarray] = None
+        self.__model_view: Optional[np.ndarray] = None
+        # Inverses of projection and of projection @ model view
+        self.__inverses: dict = {}
+        self.rebuilds: int = 0
+
+    @property
+    def window_size(self) -> Tuple[int, int]:
+        return self.__window_size
+
+    def set_window_size(self, window_size: Tuple[int, int]) -> bool:
+        """
+        Returns: Whether the size changed; the projection then follows the new aspect ratio.
+        """
+        window_size = tuple(window_size)
+        if window_size == self.__window_size:
+            return False
+        self.__window_size = window_size
+        self.__glu_perspective = GluPerspectiveDC(self.__glu_perspective.fov_y, window_size[0] / window_size[1],
+                                                  self.__glu_perspective.z_near, self.__glu_perspective.z_far)
+        self.__projection = None
+        self.__inverses.clear()
+        return True
+
+    def set_pivot(self, pivot: Tuple[float, float, float]):
+        if tuple(pivot) != self.__pivot:
+            self.__pivot = tuple(pivot)
+            self.__model_view = None
+            self.__inverses.pop('model_view', None)
+
+    def set_angles(self, yaw: float, pitch: float) -> bool:
+        """
+        Returns: Whether the angles, in degrees about the y and x axes, changed.
+        """
+        if (yaw, pitch) == self.__angles:
+            return False
+        self.__angles = (yaw, pitch)
+        self.__model_view = None
+        self.__inverses.pop('model_view', None)
+        return True
+
+    @property
+    def projection_matrix(self) -> np.ndarray:
+        if self.__projection is None:
+            self.__projection = get_perspective_matrix(self.__glu_perspective) @ \
+                get_translation_matrix(self.__camera_pos)
+            self.rebuilds += 1
+        return self.__projection
+
+    @property
+    def model_view_matrix(self) -> np.ndarray:
+        if self.__model_view is None:
+            yaw, pitch = self.__angles
+            self.__model_view = get_translation_matrix(self.__pivot) @ get_rotation_matrix(pitch, (1, 0, 0)) @ \
+                get_rotation_matrix(yaw, (0, 1, 0)) @ get_translation_matrix(np.negative(self.__pivot))
+            self.rebuilds += 1
+        return self.__model_view
+
+    def __get_inverse(self, orbit: bool) -> np.ndarray:
+        key: str = 'model_view' if orbit else 'screen'
+        if key not in self.__inverses:
+            matrix: np.ndarray = self.projection_matrix @ self.model_view_matrix if orbit else self.projection_matrix
+            self.__inverses[key] = np.linalg.inv(matrix)
+        return self.__inverses[key]
+
+    def unproject(self, points: np.ndarray, orbit: bool = False) -> np.ndarray:
+        """
+        gluUnProject for a batch of (N, 3) window points, x and y in GL pixels from the bottom left and z in [0, 1].
+
+        Returns: (N, 3) object coordinates: of the cube with `orbit`, else of the screen-fixed scene with an identity
+        model view, such as the buttons.
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        width, height = self.__window_size
+        ndc: np.ndarray = np.empty((len(points), 4))
+        ndc[:, 0] = 2 * points[:, 0] / width - 1
+        ndc[:, 1] = 2 * points[:, 1] / height - 1
+        ndc[:, 2] = 2 * points[:, 2] - 1
+        ndc[:, 3] = 1
+        objects: np.ndarray = ndc @ self.__get_inverse(orbit).T
+        return objects[:, :3] / objects[:, 3:]
+
+    def get_ray(self, x_px: float, y_px: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns: (origin, unit direction) in cube coordinates of the ray under a pygame mouse position, y down.
+        """
+        y: float = self.__window_size[1] - y_px
+        near, far = self.unproject([(x_px, y, 0.0), (x_px, y, 1.0)], orbit=True)
+        direction: np.ndarray = far - near
+        return near, direction / np.linalg.norm(direction)
+
+
+class StickerHit(NamedTuple):
+    """
+    Where a ray first meets the cube: the face and the point on it, in cube coordinates.
+    """
+    face: str
+    point: np.ndarray
+
+
+class CubePicker:
+    """
+    Ray casts against the analytic box of an NxNxN cube, centered at `center` with half edge `half_size`: the face is
+    the slab the ray enters through, and a drag across a face picks the layer under its start and the turn direction.
+    """
+
+    def __init__(self, center: Sequence[float], half_size: float, n: int = 3,
+                 drag_threshold: float = DEFAULT_DRAG_THRESHOLD):
+        self.center: np.ndarray = np.asarray(center, dtype=np.float64)
+        self.half_size: float = half_size
+        self.n: int = n
+        self.drag_threshold: float = drag_threshold
+
+    def pick(self, origin: np.ndarray, direction: np.ndarray) -> Optional[StickerHit]:
+        """
+        Returns: The face hit first and the hit point, or None when the ray misses the cube.
+        """
+        local: np.ndarray = origin - self.center
+        with np.errstate(divide='ignore', invalid='ignore'):
+            near: np.ndarray = (-np.sign(direction) * self.half_size - local) / direction
+            far: np.ndarray = (np.sign(direction) * self.half_size - local) / direction
+        # Axes the ray runs parallel to only bound it while it is inside their slab
+        parallel: np.ndarray = direction == 0
+        if (parallel & (np.abs(local) > self.half_size)).any():
+            return None
+        near[parallel], far[parallel] = -np.inf, np.inf
+        axis: int = int(np.argmax(near))
+        if near[axis] > far.min() or far.min() < 0:
+            return None
+        point: np.ndarray = origin + direction * max(near[axis], 0.0)
+        return StickerHit(NORMAL_FACES[(axis, -int(np.sign(direction[axis])))], point)
+
+    def get_turn(self, hit: StickerHit, origin: np.ndarray, direction: np.ndarray) -> Optional[LayerTurn]:
+        """
+        Returns: The quarter turn of one layer that moves the sticker under `hit` along a drag to where the ray meets
+        the plane of its face, or None while the drag is still too short to tell.
+        """
+        normal: np.ndarray = np.array(FACE_FRAMES[hit.face][0], dtype=np.float64)
+        facing: float = float(normal @ direction)
+        if facing == 0:
+            return None
+        distance: float = (self.half_size - normal @ (origin - self.center)) / facing
+        drag: np.ndarray = origin + direction * distance - hit.point
+        drag -= normal * (normal @ drag)
+        if np.abs(drag).max() < self.drag_threshold * 2 * self.half_size / self.n:
+            return None
+
+        # The layer turns about the in-plane axis across the drag, in the sense that carries the sticker along it
+        along: int = int(np.argmax(np.abs(drag)))
+        axis: int = 3 - along - int(np.flatnonzero(normal)[0])
+        turn_axis: np.ndarray = np.eye(3)[axis]
+        sign: float = np.sign(np.cross(turn_axis, normal) @ drag)
+        layer: int = int(np.clip((hit.point[axis] - self.center[axis] + self.half_size) / (2 * self.half_size)
+                                 * self.n, 0, self.n - 1))
+        # Layers are counted from the face on the positive side, where clockwise is -90 degrees about the axis
+        depth: int = self.n - 1 - layer
+        return LayerTurn(NORMAL_FACES[(axis, 1)], depth, depth + 1, 1 if sign < 0 else 3)
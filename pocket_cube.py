@@ -0,0 +1,244 @@
+import time
+from typing import List, Tuple, Union
+
+import numpy as np
+
+from bitset_bfs import DEFAULT_CHUNK_SIZE, StateSpace, build_distance_table, nibble_get
+from coordinates import rank_orientation, rank_permutation, unrank_orientation, unrank_permutation
+from cube_nxn import CubeStateNxN
+from cube_state import FACE_ORDER, MOVE_NAMES, format_moves
+from cubie_cube import CORNER_FACELETS, CORNER_LOOKUP, CORNER_NAMES, INVALID_PIECE, MOVE_CO, MOVE_CP
+from table_store import TableStore
+
+TABLE_VERSION: int = 1
+
+# U, R and F never move the DBL corner, so keeping it fixed takes the whole-cube rotations out of the state space
+FIXED_CORNER: int = CORNER_NAMES.index('DBL')
+MOVING_CORNERS: List[int] = [c for c in range(8) if c != FIXED_CORNER]
+POCKET_MOVES: np.ndarray = np.array([m for m, name in enumerate(MOVE_NAMES) if name[0] in 'URF'], dtype=np.uint8)
+
+STICKER_COUNT: int = 24
+N_POCKET_PERM: int = 5040
+N_POCKET_TWIST: int = 3 ** 6
+N_POCKET_STATES: int = N_POCKET_PERM * N_POCKET_TWIST
+# Every 2x2x2 state is at most 11 face turns from solved
+GODS_NUMBER: int = 11
+# Next move of the solved state in the table, and the padding of solve_many's move rows
+NO_MOVE: int = 0xF
+NO_SOLUTION_MOVE: int = 0xFF
+
+
+def get_pocket_corner_facelets() -> np.ndarray:
+    """
+    Returns: (8, 3) sticker indices of the corners of a 2x2x2 in the (6, 2, 2) layout of CubeStateNxN, in the
+    position and sticker order of cubie_cube.CORNER_FACELETS.
+    """
+    face, offset = np.divmod(CORNER_FACELETS, 9)
+    row, column = np.divmod(offset, 3)
+    return face * 4 + row // 2 * 2 + column // 2
+
+
+POCKET_CORNER_FACELETS: np.ndarray = get_pocket_corner_facelets()
+# Home colors of the fixed corner's stickers, which name the faces of a cube with no centers
+FIXED_CORNER_COLORS: np.ndarray = CORNER_FACELETS[FIXED_CORNER] // 9
+
+PocketStateLike = Union[CubeStateNxN, str, np.ndarray]
+
+
+def to_stickers(state: PocketStateLike) -> np.ndarray:
+    """
+    Returns: (..., 24) stickers of a 2x2x2 CubeStateNxN, a URFDLB sticker string or a sticker array.
+    """
+    if isinstance(state, CubeStateNxN):
+        if state.n != 2:
+            raise ValueError(f'Expected a 2x2x2 cube, got {state.n}x{state.n}x{state.n}')
+        return state.facelets
+    if isinstance(state, str):
+        if len(state) != STICKER_COUNT or not set(state) <= set(FACE_ORDER):
+            raise ValueError(f'Expected {STICKER_COUNT} URFDLB stickers, got {state!r}')
+        return np.array([FACE_ORDER.index(c) for c in state], dtype=np.uint8)
+    return np.asarray(state)
+
+
+def compact_corner_perm(cp: np.ndarray) -> np.ndarray:
+    # Pieces and positions of the moving corners renumbered 0..6, skipping the fixed corner
+    moving: np.ndarray = cp[..., MOVING_CORNERS].astype(np.int64)
+    return moving - (moving > FIXED_CORNER)
+
+
+def expand_corner_perm(perms: np.ndarray) -> np.ndarray:
+    cp: np.ndarray = np.full(perms.shape[:-1] + (8,), FIXED_CORNER, dtype=np.int64)
+    cp[..., MOVING_CORNERS] = perms + (perms >= FIXED_CORNER)
+    return cp
+
+
+def build_pocket_perm_move_table() -> np.ndarray:
+    cp: np.ndarray = expand_corner_perm(unrank_permutation(np.arange(N_POCKET_PERM), 7).astype(np.int64))
+    return np.stack([rank_permutation(compact_corner_perm(cp[:, MOVE_CP[m]]))
+                     for m in POCKET_MOVES], axis=1).astype(np.uint16)
+
+
+def build_pocket_twist_move_table() -> np.ndarray:
+    co: np.ndarray = np.zeros((N_POCKET_TWIST, 8), dtype=np.int64)
+    co[:, MOVING_CORNERS] = unrank_orientation(np.arange(N_POCKET_TWIST), 3, 6, 7)
+    return np.stack([rank_orientation(((co[:, MOVE_CP[m]] + MOVE_CO[m]) % 3)[:, MOVING_CORNERS], 3, 6)
+                     for m in POCKET_MOVES], axis=1).astype(np.uint16)
+
+
+class PocketCubeSpace(StateSpace):
+    """
+    Every 2x2x2 state with the DBL corner fixed, ranked perm * N_POCKET_TWIST + twist; moves are POCKET_MOVES.
+    """
+
+    def __init__(self, perm_move: np.ndarray, twist_move: np.ndarray):
+        self.__perm_move: np.ndarray = np.asarray(perm_move)
+        self.__twist_move: np.ndarray = np.asarray(twist_move)
+
+    @property
+    def size(self) -> int:
+        return N_POCKET_STATES
+
+    def neighbours(self, indices: np.ndarray) -> np.ndarray:
+        perms, twists = np.divmod(np.asarray(indices, dtype=np.int64), N_POCKET_TWIST)
+        return self.__perm_move[perms].astype(np.int64) * N_POCKET_TWIST + self.__twist_move[twists]
+
+
+def build_pocket_table(perm_move: np.ndarray, twist_move: np.ndarray, processes: int = None,
+                       chunk_size: int = DEFAULT_CHUNK_SIZE, verbose: bool = False) -> np.ndarray:
+    """
+    Breadth-first search over the whole space, then one pass that picks for every state a move one step closer.
+
+    Returns: One byte per state: the distance to solved in the high nibble, the index into POCKET_MOVES of a first
+    move of an optimal solution in the low nibble (NO_MOVE when solved).
+    """
+    space: PocketCubeSpace = PocketCubeSpace(perm_move, twist_move)
+    distances: np.ndarray = build_distance_table(space, [0], processes, chunk_size, verbose)
+    table: np.ndarray = np.empty(N_POCKET_STATES, dtype=np.uint8)
+    for start in range(0, N_POCKET_STATES, chunk_size):
+        indices: np.ndarray = np.arange(start, min(start + chunk_size, N_POCKET_STATES))
+        distance: np.ndarray = nibble_get(distances, indices).astype(np.int64)
+        closer: np.ndarray = nibble_get(distances, space.neighbours(indices)) == (distance - 1)[:, None]
+        moves: np.ndarray = np.where(distance > 0, np.argmax(closer, axis=1), NO_MOVE)
+        table[start:start + len(indices)] = (distance << 4) | moves
+    return table
+
+
+def get_frame_lookup() -> Tuple[np.ndarray, np.ndarray]:
+    """
+    A cube with no centers is named by the corner at DBL: renaming the colors after its stickers turns the whole cube
+    so that corner is home. Returns: (piece, orientation) tables indexed by the color code of the corner at DBL times
+    216 plus the color code of a corner, as in cubie_cube's lookup; INVALID_PIECE for codes no real corner shows.
+    """
+    colors: np.ndarray = np.stack(np.unravel_index(np.arange(216), (6, 6, 6)), axis=-1)
+    # Opposite faces are 3 apart in URFDLB, so a corner shows three colors from different axes
+    frame_ok: np.ndarray = (np.sort(colors % 3, axis=-1) == np.arange(3)).all(axis=-1)
+    names: np.ndarray = np.zeros((216, len(FACE_ORDER)), dtype=np.int64)
+    np.put_along_axis(names, colors, FIXED_CORNER_COLORS, axis=-1)
+    np.put_along_axis(names, (colors + 3) % 6, (FIXED_CORNER_COLORS + 3) % 6, axis=-1)
+    renamed: np.ndarray = names[np.arange(216)[:, None, None], colors[None, :, :]]
+    codes: np.ndarray = renamed[..., 0] * 36 + renamed[..., 1] * 6 + renamed[..., 2]
+    pieces: np.ndarray = np.where(frame_ok[:, None], CORNER_LOOKUP[0][codes], INVALID_PIECE).astype(np.uint8)
+    return pieces.reshape(-1), CORNER_LOOKUP[1][codes].astype(np.uint8).reshape(-1)
+
+
+FRAME_LOOKUP: Tuple[np.ndarray, np.ndarray] = get_frame_lookup()
+# Compact number of every corner position and piece; the fixed corner has none
+COMPACT_CORNERS: np.ndarray = np.array([MOVING_CORNERS.index(c) if c in MOVING_CORNERS else 0 for c in range(8)]
+                                       + [0] * (256 - 8), dtype=np.uint8)
+
+
+def stickers_to_coordinates(stickers: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Returns: (perm, twist, valid) of (..., 24) stickers, the cube turned as a whole to bring the corner at DBL home;
+    valid is False for sticker sets no real cube shows.
+    """
+    stickers = np.asarray(stickers)
+    if stickers.shape[-1] != STICKER_COUNT:
+        raise ValueError(f'Expected (..., {STICKER_COUNT}) stickers, got shape {stickers.shape}')
+    in_range: np.ndarray = ((stickers >= 0) & (stickers < len(FACE_ORDER))).all(axis=-1)
+    stickers = np.where(in_range[..., None], stickers, 0).astype(np.int32)
+
+    corner_colors: np.ndarray = stickers[..., POCKET_CORNER_FACELETS]
+    codes: np.ndarray = corner_colors[..., 0] * 36 + corner_colors[..., 1] * 6 + corner_colors[..., 2]
+    codes += codes[..., FIXED_CORNER:FIXED_CORNER + 1] * 216
+    cp: np.ndarray = FRAME_LOOKUP[0][codes]
+    co: np.ndarray = FRAME_LOOKUP[1][codes]
+    # Eight powers of two only sum to 255 without a carry, so every piece is present exactly once
+    pieces: np.ndarray = (np.left_shift(1, np.minimum(cp, 8), dtype=np.int32)).sum(axis=-1)
+    valid: np.ndarray = in_range & (pieces == 255) & (co.sum(axis=-1, dtype=np.int32) % 3 == 0)
+    moving: np.ndarray = np.where(valid[..., None], cp[..., MOVING_CORNERS], np.array(MOVING_CORNERS, dtype=np.uint8))
+    twists: np.ndarray = np.where(valid[..., None], co[..., MOVING_CORNERS], 0)
+    return rank_permutation(COMPACT_CORNERS[moving]), rank_orientation(twists, 3, 6), valid
+
+
+class PocketSolver:
+    """
+    Optimal 2x2x2 solver from a table of the whole state space: the distance and a best next move of every state.
+    A solve is at most GODS_NUMBER table reads and coordinate moves, with no search, and many states solve at once.
+    """
+
+    def __init__(self, store: TableStore = None, processes: int = None):
+        self.__store: TableStore = store or TableStore()
+        self.__perm_move: np.ndarray = self.__table('perm_move', build_pocket_perm_move_table)
+        self.__twist_move: np.ndarray = self.__table('twist_move', build_pocket_twist_move_table)
+        self.__distance_move: np.ndarray = self.__table(
+            'distance_move', lambda: build_pocket_table(self.__perm_move, self.__twist_move, processes))
+
+    def __table(self, name: str, builder) -> np.ndarray:
+        return self.__store.get(f'pocket_v{TABLE_VERSION}_{name}', builder)
+
+    def distances(self, stickers: np.ndarray) -> np.ndarray:
+        """
+        Returns: Optimal solution length of each (..., 24) sticker row, -1 for invalid rows.
+        """
+        perms, twists, valid = stickers_to_coordinates(stickers)
+        entries: np.ndarray = self.__distance_move[perms * N_POCKET_TWIST + twists]
+        return np.where(valid, entries.astype(np.int64) >> 4, -1)
+
+    def solve_many(self, stickers: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns: (N, GODS_NUMBER) moves in MOVE_NAMES numbering, padded with NO_SOLUTION_MOVE, and the (N,) length of
+        each optimal solution, -1 for invalid rows.
+        """
+        perms, twists, valid = stickers_to_coordinates(np.asarray(stickers).reshape(-1, STICKER_COUNT))
+        entries: np.ndarray = self.__distance_move[perms * N_POCKET_TWIST + twists].astype(np.int64)
+        lengths: np.ndarray = np.where(valid, entries >> 4, -1)
+        moves: np.ndarray = np.full((len(lengths), GODS_NUMBER), NO_SOLUTION_MOVE, dtype=np.uint8)
+        active: np.ndarray = np.flatnonzero(lengths > 0)
+        perms, twists = perms[active], twists[active]
+        step: int = 0
+        while active.size:
+            move: np.ndarray = self.__distance_move[perms * N_POCKET_TWIST + twists] & 0xF
+            moves[active, step] = POCKET_MOVES[move]
+            perms = self.__perm_move[perms, move].astype(np.int64)
+            twists = self.__twist_move[twists, move].astype(np.int64)
+            step += 1
+            # Rows are done after exactly their distance in moves
+            unsolved: np.ndarray = lengths[active] > step
+            active, perms, twists = active[unsolved], perms[unsolved], twists[unsolved]
+        return moves, lengths
+
+    def solve_moves(self, state: PocketStateLike) -> List[int]:
+        moves, lengths = self.solve_many(to_stickers(state))
+        if lengths[0] < 0:
+            raise ValueError('Cube state is not solvable')
+        return moves[0, :lengths[0]].tolist()
+
+    def solve(self, state: PocketStateLike) -> str:
+        return format_moves(self.solve_moves(state))
+
+
+def build_pocket_tables(store: TableStore = None, processes: int = None):
+    store = store or TableStore()
+    name: str = f'pocket_v{TABLE_VERSION}_distance_move'
+    if store.exists(name):
+        return
+    start: float = time.perf_counter()
+    perm_move: np.ndarray = store.get(f'pocket_v{TABLE_VERSION}_perm_move', build_pocket_perm_move_table)
+    twist_move: np.ndarray = store.get(f'pocket_v{TABLE_VERSION}_twist_move', build_pocket_twist_move_table)
+    store.save(name, build_pocket_table(perm_move, twist_move, processes, verbose=True))
+    print(f'{name}: {N_POCKET_STATES} entries in {time.perf_counter() - start:.1f} s')
+
+
+if __name__ == '__main__':
+    build_pocket_tables()
@@ -1,4 +1,4 @@
-from typing import Tuple, List
+from typing import Tuple, List, Optional, Union
 
 import numpy as np
 import pygame
@@ -8,27 +8,72 @@ from pygame.event import Event
 from pygame.locals import *
 
 from button import Button
-from data_classes import GluPerspectiveDC, GameState
-from enums import GlColors4f, RubiksCubeRotations
-from rubiks_cube import RubiksPiece, RubiksCube
+from cube_grid import CubeGrid
+from cube_state import CubeState, move_from_rotation, rotation_from_move
+from data_classes import GluPerspectiveDC, GameState, SessionFrame
+from enums import CubeRenderModes, GlColors4f, RubiksCubeRotations, RubiksMoveVariations, SessionEventKinds
+from frame_profiler import FrameProfiler
+from cube_nxn import LayerTurn
+from glyph_cache import GlyphAtlas
+from picking import Camera, CubePicker, StickerHit, to_gl_matrix
+from rubiks_cube import RubiksCube
+from session_log import DEFAULT_POLL_SEC, SessionReader, SessionWriter
+
+
+DEFAULT_MAX_FPS: int = 60
+DRAG_DEGREES_PER_PIXEL: float = 0.2
+# Events after which the window contents must be drawn again, besides input that changes the scene
+REDRAW_EVENTS = (pygame.VIDEOEXPOSE, pygame.VIDEORESIZE, pygame.WINDOWEXPOSED, pygame.WINDOWSHOWN,
+                 pygame.WINDOWRESTORED, pygame.WINDOWSIZECHANGED)
 
 
 class PygameWrapper:
     def __init__(self,
                  window_size: Tuple[int, int],
                  glu_perspective: GluPerspectiveDC,
-                 camera_pos: Tuple[float, float, float]):
+                 camera_pos: Tuple[float, float, float],
+                 render_mode: CubeRenderModes = CubeRenderModes.VBO,
+                 profiler: FrameProfiler = None,
+                 trace_path: str = None,
+                 cube_size: int = 3,
+                 grid_states: np.ndarray = None,
+                 max_fps: int = DEFAULT_MAX_FPS,
+                 vsync: bool = False,
+                 continuous: bool = False,
+                 record_path: str = None,
+                 replay_path: str = None,
+                 replay_from_sec: float = 0.0):
         self.display = None
+        self.__glyph_atlas: GlyphAtlas = GlyphAtlas()
         self.__rubiks_cube: RubiksCube = None
         self.__window_size: Tuple[int, int] = window_size
-        self.__glu_perspective: GluPerspectiveDC = glu_perspective
-        self.__camera_pos: Tuple[float, float, float] = camera_pos
+        self.__camera: Camera = Camera(window_size, glu_perspective, camera_pos)
+        self.__picker: Optional[CubePicker] = None
+        # Sticker under the mouse when a press started on the cube, until a drag turns its layer
+        self.__drag_hit: Optional[StickerHit] = None
+        self.__render_mode: CubeRenderModes = render_mode
+        self.__profiler: FrameProfiler = profiler or FrameProfiler()
+        self.__trace_path: str = trace_path
+        self.__cube_size: int = cube_size
+        self.__grid_states: np.ndarray = grid_states
+        self.__min_frame_sec: float = 1.0 / max_fps if max_fps else 0.0
+        self.__continuous: bool = continuous
+        self.vsync: bool = vsync
+        self.__session_writer: SessionWriter = SessionWriter(record_path) if record_path else None
+        self.__replay: SessionReader = SessionReader(replay_path) if replay_path else None
+        self.__replay_index: int = 0
+        self.__replay_start_tick: int = 0
+        self.__overlay_text: str = ''
+        self.__overlay_tick: int = 0
 
         self.__state: GameState = GameState(last_frame_tick=pygame.time.get_ticks())
 
         self.init_display()
 
         self.buttons: List[Button] = self.get_buttons()
+        self.__overlay_vertices: List[Tuple] = self.get_overlay_vertices()
+        if self.__replay is not None:
+            self.start_replay(replay_from_sec)
 
     def get_buttons(self):
         top_left_coords = (10, 10)
@@ -39,7 +84,7 @@ class PygameWrapper:
         button_y_spacing_factor = 1.1
         buttons: List[Button] = []
 
-        variations = ["", "'", '2']
+        variations = RubiksMoveVariations.values()
         var_angles = [-90, 90, -180]
         for i, r in enumerate(RubiksCubeRotations.values()):
             y = top_left_coords[1] + i * button_y_spacing_factor * button_height_px
@@ -48,71 +93,251 @@ class PygameWrapper:
                 x = top_left_coords[0] + j * button_x_spacing_factor * button_width_px
                 if r == 'B' or r == 'D' or r == 'L':
                     angle *= -1
-                button = Button(self.__rubiks_cube, window_size=self.__window_size,
+                button = Button(self.__rubiks_cube, self.__camera,
                                 x_px=x, y_px=y, width_px=button_width_px, height_px=button_height_px,
                                 text_color=(255, 255, 255, 255), background_color=(0, 255, 0, 0),
                                 text=text, face=r, angle=angle)
                 buttons.append(button)
         return buttons
 
+    def get_overlay_vertices(self, width_px: int = 330, height_px: int = 24, margin_px: int = 10) -> List[Tuple]:
+        # Bottom left corner of the window, in the top left, bottom left, bottom right, top right order of buttons
+        left, right = margin_px, margin_px + width_px
+        bottom, top = margin_px, margin_px + height_px
+        screen_vertices = [(left, top, 0.0), (left, bottom, 0.0), (right, bottom, 0.0), (right, top, 0.0)]
+        return [tuple(_) for _ in self.__camera.unproject(np.array(screen_vertices))]
+
     def init_display(self):
         pygame.init()
-        self.display = pygame.display.set_mode(size=self.__window_size,
-                                               flags=DOUBLEBUF | OPENGL)
+        try:
+            self.display = pygame.display.set_mode(size=self.__window_size, flags=DOUBLEBUF | OPENGL | RESIZABLE,
+                                                   vsync=int(self.vsync))
+        except pygame.error:
+            # Drivers without a swap interval control; the frame limiter still paces the animation
+            self.vsync = False
+            self.display = pygame.display.set_mode(size=self.__window_size, flags=DOUBLEBUF | OPENGL | RESIZABLE)
         pygame.display.set_caption("Rubiks Cube Explore")
         glEnable(GL_DEPTH_TEST)
 
-        # Setup cameras
+        # Setup cameras, from the matrices the picking unprojects with
         glMatrixMode(GL_PROJECTION)  # Applies subsequent matrix operations to the projection matrix stack.
-        gluPerspective(*self.__glu_perspective)
-        glTranslatef(*self.__camera_pos)
+        glLoadMatrixd(to_gl_matrix(self.__camera.projection_matrix))
 
         # Setup Rubik's Cube
         glMatrixMode(GL_MODELVIEW)  # Applies subsequent matrix operations to the modelview matrix stack.
-        self.__rubiks_cube: RubiksCube = RubiksCube(center_pos=(3.0, 0.0, 0.0))
+        if self.__grid_states is not None:
+            # Many cubes drawn instanced; the buttons and keys act on all of them at once
+            self.__rubiks_cube: Union[RubiksCube, CubeGrid] = CubeGrid(center_pos=(3.0, 0.0, 0.0),
+                                                                        states=self.__grid_states)
+        else:
+            self.__rubiks_cube = RubiksCube(center_pos=(3.0, 0.0, 0.0), render_mode=self.__render_mode,
+                                            n=self.__cube_size)
+            self.__picker = CubePicker(*self.__rubiks_cube.get_bounds(), n=self.__cube_size)
+        # The view orbits the cube, or the middle of the grid, about its own center
+        self.__camera.set_pivot(self.__picker.center if self.__picker is not None else self.__rubiks_cube.center_pos)
 
     def draw_object(self):
         glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
         glClearColor(*GlColors4f.WHITE_SOLID.value)
-        # Buttons
-        [button.draw() for button in self.buttons]
-        self.__rubiks_cube.render()
+        with self.__profiler.span('buttons'):
+            # Buttons, all labels from one atlas texture in one draw call
+            labels = [(button.label_key, button.vertices) for button in self.buttons]
+            if self.__profiler.enabled:
+                labels.append((self.get_overlay_label(), self.__overlay_vertices))
+            self.__glyph_atlas.draw(labels)
+        with self.__profiler.span('cube'):
+            self.__camera.set_angles(*self.__state.object_xy_angle)
+            glLoadMatrixd(to_gl_matrix(self.__camera.model_view_matrix))
+            self.__rubiks_cube.render()
+            glLoadIdentity()
+
+    def resize(self, window_size: Tuple[int, int]):
+        if self.__camera.set_window_size(window_size):
+            self.__window_size = tuple(window_size)
+            glViewport(0, 0, *window_size)
+            glMatrixMode(GL_PROJECTION)
+            glLoadMatrixd(to_gl_matrix(self.__camera.projection_matrix))
+            glMatrixMode(GL_MODELVIEW)
+            # Buttons keep their size in pixels
+            self.buttons = self.get_buttons()
+            self.__overlay_vertices = self.get_overlay_vertices()
+        self.__state.dirty = True
+
+    def get_overlay_label(self):
+        # Refreshed twice a second, so the atlas uploads a new label rarely instead of every frame
+        if pygame.time.get_ticks() - self.__overlay_tick >= 500:
+            self.__overlay_tick = pygame.time.get_ticks()
+            self.__overlay_text = self.__profiler.summary()
+        return self.__overlay_text, (0, 0, 0, 255), (255, 255, 255, 255), 48
+
+    def handle_mouse_down(self, event: Event):
+        for button in self.buttons:
+            if button.is_clicked(event.pos):
+                button.on_click()
+                self.__state.dirty = True
+                if self.__session_writer is not None:
+                    self.__session_writer.record_move(move_from_rotation(button.face, button.angle))
+                return
+        if event.button != 1:
+            return
+        # A press on a sticker drags its layer round, anywhere else it orbits the view
+        self.__drag_hit = self.__picker.pick(*self.__camera.get_ray(*event.pos)) if self.__picker else None
+        self.__state.mouse_pressed = self.__drag_hit is None
 
     def handle_mouse_motion(self, event: Event):
-        if self.__state.mouse_pressed:
+        if self.__drag_hit is not None:
+            turn: Optional[LayerTurn] = self.__picker.get_turn(self.__drag_hit, *self.__camera.get_ray(*event.pos))
+            if turn is None:
+                return
+            # One turn per drag
+            self.__drag_hit = None
+            moves: List[int] = self.__rubiks_cube.turn_layers(turn)
+            self.__state.dirty = True
+            if self.__session_writer is not None:
+                # The face turns the state makes; a log replays slice and wide turns without their whole-cube rotation
+                for move in moves:
+                    self.__session_writer.record_move(move)
+        elif self.__state.mouse_pressed:
             # Calculate the mouse movement since the last frame
             self.__state.mouse_xy_delta = event.rel
-            mouse_xy_delta = list(self.__state.mouse_xy_delta)
+            self.drag_camera(*self.__state.mouse_xy_delta)
+            if self.__session_writer is not None:
+                self.__session_writer.record_drag(*event.rel)
+
+    def drag_camera(self, dx: int, dy: int):
+        # Update the object yaw and pitch angles based on the mouse movement
+        object_xy_angle = list(self.__state.object_xy_angle)
+        object_xy_angle[0] += dx * DRAG_DEGREES_PER_PIXEL
+        object_xy_angle[1] += dy * DRAG_DEGREES_PER_PIXEL
+        self.__state.object_xy_angle = object_xy_angle
+        self.__state.dirty = True
+
+    def start_replay(self, from_sec: float = 0.0):
+        """
+        Plays the session log back in real time, starting from its state `from_sec` seconds in.
+        """
+        frame: SessionFrame = self.__replay.seek_time(from_sec)
+        if frame.index:
+            if not isinstance(self.__rubiks_cube.state, CubeState):
+                raise ValueError('Replay from a keyframe needs a 3x3x3 cube')
+            self.__rubiks_cube.scheduler.clear()
+            self.__rubiks_cube.state.facelets[:] = frame.facelets
+            self.__rubiks_cube.reset_history()
+        self.__state.object_xy_angle = tuple(d * DRAG_DEGREES_PER_PIXEL for d in frame.drag)
+        self.__replay_index = frame.index
+        self.__replay_start_tick = pygame.time.get_ticks() - round(frame.time * 1000)
+        self.__state.dirty = True
+
+    def update_replay(self) -> Optional[int]:
+        """
+        Applies the recorded events that are due.
 
-            # Update the object yaw and pitch angles based on the mouse movement
-            object_xy_angle = list(self.__state.object_xy_angle)
-            object_xy_angle[0] += mouse_xy_delta[0] * 0.2
-            object_xy_angle[1] += mouse_xy_delta[1] * 0.2
-            self.__state.object_xy_angle = object_xy_angle
+        Returns: Milliseconds until the next recorded event; when the log is played out, the poll interval for new
+        events of a log still being written.
+        """
+        replay: SessionReader = self.__replay
+        replay.refresh()
+        elapsed_ms: int = pygame.time.get_ticks() - self.__replay_start_tick
+        due: int = replay.index_at(elapsed_ms / 1000)
+        for record in replay.records(self.__replay_index, due):
+            if record['kind'] == SessionEventKinds.TURN:
+                self.__rubiks_cube.rotate(*rotation_from_move(int(record['move'])))
+                self.__state.dirty = True
+            elif record['kind'] == SessionEventKinds.DRAG:
+                self.drag_camera(int(record['dx']), int(record['dy']))
+        self.__replay_index = max(self.__replay_index, due)
+        if self.__replay_index >= len(replay):
+            return round(DEFAULT_POLL_SEC * 1000)
+        return max(0, round(replay.event_time(self.__replay_index) * 1000) - elapsed_ms)
 
-    def handle_event(self):
-        for event in pygame.event.get():
+    def handle_key(self, event: Event):
+        scheduler = self.__rubiks_cube.scheduler
+        if event.key == pygame.K_f:
+            scheduler.fast_forward()
+        elif event.key == pygame.K_i:
+            scheduler.instant = not scheduler.instant
+        elif event.key in (pygame.K_PLUS, pygame.K_EQUALS, pygame.K_KP_PLUS):
+            scheduler.speed *= 2
+        elif event.key in (pygame.K_MINUS, pygame.K_KP_MINUS):
+            scheduler.speed /= 2
+        elif event.key == pygame.K_p:
+            self.__profiler.enabled = not self.__profiler.enabled
+        elif event.key in (pygame.K_z, pygame.K_y) and getattr(self.__rubiks_cube, 'history', None) is not None:
+            # Only a cube keeping a MoveHistory can undo; a CubeGrid has none. Shift skips the animation
+            instant: bool = bool(event.mod & pygame.KMOD_SHIFT)
+            cube: RubiksCube = self.__rubiks_cube
+            move: Optional[int] = cube.undo(instant) if event.key == pygame.K_z else cube.redo(instant)
+            if move is not None and self.__session_writer is not None:
+                self.__session_writer.record_move(move)
+        else:
+            return
+        self.__state.dirty = True
+
+    @property
+    def needs_redraw(self) -> bool:
+        return self.__continuous or self.__state.dirty or self.__rubiks_cube.is_rotating
+
+    def get_events(self) -> List[Event]:
+        """
+        Returns: Pending events; when nothing needs drawing, blocks until the next one arrives instead of polling.
+        """
+        wait_ms: Optional[int] = self.update_replay() if self.__replay is not None else None
+        if self.needs_redraw:
+            return pygame.event.get()
+        # A replay wakes up for its next recorded event
+        events: List[Event] = [pygame.event.wait() if wait_ms is None else pygame.event.wait(wait_ms)]
+        # Time spent asleep is not frame time
+        self.__state.last_frame_tick = pygame.time.get_ticks()
+        return events + pygame.event.get()
+
+    def handle_event(self, events: List[Event] = None):
+        for event in pygame.event.get() if events is None else events:
             if event.type == pygame.QUIT:
+                if self.__trace_path:
+                    self.__profiler.save_chrome_trace(self.__trace_path)
+                self.__glyph_atlas.release()
+                self.__rubiks_cube.release()
+                if self.__session_writer is not None:
+                    self.__session_writer.close()
                 pygame.quit()
                 quit()
             elif event.type == pygame.MOUSEBUTTONDOWN:
-                for button in self.buttons:
-                    if button.is_clicked(pygame.mouse.get_pos()):
-                        button.on_click()
-
+                self.handle_mouse_down(event)
+            elif event.type == pygame.MOUSEBUTTONUP:
+                self.__drag_hit = None
+                self.__state.mouse_pressed = False
             elif event.type == pygame.MOUSEMOTION:
                 self.handle_mouse_motion(event)
+            elif event.type == pygame.KEYDOWN:
+                self.handle_key(event)
+            elif event.type == pygame.VIDEORESIZE:
+                self.resize(event.size)
+            elif event.type in REDRAW_EVENTS:
+                self.__state.dirty = True
 
     def update_state(self):
-        self.__state.time_delta = (pygame.time.get_ticks() - self.__state.last_frame_tick) / 1000.0
+        with self.__profiler.span('flip'):
+            pygame.display.flip()
+        with self.__profiler.span('wait'):
+            # Sleep off what is left of the frame budget, so animation runs at max_fps instead of as fast as possible:
+            # time_delta is the time since the previous frame ended, first without the sleep and then with it
+            self.__state.time_delta = (pygame.time.get_ticks() - self.__state.last_frame_tick) / 1000.0
+            if self.__state.time_delta < self.__min_frame_sec:
+                pygame.time.wait(int((self.__min_frame_sec - self.__state.time_delta) * 1000))
+                self.__state.time_delta = (pygame.time.get_ticks() - self.__state.last_frame_tick) / 1000.0
         self.__state.last_frame_tick = pygame.time.get_ticks()
 
-        pygame.display.flip()
-        pygame.time.wait(10)
-
     def run(self):
-
+        profiler: FrameProfiler = self.__profiler
         while True:
-            self.handle_event()
-            self.update_state()
+            events: List[Event] = self.get_events()
+            profiler.begin_frame()
+            with profiler.span('events'):
+                self.handle_event(events)
+            if not self.needs_redraw:
+                # Input that changed nothing; the frame is dropped from the profile
+                continue
+            self.__state.dirty = False
             self.draw_object()
+            self.update_state()
+            profiler.end_frame()
@@ -1,152 +1,133 @@
-import json
 import time
-from abc import ABC, abstractmethod
-from typing import List, Tuple, Dict
+from typing import List, Optional, Tuple
 
-from OpenGL.GL import *
 import numpy as np
 
-from enums import GlColors4f, Surfaces, RubiksAxes, RubiksFaceRotation, RubiksCubeRotations
+from cube_nxn import (AnyCubeState, CubeStateNxN, LayerTurn, get_rotation_permutation, move_from_layer_turn,
+                      reorient_turn, split_turn)
+from cube_state import FACE_COLORS, FACE_SURFACES, MOVE_NAMES, move_from_rotation
+from move_history import MoveHistory
+from move_scheduler import Clock, LayerMoveScheduler, MoveScheduler, SliceMoveScheduler
+from enums import CubeRenderModes, GlColors4f, Surfaces
 from globject import GLObject
-from rubiks_piece import RubiksPiece
 
 
 class RubiksCube(GLObject):
     def __init__(self,
                  center_pos: Tuple[float, float, float],
-                 piece_edge_length: float = 1.0):
+                 piece_edge_length: float = 1.0,
+                 render_mode: CubeRenderModes = CubeRenderModes.VBO,
+                 clock: Clock = time.perf_counter,
+                 n: int = 3):
         super(RubiksCube, self).__init__(center_pos)
 
-        self.elapsed_angle = None
-        self.rotation_face = None
-        self.elapsed_rotation_time = None
-        self.rotation_angle = None
-        self.rotation_axis = None
-        self.rotation_start_time = None
-        self.is_rotating: bool = False
+        self.elapsed_angle: float = 0
+        self.rotation_face: str = None
+        self.rotation_layers: Tuple[int, int] = (0, 1)
 
+        self.__n: int = n
         self.__piece_edge_length: float = piece_edge_length
+        self.__render_mode: CubeRenderModes = CubeRenderModes(render_mode)
+        # Built on the first render, so the cube works as a model without PyOpenGL or a GL context
+        self.__renderer: 'VboCubeRenderer' = None
+        self.__pieces = None
+        self.__history: Optional[MoveHistory] = None
+        # Orientation the drawn facelets were last gathered for
+        self.__drawn_orientation: Optional[np.ndarray] = None
+        self.__drawn_permutation: Optional[np.ndarray] = None
+        # The 3x3x3 keeps CubeState, which the solvers and codecs work on; other sizes use the sticker array
+        if n != 3:
+            if self.__render_mode != CubeRenderModes.VBO:
+                raise ValueError(f'The {self.__render_mode} renderer only draws a 3x3x3 cube')
+            self.__scheduler: MoveScheduler = LayerMoveScheduler(CubeStateNxN(n), clock=clock)
+            return
 
-        self.__surface_colors = self.get_piece_colors()
-        self.__pieces = self.get_pieces()
+        self.__scheduler = SliceMoveScheduler(clock=clock)
+        self.__history = MoveHistory(self.state)
 
     @staticmethod
-    def get_piece_colors() -> np.ndarray[(3, 3, 3), dict]:
-        surface_colors: np.ndarray[(3, 3, 3), dict] = np.empty((3, 3, 3), dtype=dict)
-        # Bottom layer
-        surface_colors[0, 0, 0] = {
-            Surfaces.LEFT.name: GlColors4f.GREEN_SOLID.value,
-            Surfaces.FRONT.name: GlColors4f.RED_SOLID.value,
-            Surfaces.BOTTOM.name: GlColors4f.YELLOW_SOLID.value
-        }
-        surface_colors[1, 0, 0] = {
-            Surfaces.FRONT.name: GlColors4f.RED_SOLID.value,
-            Surfaces.BOTTOM.name: GlColors4f.YELLOW_SOLID.value,
-        }
-        surface_colors[2, 0, 0] = {
-            Surfaces.FRONT.name: GlColors4f.RED_SOLID.value,
-            Surfaces.BOTTOM.name: GlColors4f.YELLOW_SOLID.value,
-            Surfaces.RIGHT.name: GlColors4f.BLUE_SOLID.value
-        }
-        surface_colors[0, 0, 1] = {
-            Surfaces.LEFT.name: GlColors4f.GREEN_SOLID.value,
-            Surfaces.BOTTOM.name: GlColors4f.YELLOW_SOLID.value
-        }
-        surface_colors[1, 0, 1] = {
-            Surfaces.BOTTOM.name: GlColors4f.YELLOW_SOLID.value,
-        }
-        surface_colors[2, 0, 1] = {
-            Surfaces.BOTTOM.name: GlColors4f.YELLOW_SOLID.value,
-            Surfaces.RIGHT.name: GlColors4f.BLUE_SOLID.value
-        }
-        surface_colors[0, 0, 2] = {
-            Surfaces.BACK.name: GlColors4f.ORANGE_SOLID.value,
-            Surfaces.LEFT.name: GlColors4f.GREEN_SOLID.value,
-            Surfaces.BOTTOM.name: GlColors4f.YELLOW_SOLID.value
-        }
-        surface_colors[1, 0, 2] = {
-            Surfaces.BACK.name: GlColors4f.ORANGE_SOLID.value,
-            Surfaces.BOTTOM.name: GlColors4f.YELLOW_SOLID.value,
-        }
-        surface_colors[2, 0, 2] = {
-            Surfaces.BACK.name: GlColors4f.ORANGE_SOLID.value,
-            Surfaces.BOTTOM.name: GlColors4f.YELLOW_SOLID.value,
-            Surfaces.RIGHT.name: GlColors4f.BLUE_SOLID.value
-        }
-        # Middle layer
-        surface_colors[0, 1, 0] = {
-            Surfaces.LEFT.name: GlColors4f.GREEN_SOLID.value,
-            Surfaces.FRONT.name: GlColors4f.RED_SOLID.value,
-        }
-        surface_colors[1, 1, 0] = {
-            Surfaces.FRONT.name: GlColors4f.RED_SOLID.value,
-        }
-        surface_colors[2, 1, 0] = {
-            Surfaces.FRONT.name: GlColors4f.RED_SOLID.value,
-            Surfaces.RIGHT.name: GlColors4f.BLUE_SOLID.value
-        }
-        surface_colors[0, 1, 1] = {
-            Surfaces.LEFT.name: GlColors4f.GREEN_SOLID.value,
-        }
-        surface_colors[1, 1, 1] = {
-        }
-        surface_colors[2, 1, 1] = {
-            Surfaces.RIGHT.name: GlColors4f.BLUE_SOLID.value
-        }
-        surface_colors[0, 1, 2] = {
-            Surfaces.BACK.name: GlColors4f.ORANGE_SOLID.value,
-            Surfaces.LEFT.name: GlColors4f.GREEN_SOLID.value,
-        }
-        surface_colors[1, 1, 2] = {
-            Surfaces.BACK.name: GlColors4f.ORANGE_SOLID.value,
-        }
-        surface_colors[2, 1, 2] = {
-            Surfaces.BACK.name: GlColors4f.ORANGE_SOLID.value,
-            Surfaces.RIGHT.name: GlColors4f.BLUE_SOLID.value
-        }
-        # TOP layer
-        surface_colors[0, 2, 0] = {
-            Surfaces.LEFT.name: GlColors4f.GREEN_SOLID.value,
-            Surfaces.FRONT.name: GlColors4f.RED_SOLID.value,
-            Surfaces.TOP.name: GlColors4f.WHITE_SOLID.value
-        }
-        surface_colors[1, 2, 0] = {
-            Surfaces.FRONT.name: GlColors4f.RED_SOLID.value,
-            Surfaces.TOP.name: GlColors4f.WHITE_SOLID.value,
-        }
-        surface_colors[2, 2, 0] = {
-            Surfaces.FRONT.name: GlColors4f.RED_SOLID.value,
-            Surfaces.TOP.name: GlColors4f.WHITE_SOLID.value,
-            Surfaces.RIGHT.name: GlColors4f.BLUE_SOLID.value
-        }
-        surface_colors[0, 2, 1] = {
-            Surfaces.LEFT.name: GlColors4f.GREEN_SOLID.value,
-            Surfaces.TOP.name: GlColors4f.WHITE_SOLID.value
-        }
-        surface_colors[1, 2, 1] = {
-            Surfaces.TOP.name: GlColors4f.WHITE_SOLID.value,
-        }
-        surface_colors[2, 2, 1] = {
-            Surfaces.TOP.name: GlColors4f.WHITE_SOLID.value,
-            Surfaces.RIGHT.name: GlColors4f.BLUE_SOLID.value
-        }
-        surface_colors[0, 2, 2] = {
-            Surfaces.BACK.name: GlColors4f.ORANGE_SOLID.value,
-            Surfaces.LEFT.name: GlColors4f.GREEN_SOLID.value,
-            Surfaces.TOP.name: GlColors4f.WHITE_SOLID.value
-        }
-        surface_colors[1, 2, 2] = {
-            Surfaces.BACK.name: GlColors4f.ORANGE_SOLID.value,
-            Surfaces.TOP.name: GlColors4f.WHITE_SOLID.value,
-        }
-        surface_colors[2, 2, 2] = {
-            Surfaces.BACK.name: GlColors4f.ORANGE_SOLID.value,
-            Surfaces.TOP.name: GlColors4f.WHITE_SOLID.value,
-            Surfaces.RIGHT.name: GlColors4f.BLUE_SOLID.value
-        }
+    def get_piece_colors(n: int = 3) -> np.ndarray:
+        """
+        Returns: (n, n, n, 6, 4) RGBA colors of the Surfaces of every piece of an n x n x n cube, indexed by x (left to
+        right), y (bottom to top) and z (front to back): the solved color of the face a surface lies on, else black.
+        """
+        surfaces: List[Surfaces] = list(Surfaces)
+        surface_colors: np.ndarray = np.empty((n, n, n, len(surfaces), 4))
+        surface_colors[...] = GlColors4f.BLACK_SOLID.value
+        # One slab of pieces per face, as (axis, index) of the slab
+        for face, (axis, index) in {'L': (0, 0), 'R': (0, n - 1), 'D': (1, 0), 'U': (1, n - 1), 'F': (2, 0),
+                                    'B': (2, n - 1)}.items():
+            slab: List = [slice(None)] * 3
+            slab[axis] = index
+            surface_colors[(*slab, surfaces.index(FACE_SURFACES[face]))] = FACE_COLORS[face].value
         return surface_colors
 
-    def get_pieces(self) -> np.ndarray[(3, 3, 3), RubiksPiece]:
+    @property
+    def state(self) -> AnyCubeState:
+        """
+        The cube as drawn at rest; turns still queued in the scheduler are not applied yet.
+        """
+        return self.__scheduler.state
+
+    @property
+    def drawn_facelets(self) -> np.ndarray:
+        """
+        The 3x3x3 facelets as drawn: the state turned by the whole-cube rotations of its slice and wide turns.
+        """
+        orientation: np.ndarray = self.__scheduler.orientation
+        if orientation is not self.__drawn_orientation:
+            self.__drawn_orientation = orientation
+            self.__drawn_permutation = get_rotation_permutation(orientation)
+        return self.state.facelets[self.__drawn_permutation]
+
+    @property
+    def n(self) -> int:
+        return self.__n
+
+    @property
+    def stickers(self) -> np.ndarray:
+        """
+        The state as a (6, n, n) sticker array, URFDLB faces row by row.
+        """
+        return self.state.facelets.reshape(-1, self.__n, self.__n)
+
+    @property
+    def scheduler(self) -> MoveScheduler:
+        return self.__scheduler
+
+    @property
+    def history(self) -> Optional[MoveHistory]:
+        """
+        Undo/redo history of the face turns made through rotate() and turn_layers(); None for cubes other than the
+        3x3x3.
+        """
+        return self.__history
+
+    @property
+    def is_rotating(self) -> bool:
+        return self.__scheduler.is_rotating
+
+    @property
+    def render_mode(self) -> CubeRenderModes:
+        return self.__render_mode
+
+    def init_renderer(self):
+        """
+        Imports the rendering layer and builds the renderer, or the pieces in immediate mode; needs a GL context.
+        """
+        if self.__renderer is not None or self.__pieces is not None:
+            return
+        from vbo_renderer import NxNCubeRenderer, VboCubeRenderer
+        if self.__n != 3:
+            self.__renderer = NxNCubeRenderer(self.center_pos, self.__piece_edge_length, self.__n)
+        elif self.__render_mode == CubeRenderModes.VBO:
+            self.__renderer = VboCubeRenderer(self.center_pos, self.__piece_edge_length)
+        else:
+            self.__surface_colors = self.get_piece_colors()
+            self.__pieces = self.get_pieces()
+
+    def get_pieces(self) -> np.ndarray[(3, 3, 3), 'RubiksPiece']:
+        from rubiks_piece import RubiksPiece
         cubes: np.ndarray[(3, 3, 3), RubiksPiece] = np.empty((3, 3, 3), dtype=RubiksPiece)
         offsets: np.ndarray[float] = np.array([r * self.__piece_edge_length * 1.1 for r in range(-1, 2)])
         for j, y_offset in enumerate(offsets):
@@ -169,8 +150,8 @@ class RubiksCube(GLObject):
                                                             self._center_pos[1] + y_offset,
                                                             self._center_pos[2] + z_offset)
                     location_index: Tuple[int, int, int] = (i, j, k)
-                    surface_colors: dict = self.__surface_colors[i, j, k]
-                    print(faces)
+                    surface_colors: dict = {surface.name: tuple(self.__surface_colors[i, j, k, s])
+                                            for s, surface in enumerate(Surfaces)}
                     cube: RubiksPiece = RubiksPiece(rubiks_cube_center=self.center_pos,
                                                     center_pos=cube_pos,
                                                     edge_length=self.__piece_edge_length,
@@ -181,31 +162,111 @@ class RubiksCube(GLObject):
         return cubes
 
     def rotate(self, face: str, angle):
+        """
+        Queues a face turn. Faces are named by their centres, which slice and wide turns may have moved elsewhere.
+        """
+        move: int = move_from_rotation(face, angle)
+        self.__scheduler.enqueue(MOVE_NAMES[move])
+        if self.__history is not None:
+            self.__history.record(move)
+
+    def turn_layers(self, turn: LayerTurn) -> List[int]:
+        """
+        Queues a turn of one or more layers, about a face of the cube as drawn, as the picker finds it. The 3x3x3 makes
+        a slice or wide turn as the face turns it leaves behind plus a whole-cube rotation; undo takes back the face
+        turns only, as the rotation just changes how the cube is drawn.
+
+        Returns: The face turns recorded in the history of the 3x3x3; none for other sizes.
+        """
+        if self.__n != 3:
+            self.__scheduler.enqueue(turn)
+            return []
+        # The turn plays after the queued ones, when the cube is drawn as they leave it
+        turn = reorient_turn(turn, self.__scheduler.queued_orientation.T)
+        self.__scheduler.enqueue(turn)
+        moves: List[int] = [move_from_layer_turn(outer) for outer in split_turn(turn)[0]]
+        if self.__history is not None:
+            for move in moves:
+                self.__history.record(move)
+        return moves
+
+    def get_bounds(self) -> Tuple[np.ndarray, float]:
+        """
+        Returns: (center, half edge) of the box the renderers draw the cube in.
+        """
+        from vbo_renderer import get_cube_bounds
+        return get_cube_bounds(self.center_pos, self.__piece_edge_length, self.__n)
+
+    def undo(self, instant: bool = False) -> Optional[int]:
+        """
+        Takes back the last turn, animated like any other turn unless `instant`.
 
-        self.rotation_start_time = time.time()
-        self.is_rotating = True
+        Returns: The inverse move played, or None when there is nothing to undo.
+        """
+        return self.__play(self.__history.undo() if self.__history is not None else None, instant)
 
-        self.rotation_face: str = face
-        self.rotation_angle = angle
+    def redo(self, instant: bool = False) -> Optional[int]:
+        """
+        Returns: The move played again, or None when there is nothing to redo.
+        """
+        return self.__play(self.__history.redo() if self.__history is not None else None, instant)
 
+    def jump_to(self, step: int):
+        """
+        Shows the cube after the first `step` turns of the history at once, dropping the turns still queued.
+        """
+        if self.__history is None:
+            raise ValueError('History is only kept for a 3x3x3 cube')
+        self.__scheduler.clear()
+        self.state.facelets[:] = self.__history.jump(step).facelets
 
+    def reset_history(self):
+        """
+        Starts the history over from the cube as it will be once the queued turns are played.
+        """
+        if self.__history is not None:
+            self.__scheduler.fast_forward()
+            self.__history.reset(self.state)
+
+    def __play(self, move: Optional[int], instant: bool) -> Optional[int]:
+        if move is not None and instant:
+            # Queued turns come first, so the state matches the history cursor
+            self.__scheduler.fast_forward()
+            self.state.apply_move(move)
+        elif move is not None:
+            self.__scheduler.enqueue(MOVE_NAMES[move])
+        return move
+
+    def update(self):
+        turn = self.__scheduler.update()
+        self.rotation_face, self.elapsed_angle = turn if turn is not None else (None, 0)
+        head = self.__scheduler.head
+        self.rotation_layers = (head.start, head.stop) if isinstance(head, LayerTurn) else (0, 1)
 
     def render(self, *args, **kwargs):
-        if self.is_rotating:
-            self.elapsed_rotation_time = time.time() - self.rotation_start_time
-            duration_in_sec = 0.5
-            rotation_completion = self.elapsed_rotation_time / duration_in_sec
-            self.elapsed_angle = self.rotation_angle * rotation_completion
+        self.update()
+        self.init_renderer()
+        if self.__n != 3:
+            self.__renderer.set_stickers(self.stickers)
+            self.__renderer.render(rotation_face=self.rotation_face, layers=self.rotation_layers,
+                                   elapsed_angle=self.elapsed_angle)
+            return
+        if self.__renderer is not None:
+            self.__renderer.set_facelets(self.drawn_facelets)
+            self.__renderer.render(rotation_face=self.rotation_face, elapsed_angle=self.elapsed_angle,
+                                   layers=self.rotation_layers)
+            return
 
-            vectorized_fun = np.vectorize(RubiksPiece.render)
+        from rubiks_piece import RubiksPiece
+        vectorized_fun = np.vectorize(RubiksPiece.render)
+        # The pieces only turn with the faces they lie on
+        if self.rotation_face is not None and self.rotation_layers == (0, 1):
             vectorized_fun(self.__pieces,
                            elapsed_angle=self.elapsed_angle,
                            rotation_face=self.rotation_face)
-
-            if rotation_completion >= 1:
-                self.is_rotating = False
-                self.rotation_axis = None
-                self.elapsed_angle = 0
         else:
-            vectorized_fun = np.vectorize(RubiksPiece.render)
             vectorized_fun(self.__pieces)
+
+    def release(self):
+        if self.__renderer is not None:
+            self.__renderer.release()
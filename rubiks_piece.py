@@ -56,19 +56,17 @@ class RubiksPiece(GLObject):
             'L': RubiksAxes.X.value,
             'R': RubiksAxes.X.value,
         }
-        # Transparency
-        glMatrixMode(GL_MODELVIEW)  # Applies subsequent matrix operations to the modelview matrix stack.
-        glLoadIdentity()
+        # On top of the camera's model view, which the caller keeps
         rotation_axis: Tuple[int, int, int] = face_rotation_dict[rotation_face]
 
         if rotation_face in self.faces:
-            print(glGetInteger(GL_MODELVIEW_STACK_DEPTH))
             glTranslatef(*self.rubiks_cube_center)
             glRotatef(elapsed_angle, *rotation_axis)
             glTranslatef(*[-1 * _ for _ in self.rubiks_cube_center])
-        self.render()
 
     def render(self, *args, **kwargs):
+        glMatrixMode(GL_MODELVIEW)  # Applies subsequent matrix operations to the modelview matrix stack.
+        glPushMatrix()
         if kwargs:
             elapsed_angle = kwargs['elapsed_angle']
             rotation_face = kwargs['rotation_face']
@@ -81,3 +79,4 @@ class RubiksPiece(GLObject):
             for vertex in surface.value:
                 glVertex3fv([_ * 0.98 for _ in self.__vertices[vertex]])
         glEnd()
+        glPopMatrix()
@@ -0,0 +1,260 @@
+import os
+import time
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from cube_state import FACELET_COUNT, CubeState, Move, compose_moves, parse_move
+from data_classes import SessionFrame
+from enums import SessionEventKinds
+
+# Layout: a header, then blocks of one keyframe and `interval` event records, all in 8-byte slots. Event i lives in
+# block i // interval, which starts with the state before its first event, so both are found by arithmetic alone.
+MAGIC: bytes = b'RUBKLOG1'
+VERSION: int = 1
+HEADER_DTYPE: np.dtype = np.dtype([('magic', 'S8'), ('version', '<u4'), ('interval', '<u4'), ('record_size', '<u2'),
+                                   ('keyframe_slots', '<u2'), ('reserved', '<u4'), ('start_time', '<f8')])
+# dt_ms is the time since the previous event; longer gaps are split with IDLE records
+RECORD_DTYPE: np.dtype = np.dtype([('kind', 'u1'), ('move', 'u1'), ('dx', '<i2'), ('dy', '<i2'), ('dt_ms', '<u2')])
+KEYFRAME_DTYPE: np.dtype = np.dtype([('time', '<f8'), ('drag', '<i4', 2), ('facelets', 'u1', FACELET_COUNT)])
+KEYFRAME_SLOTS: int = -(-KEYFRAME_DTYPE.itemsize // RECORD_DTYPE.itemsize)
+KEYFRAME_BYTES: int = KEYFRAME_SLOTS * RECORD_DTYPE.itemsize
+MAX_DT_MS: int = np.iinfo(np.uint16).max
+
+DEFAULT_INTERVAL: int = 1024
+DEFAULT_POLL_SEC: float = 0.05
+
+
+class SessionWriter:
+    """
+    Appends turns and camera drags to a session log as they happen. Every record is flushed right away, so readers
+    can tail the log; opening an existing log continues it from its last state.
+    """
+
+    def __init__(self, path: str, state: CubeState = None, interval: int = DEFAULT_INTERVAL,
+                 clock=time.time):
+        self.path: str = path
+        self.__clock = clock
+        if os.path.exists(path) and os.path.getsize(path):
+            reader: SessionReader = SessionReader(path)
+            last: SessionFrame = reader.seek(len(reader))
+            self.__interval: int = reader.interval
+            self.__start_time: float = reader.start_time
+            self.__state: CubeState = CubeState(last.facelets)
+            self.__drag: List[int] = list(last.drag)
+            self.__count: int = len(reader)
+            self.__time_ms: int = round(last.time * 1000)
+            reader.close()
+            # A torn record at the end is dropped, so appends stay aligned to the slot grid
+            self.__file = open(path, 'r+b')
+            self.__file.truncate(reader.get_byte_count(self.__count))
+            self.__file.seek(0, os.SEEK_END)
+        else:
+            self.__interval = interval
+            self.__start_time = clock()
+            self.__state = (state or CubeState()).copy()
+            self.__drag = [0, 0]
+            self.__count = 0
+            self.__time_ms = 0
+            self.__file = open(path, 'wb')
+            header: np.ndarray = np.zeros(1, dtype=HEADER_DTYPE)
+            header[0] = (MAGIC, VERSION, interval, RECORD_DTYPE.itemsize, KEYFRAME_SLOTS, 0, self.__start_time)
+            self.__file.write(header.tobytes())
+            self.__file.flush()
+
+    def __len__(self) -> int:
+        return self.__count
+
+    @property
+    def state(self) -> CubeState:
+        return self.__state
+
+    def record_move(self, move: Move):
+        move = parse_move(move)
+        self.__append(SessionEventKinds.TURN, move, 0, 0)
+        self.__state.apply_move(move)
+
+    def record_drag(self, dx: int, dy: int):
+        self.__append(SessionEventKinds.DRAG, 0, dx, dy)
+        self.__drag[0] += dx
+        self.__drag[1] += dy
+
+    def __append(self, kind: SessionEventKinds, move: int, dx: int, dy: int):
+        now_ms: int = max(self.__time_ms, round((self.__clock() - self.__start_time) * 1000))
+        dt_ms: int = now_ms - self.__time_ms
+        self.__time_ms = now_ms
+        chunks: List[bytes] = []
+        while dt_ms > MAX_DT_MS:
+            chunks.append(self.__pack(SessionEventKinds.IDLE, 0, 0, 0, MAX_DT_MS, now_ms - dt_ms + MAX_DT_MS))
+            dt_ms -= MAX_DT_MS
+        chunks.append(self.__pack(kind, move, dx, dy, dt_ms, now_ms))
+        # One write per event, so a tailing reader rarely sees a torn record
+        self.__file.write(b''.join(chunks))
+        self.__file.flush()
+
+    def __pack(self, kind: SessionEventKinds, move: int, dx: int, dy: int, dt_ms: int, time_ms: int) -> bytes:
+        data: bytes = b''
+        if self.__count % self.__interval == 0:
+            keyframe: np.ndarray = np.zeros(1, dtype=KEYFRAME_DTYPE)
+            # The keyframe holds the state before this event, at the time of the previous one
+            keyframe[0] = ((time_ms - dt_ms) / 1000, self.__drag, self.__state.facelets)
+            data = keyframe.tobytes().ljust(KEYFRAME_BYTES, b'\0')
+        record: np.ndarray = np.zeros(1, dtype=RECORD_DTYPE)
+        record[0] = (kind, move, np.clip(dx, -32768, 32767), np.clip(dy, -32768, 32767), dt_ms)
+        self.__count += 1
+        return data + record.tobytes()
+
+    def close(self):
+        self.__file.close()
+
+
+class SessionReader:
+    """
+    Memory-mapped view of a session log. Seeking to an event index costs one keyframe read and at most `interval`
+    record applications, composed into one permutation; seeking to a time adds a binary search over keyframe times.
+    refresh() maps a log that grew since, and tail() follows a log while it is being written.
+    """
+
+    def __init__(self, path: str):
+        self.path: str = path
+        self.__map: Optional[np.memmap] = None
+        self.__count: int = 0
+        header: np.ndarray = np.fromfile(path, dtype=HEADER_DTYPE, count=1)
+        if len(header) != 1 or header[0]['magic'] != MAGIC:
+            raise ValueError(f'{path} is not a session log')
+        if header[0]['version'] != VERSION or header[0]['record_size'] != RECORD_DTYPE.itemsize \
+                or header[0]['keyframe_slots'] != KEYFRAME_SLOTS:
+            raise ValueError(f'{path} has an unsupported session log layout')
+        self.interval: int = int(header[0]['interval'])
+        self.start_time: float = float(header[0]['start_time'])
+        self.__block_slots: int = KEYFRAME_SLOTS + self.interval
+        self.refresh()
+
+    def __len__(self) -> int:
+        return self.__count
+
+    def get_byte_count(self, count: int) -> int:
+        """
+        Returns: Size of a log holding the first `count` events.
+        """
+        blocks, rest = divmod(count, self.interval)
+        slots: int = blocks * self.__block_slots + (KEYFRAME_SLOTS + rest if rest else 0)
+        return HEADER_DTYPE.itemsize + slots * RECORD_DTYPE.itemsize
+
+    def refresh(self) -> int:
+        """
+        Maps the complete records in the file now, for logs still being written.
+
+        Returns: Number of new events.
+        """
+        slots: int = max(0, os.path.getsize(self.path) - HEADER_DTYPE.itemsize) // RECORD_DTYPE.itemsize
+        blocks, rest = divmod(slots, self.__block_slots)
+        count: int = blocks * self.interval + max(0, rest - KEYFRAME_SLOTS)
+        if count == self.__count and self.__map is not None:
+            return 0
+        previous: int = self.__count
+        self.__map = np.memmap(self.path, dtype=np.uint8, mode='r', offset=HEADER_DTYPE.itemsize,
+                               shape=(slots * RECORD_DTYPE.itemsize,)) if slots else None
+        self.__count = count
+        return count - previous
+
+    def close(self):
+        self.__map = None
+
+    def __block_offset(self, block: int) -> int:
+        return block * self.__block_slots * RECORD_DTYPE.itemsize
+
+    def keyframe(self, block: int) -> np.void:
+        offset: int = self.__block_offset(block)
+        return self.__map[offset:offset + KEYFRAME_DTYPE.itemsize].view(KEYFRAME_DTYPE)[0]
+
+    def keyframe_times(self) -> np.ndarray:
+        """
+        Returns: Time of every keyframe, a strided view into the map that reads one page per keyframe touched.
+        """
+        blocks: int = -(-self.__count // self.interval)
+        if not blocks:
+            return np.empty(0)
+        return np.ndarray((blocks,), dtype='<f8', buffer=self.__map, offset=0,
+                          strides=(self.__block_slots * RECORD_DTYPE.itemsize,))
+
+    def records(self, start: int, stop: int) -> np.ndarray:
+        """
+        Returns: Copy of the records of events start to stop - 1.
+        """
+        stop = min(stop, self.__count)
+        parts: List[np.ndarray] = []
+        while start < stop:
+            block, first = divmod(start, self.interval)
+            last: int = min(self.interval, first + stop - start)
+            offset: int = self.__block_offset(block) + KEYFRAME_BYTES
+            parts.append(self.__map[offset + first * RECORD_DTYPE.itemsize:offset + last * RECORD_DTYPE.itemsize]
+                         .view(RECORD_DTYPE))
+            start += last - first
+        return np.concatenate(parts) if parts else np.empty(0, dtype=RECORD_DTYPE)
+
+    def seek(self, index: int) -> SessionFrame:
+        """
+        Returns: The session after its first `index` events.
+        """
+        if not 0 <= index <= self.__count:
+            raise IndexError(f'Event {index} out of range for {self.__count} events')
+        if self.__count == 0:
+            return SessionFrame(index=0, time=0.0, facelets=CubeState().facelets, drag=(0, 0))
+        block: int = min(index // self.interval, (self.__count - 1) // self.interval)
+        keyframe: np.void = self.keyframe(block)
+        records: np.ndarray = self.records(block * self.interval, index)
+        state: CubeState = CubeState(keyframe['facelets'])
+        turns: np.ndarray = records['move'][records['kind'] == SessionEventKinds.TURN]
+        if turns.size:
+            state.apply_permutation(compose_moves(turns.tolist()))
+        drag: np.ndarray = keyframe['drag'] + np.array([records['dx'].sum(), records['dy'].sum()])
+        # Times add up in whole milliseconds, as the writer keeps them
+        time_ms: int = round(float(keyframe['time']) * 1000) + int(records['dt_ms'].sum(dtype=np.int64))
+        return SessionFrame(index=index, time=time_ms / 1000, facelets=state.facelets,
+                            drag=(int(drag[0]), int(drag[1])))
+
+    def event_time(self, index: int) -> float:
+        """
+        Returns: Seconds after the start at which event `index` was recorded.
+        """
+        block: int = index // self.interval
+        records: np.ndarray = self.records(block * self.interval, index + 1)
+        return (round(float(self.keyframe(block)['time']) * 1000) + int(records['dt_ms'].sum(dtype=np.int64))) / 1000
+
+    def index_at(self, seconds: float) -> int:
+        """
+        Returns: Number of events recorded up to `seconds` after the start.
+        """
+        if not self.__count:
+            return 0
+        block: int = max(0, int(np.searchsorted(self.keyframe_times(), seconds, side='right')) - 1)
+        records: np.ndarray = self.records(block * self.interval, (block + 1) * self.interval)
+        times_ms: np.ndarray = round(float(self.keyframe(block)['time']) * 1000) + np.cumsum(records['dt_ms'],
+                                                                                              dtype=np.int64)
+        return block * self.interval + int(np.searchsorted(times_ms, round(seconds * 1000), side='right'))
+
+    def seek_time(self, seconds: float) -> SessionFrame:
+        if not self.__count:
+            return self.seek(0)
+        return self.seek(self.index_at(seconds))
+
+    def tail(self, start: int = None, poll_sec: float = DEFAULT_POLL_SEC,
+             timeout_sec: float = None) -> Iterator[Tuple[int, np.void]]:
+        """
+        Yields: (index, record) of every event from `start` (default: the current end), waiting for the writer as
+        needed. Stops after `timeout_sec` without new events, or never.
+        """
+        index: int = self.__count if start is None else start
+        idle_since: float = time.perf_counter()
+        while True:
+            if index < self.__count:
+                for record in self.records(index, self.__count):
+                    yield index, record
+                    index += 1
+                idle_since = time.perf_counter()
+            elif timeout_sec is not None and time.perf_counter() - idle_since >= timeout_sec:
+                return
+            else:
+                time.sleep(poll_sec)
+            self.refresh()
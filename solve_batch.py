@@ -0,0 +1,221 @@
+import argparse
+import json
+import os
+import sys
+from contextlib import nullcontext
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Set, TextIO, Tuple
+
+import numpy as np
+
+from cube_state import FACE_ORDER, FACELET_COUNT, CubeState
+from table_store import SharedTables, SharedTablesHandle, TableStore
+from two_phase import TwoPhaseSolver
+
+# A record is the input line number and the line itself
+Record = Tuple[int, str]
+
+_worker_solver: TwoPhaseSolver = None
+_worker_options: Tuple[int, float] = None
+
+
+def parse_state(text: str) -> Tuple[CubeState, dict]:
+    """
+    Returns: The state described by an input line and the JSONL record it came from (empty for plain lines). A line
+    is a URFDLB facelet string, a move string applied to the solved cube, or a JSON object with a "facelets" or
+    "moves" field.
+    """
+    record: dict = {}
+    text = text.strip()
+    if text.startswith('{'):
+        record = json.loads(text)
+        text = record.get('facelets') or record.get('moves') or ''
+        if not isinstance(text, str):
+            raise ValueError(f'Expected a string of facelets or moves, got {text!r}')
+    if len(text) == FACELET_COUNT and set(text) <= set(FACE_ORDER):
+        return CubeState.from_string(text), record
+    return CubeState().apply_moves(text), record
+
+
+def _init_worker(table_dir: str, max_length: int, timeout: float, shared: SharedTablesHandle = None):
+    global _worker_solver, _worker_options
+    _worker_solver = TwoPhaseSolver(TableStore(table_dir, SharedTables.attach(shared) if shared else None))
+    _worker_options = (max_length, timeout)
+
+
+def _solve_chunk(records: List[Record]) -> List[dict]:
+    results: List[dict] = []
+    for line, text in records:
+        result: dict = {'line': line}
+        if not text.strip():
+            # Blank lines get a result too, so a resumed run finds no gap in the output
+            result['blank'] = True
+            results.append(result)
+            continue
+        try:
+            state, record = parse_state(text)
+            if 'id' in record:
+                result['id'] = record['id']
+            solution: str = _worker_solver.solve(state, *_worker_options)
+            result.update(solution=solution, length=len(solution.split()))
+        except ValueError as e:
+            result['error'] = str(e)
+        except Exception as e:
+            # One malformed record must not stop the rest of a resumable batch
+            result['error'] = f'{type(e).__name__}: {e}'
+        results.append(result)
+    return results
+
+
+def _solve_facelets(facelets: np.ndarray) -> List[str]:
+    """
+    Returns: Solutions of a (N, 54) batch of states already checked to be solvable.
+    """
+    return [_worker_solver.solve(row, *_worker_options) for row in facelets]
+
+
+def read_records(lines: Iterable[str], start: int = 0, done: Set[int] = frozenset()) -> Iterator[Record]:
+    """
+    Yields: (line number, text) of the input lines from line `start` on, except those in done.
+    """
+    for line, text in enumerate(lines):
+        if line >= start and line not in done:
+            yield line, text
+
+
+def get_resume_point(output_path: str, start: int = 0) -> Tuple[int, Set[int], int]:
+    """
+    Scans a partially written output in one streaming pass. Every input line from `start` on gets a result, blank ones
+    included, and results arrive at most a window of chunks out of order, so beyond the first missing line only a
+    bounded set of already solved lines has to be remembered. `start` must be the one the output was begun with.
+
+    Returns: The first input line without a result, the solved lines after it, and the byte length of the output up
+    to its last complete result.
+    """
+    frontier: int = start
+    ahead: Set[int] = set()
+    complete: int = 0
+    if not os.path.exists(output_path):
+        return frontier, ahead, complete
+    with open(output_path, 'rb') as f:
+        for text in f:
+            try:
+                line: int = json.loads(text)['line']
+            except (ValueError, KeyError):
+                # A result cut short by the crash
+                break
+            if not text.endswith(b'\n'):
+                break
+            complete += len(text)
+            if line >= frontier:
+                ahead.add(line)
+            while frontier in ahead:
+                ahead.remove(frontier)
+                frontier += 1
+    return frontier, ahead, complete
+
+
+def solve_stream(records: Iterator[Record], output: TextIO, workers: int = None, ordered: bool = True,
+                 chunk_size: int = 16, window: int = None, table_dir: str = None, max_length: int = 21,
+                 timeout: float = 0.05, share_tables: bool = True) -> int:
+    """
+    Solves the records on a process pool and writes one JSON result per line. At most `window` chunks are in flight,
+    and in ordered mode only those may wait for an earlier chunk, so memory does not grow with the input size.
+    With `share_tables` the workers attach the solver tables from shared memory instead of mapping the files.
+
+    Returns: Number of results written.
+    """
+    # Imported here rather than at load, where the process pool machinery would cost the pool workers too
+    from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+    workers = workers or os.cpu_count()
+    window = window or 4 * workers
+    written: int = 0
+    # Solvers are built once per worker; building here first writes any missing tables for all of them to load
+    store: TableStore = TableStore(table_dir)
+    TwoPhaseSolver(store)
+    shared: Optional[SharedTables] = store.share() if share_tables else None
+    initargs: Tuple = (table_dir, max_length, timeout, shared.handle if shared else None)
+    # The pool is shut down before the shared tables are released
+    with shared or nullcontext(), ProcessPoolExecutor(workers, initializer=_init_worker, initargs=initargs) as pool:
+        in_flight: Dict[Future, int] = {}
+        finished: Dict[int, List[dict]] = {}
+        next_submit: int = 0
+        next_write: int = 0
+        chunks: Iterator[List[Record]] = iter(lambda: list(islice(records, chunk_size)), [])
+
+        def submit() -> bool:
+            nonlocal next_submit
+            chunk: List[Record] = next(chunks, None)
+            if chunk is None:
+                return False
+            in_flight[pool.submit(_solve_chunk, chunk)] = next_submit
+            next_submit += 1
+            return True
+
+        def write(results: List[dict]):
+            nonlocal written
+            for result in results:
+                output.write(json.dumps(result) + '\n')
+            output.flush()
+            written += len(results)
+
+        exhausted: bool = False
+        while True:
+            while not exhausted and len(in_flight) + len(finished) < window:
+                exhausted = not submit()
+            if not in_flight:
+                break
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                index: int = in_flight.pop(future)
+                if ordered:
+                    finished[index] = future.result()
+                else:
+                    write(future.result())
+            while next_write in finished:
+                write(finished.pop(next_write))
+                next_write += 1
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Solve a stream of scrambles, one move string, facelet string or '
+                                                 'JSON record per line, writing one JSON result per line.')
+    parser.add_argument('input', nargs='?', default='-', help="Input file, or '-' for stdin")
+    parser.add_argument('-o', '--output', default='-', help="Output file, or '-' for stdout")
+    parser.add_argument('--workers', type=int, default=None, help='Solver processes, default one per CPU')
+    parser.add_argument('--unordered', action='store_true', help='Write results as they finish')
+    parser.add_argument('--chunk-size', type=int, default=16, help='Scrambles per task')
+    parser.add_argument('--window', type=int, default=None, help='Chunks in flight, default 4 per worker')
+    parser.add_argument('--start', type=int, default=0,
+                        help='Skip input lines before this line number; pass the same value with --resume')
+    parser.add_argument('--resume', action='store_true',
+                        help='Continue after a crash: skip the lines already in the output file and append to it')
+    parser.add_argument('--max-length', type=int, default=21)
+    parser.add_argument('--timeout', type=float, default=0.05)
+    parser.add_argument('--table-dir', default=None)
+    parser.add_argument('--file-tables', action='store_true',
+                        help='Map the table files in every worker instead of sharing one copy in shared memory')
+    args = parser.parse_args()
+
+    start: int = args.start
+    done: Set[int] = set()
+    if args.resume:
+        if args.output == '-':
+            parser.error('--resume needs an output file')
+        start, done, complete = get_resume_point(args.output, start)
+        if os.path.exists(args.output):
+            os.truncate(args.output, complete)
+
+    source: TextIO = sys.stdin if args.input == '-' else open(args.input)
+    output: TextIO = sys.stdout if args.output == '-' else open(args.output, 'a' if args.resume else 'w')
+    written: int = solve_stream(read_records(source, start, done), output, workers=args.workers,
+                                ordered=not args.unordered, chunk_size=args.chunk_size, window=args.window,
+                                table_dir=args.table_dir, max_length=args.max_length, timeout=args.timeout,
+                                share_tables=not args.file_tables)
+    print(f'{written} results written, resuming from line {start}' if start else f'{written} results written',
+          file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
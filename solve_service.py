@@ -0,0 +1,331 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import asdict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from cubie_cube import facelets_to_cubies, verify_cubies
+from data_classes import ServiceStats
+from solve_batch import _init_worker, _solve_facelets, parse_state
+from state_codec import encode_facelets
+from table_store import SharedTables, TableStore
+from two_phase import TwoPhaseSolver
+
+DEFAULT_HOST: str = '127.0.0.1'
+DEFAULT_PORT: int = 8642
+DEFAULT_MAX_BATCH: int = 64
+DEFAULT_BATCH_WINDOW_SEC: float = 0.002
+DEFAULT_MAX_PENDING: int = 1024
+SOLVE_CHUNK_SIZE: int = 4
+DEFAULT_DEADLINE_SEC: float = 2.0
+DEFAULT_CACHE_SIZE: int = 1 << 16
+MAX_BODY_BYTES: int = 1 << 16
+
+HTTP_REASONS: Dict[int, str] = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+                                413: 'Payload Too Large', 500: 'Internal Server Error', 503: 'Service Unavailable',
+                                504: 'Gateway Timeout'}
+
+# State key of the cache: the (corner code, edge code) pair of state_codec
+StateKey = Tuple[int, int]
+
+
+class ServiceError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status: int = status
+
+
+class SolutionCache:
+    """
+    Least recently used map of state keys to solutions.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CACHE_SIZE):
+        self.capacity: int = capacity
+        self.__solutions: OrderedDict = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.__solutions)
+
+    def get(self, key: StateKey) -> Optional[str]:
+        solution: Optional[str] = self.__solutions.get(key)
+        if solution is not None:
+            self.__solutions.move_to_end(key)
+        return solution
+
+    def put(self, key: StateKey, solution: str):
+        self.__solutions[key] = solution
+        self.__solutions.move_to_end(key)
+        while len(self.__solutions) > self.capacity:
+            self.__solutions.popitem(last=False)
+
+
+class SolveService:
+    """
+    Solves cube states for concurrent clients. Requests queue up while a batch is being solved and are taken together
+    as the next micro-batch: it is checked and keyed with one vectorized cubie and state codec pass, cached and
+    repeated states are answered without a search, and the rest is split over the solver processes.
+
+    At most `max_pending` requests wait at a time; more are turned away at once rather than queued without bound, and
+    a request still waiting at its deadline is answered with a timeout and dropped from its batch if not solved yet.
+    """
+
+    def __init__(self, workers: int = None, max_batch: int = DEFAULT_MAX_BATCH,
+                 batch_window_sec: float = DEFAULT_BATCH_WINDOW_SEC, max_pending: int = DEFAULT_MAX_PENDING,
+                 deadline_sec: float = DEFAULT_DEADLINE_SEC, cache_size: int = DEFAULT_CACHE_SIZE,
+                 table_dir: str = None, max_length: int = 21, timeout: float = 0.05):
+        self.workers: int = os.cpu_count() if workers is None else workers
+        self.max_batch: int = max_batch
+        self.batch_window_sec: float = batch_window_sec
+        self.max_pending: int = max_pending
+        self.deadline_sec: float = deadline_sec
+        self.stats: ServiceStats = ServiceStats()
+        self.cache: SolutionCache = SolutionCache(cache_size)
+        self.__pending: int = 0
+        self.__queue: asyncio.Queue = asyncio.Queue()
+        self.__batcher: Optional[asyncio.Task] = None
+
+        # Building a solver here first writes any missing tables; worker processes attach them from shared memory
+        store: TableStore = TableStore(table_dir)
+        TwoPhaseSolver(store)
+        self.__shared: Optional[SharedTables] = store.share() if self.workers else None
+        initargs: Tuple = (table_dir, max_length, timeout, self.__shared.handle if self.__shared else None)
+        # Without workers, one thread solves in this process, which suits tests and single-CPU machines
+        self.__executor: Executor = ProcessPoolExecutor(self.workers, initializer=_init_worker, initargs=initargs) \
+            if self.workers else ThreadPoolExecutor(1, initializer=_init_worker, initargs=initargs)
+
+    @property
+    def pending(self) -> int:
+        return self.__pending
+
+    def start(self):
+        self.__batcher = asyncio.get_running_loop().create_task(self.__run_batches())
+
+    def close(self):
+        if self.__batcher is not None:
+            self.__batcher.cancel()
+        self.__executor.shutdown(cancel_futures=True)
+        if self.__shared is not None:
+            self.__shared.release()
+            self.__shared = None
+
+    async def solve(self, facelets: np.ndarray, deadline_sec: float = None) -> Tuple[str, bool]:
+        """
+        Returns: (solution, whether it came from the cache) of one state.
+        """
+        self.stats.requests += 1
+        if self.__pending >= self.max_pending:
+            self.stats.rejected += 1
+            raise ServiceError(503, f'{self.__pending} requests pending, try again later')
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.__pending += 1
+        self.__queue.put_nowait((np.asarray(facelets, dtype=np.uint8), future))
+        try:
+            return await asyncio.wait_for(future, self.deadline_sec if deadline_sec is None else deadline_sec)
+        except asyncio.TimeoutError:
+            # wait_for cancelled the future, so the batch skips or ignores it
+            self.stats.expired += 1
+            raise ServiceError(504, 'Deadline exceeded') from None
+        finally:
+            self.__pending -= 1
+
+    async def __next_batch(self) -> List[Tuple[np.ndarray, asyncio.Future]]:
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        batch: List[Tuple[np.ndarray, asyncio.Future]] = [await self.__queue.get()]
+        # Under load the queue already holds the next batch; otherwise a short window lets requests sent together
+        # share one
+        window_end: float = loop.time() + self.batch_window_sec
+        while len(batch) < self.max_batch:
+            if not self.__queue.empty():
+                batch.append(self.__queue.get_nowait())
+                continue
+            try:
+                batch.append(await asyncio.wait_for(self.__queue.get(), window_end - loop.time()))
+            except asyncio.TimeoutError:
+                break
+        return [(facelets, future) for facelets, future in batch if not future.done()]
+
+    async def __run_batches(self):
+        while True:
+            batch: List[Tuple[np.ndarray, asyncio.Future]] = await self.__next_batch()
+            if batch:
+                try:
+                    await self.__solve_batch(batch)
+                except Exception as e:
+                    # A failed batch fails its requests, not the service
+                    for _, future in batch:
+                        if not future.done():
+                            future.set_exception(ServiceError(500, f'Solver failed: {e!r}'))
+
+    async def __solve_batch(self, batch: List[Tuple[np.ndarray, asyncio.Future]]):
+        self.stats.batches += 1
+        self.stats.batched += len(batch)
+        facelets: np.ndarray = np.stack([facelets for facelets, _ in batch])
+        valid: np.ndarray = verify_cubies(*facelets_to_cubies(facelets))
+        for i in np.flatnonzero(~valid):
+            self.stats.invalid += 1
+            batch[i][1].set_exception(ServiceError(400, 'Cube state is not solvable'))
+
+        corner_codes, edge_codes = encode_facelets(facelets[valid])
+        waiting: Dict[StateKey, List[asyncio.Future]] = {}
+        rows: List[int] = []
+        for i, key in zip(np.flatnonzero(valid).tolist(), zip(corner_codes.tolist(), edge_codes.tolist())):
+            future: asyncio.Future = batch[i][1]
+            solution: Optional[str] = self.cache.get(key)
+            if solution is not None:
+                self.stats.cache_hits += 1
+                future.set_result((solution, True))
+            elif key in waiting:
+                waiting[key].append(future)
+            else:
+                waiting[key] = [future]
+                rows.append(i)
+        if not rows:
+            return
+
+        # Small chunks, at most one per worker in flight, so states whose requests all expired meanwhile are skipped
+        keys: List[StateKey] = list(waiting)
+        running: asyncio.Semaphore = asyncio.Semaphore(max(1, self.workers))
+
+        async def solve_chunk(start: int):
+            async with running:
+                live: List[int] = [j for j in range(start, min(start + SOLVE_CHUNK_SIZE, len(keys)))
+                                   if not all(future.done() for future in waiting[keys[j]])]
+                if not live:
+                    return
+                solutions: List[str] = await asyncio.get_running_loop().run_in_executor(
+                    self.__executor, _solve_facelets, facelets[[rows[j] for j in live]])
+            for j, solution in zip(live, solutions):
+                self.stats.solved += 1
+                self.cache.put(keys[j], solution)
+                for future in waiting[keys[j]]:
+                    if not future.done():
+                        future.set_result((solution, False))
+
+        await asyncio.gather(*(solve_chunk(start) for start in range(0, len(keys), SOLVE_CHUNK_SIZE)))
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Serves HTTP/1.1 requests on one connection, kept alive until the client closes it.
+        """
+        try:
+            while True:
+                request_line: bytes = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, path, version = request_line.decode('latin-1').split()
+                headers: Dict[str, str] = {}
+                while True:
+                    line: bytes = await reader.readline()
+                    if not line.strip():
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length: int = int(headers.get('content-length', 0))
+                if length > MAX_BODY_BYTES:
+                    await self.__respond(writer, 413, {'error': f'Body over {MAX_BODY_BYTES} bytes'}, False)
+                    break
+                body: bytes = await reader.readexactly(length)
+                status, payload = await self.__route(method, path, body)
+                keep_alive: bool = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                await self.__respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        except asyncio.CancelledError:
+            # The server shutting down with the connection idle; nothing is left to answer
+            pass
+        finally:
+            writer.close()
+
+    async def __route(self, method: str, path: str, body: bytes) -> Tuple[int, dict]:
+        if path == '/stats':
+            return 200, dict(asdict(self.stats), mean_batch_size=self.stats.mean_batch_size,
+                             pending=self.__pending, cached=len(self.cache))
+        if path != '/solve':
+            return 404, {'error': f'No route {path}'}
+        if method != 'POST':
+            return 405, {'error': 'Use POST'}
+        result: dict = {}
+        try:
+            state, record = parse_state(body.decode())
+            if 'id' in record:
+                result['id'] = record['id']
+            deadline_ms: Optional[float] = record.get('deadline_ms')
+            solution, cached = await self.solve(state.facelets, None if deadline_ms is None else deadline_ms / 1000)
+        except ServiceError as e:
+            return e.status, dict(result, error=str(e))
+        except (ValueError, TypeError, AttributeError) as e:
+            return 400, dict(result, error=str(e))
+        return 200, dict(result, solution=solution, length=len(solution.split()), cached=cached)
+
+    @staticmethod
+    async def __respond(writer: asyncio.StreamWriter, status: int, payload: dict, keep_alive: bool):
+        data: bytes = json.dumps(payload).encode()
+        head: str = (f'HTTP/1.1 {status} {HTTP_REASONS[status]}\r\nContent-Type: application/json\r\n'
+                     f'Content-Length: {len(data)}\r\nConnection: {"keep-alive" if keep_alive else "close"}\r\n\r\n')
+        writer.write(head.encode('latin-1') + data)
+        await writer.drain()
+
+
+async def serve(service: SolveService, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                unix_path: str = None) -> asyncio.AbstractServer:
+    """
+    Returns: The started server, on a Unix socket when unix_path is given, else on host:port.
+    """
+    service.start()
+    if unix_path:
+        return await asyncio.start_unix_server(service.handle_connection, unix_path)
+    return await asyncio.start_server(service.handle_connection, host, port)
+
+
+async def run(args: argparse.Namespace):
+    service: SolveService = SolveService(workers=args.workers, max_batch=args.max_batch,
+                                         batch_window_sec=args.batch_window_ms / 1000, max_pending=args.max_pending,
+                                         deadline_sec=args.deadline_ms / 1000, cache_size=args.cache_size,
+                                         table_dir=args.table_dir, max_length=args.max_length, timeout=args.timeout)
+    server: asyncio.AbstractServer = await serve(service, args.host, args.port, args.unix)
+    print(f'solving on {args.unix or f"http://{args.host}:{args.port}"}', file=sys.stderr)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local solve service: POST /solve takes a JSON object with a '
+                                                 '"facelets" or "moves" field and answers with its solution; '
+                                                 'GET /stats reports counters.')
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--unix', default=None, help='Listen on this Unix socket instead of TCP')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Solver processes, default one per CPU; 0 solves on a thread of the server process')
+    parser.add_argument('--max-batch', type=int, default=DEFAULT_MAX_BATCH)
+    parser.add_argument('--batch-window-ms', type=float, default=DEFAULT_BATCH_WINDOW_SEC * 1000,
+                        help='How long an idle service waits for more requests to batch with the first')
+    parser.add_argument('--max-pending', type=int, default=DEFAULT_MAX_PENDING,
+                        help='Requests waiting beyond this are rejected with 503')
+    parser.add_argument('--deadline-ms', type=float, default=DEFAULT_DEADLINE_SEC * 1000,
+                        help='Default per-request deadline; a request can set its own "deadline_ms"')
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_SIZE)
+    parser.add_argument('--max-length', type=int, default=21)
+    parser.add_argument('--timeout', type=float, default=0.05)
+    parser.add_argument('--table-dir', default=None)
+    args = parser.parse_args()
+    try:
+        asyncio.run(run(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
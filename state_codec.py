@@ -0,0 +1,151 @@
+from math import factorial
+from typing import Tuple
+
+import numpy as np
+
+from coordinates import unrank_orientation, unrank_permutation
+from cube_state import FACELET_COUNT, CubeState, StateLike, to_facelets
+from cubie_cube import CORNER_COLORS, CORNER_FACELETS, EDGE_COLORS, EDGE_FACELETS, cubies_to_facelets, \
+    permutation_parity
+
+# A state id is corner_code * EDGE_CODE_COUNT + edge_code, 66 bits in all:
+#   corner_code = corner permutation rank * 3^7 + corner twist rank                     < 8! * 3^7, 27 bits
+#   edge_code   = edge permutation rank / 2 * 2^11 + edge flip rank                      < 12! / 2 * 2^11, 39 bits
+# The last twist and flip follow from the zero-sum rules and the dropped bit of the edge permutation rank from the
+# corner permutation parity, so every reachable state has exactly one id and the solved state is 0.
+CORNER_CODE_COUNT: int = factorial(8) * 3 ** 7
+EDGE_CODE_COUNT: int = factorial(12) // 2 * 2 ** 11
+STATE_ID_COUNT: int = CORNER_CODE_COUNT * EDGE_CODE_COUNT
+
+# Pieces are identified by the OR of 1 << color over their stickers, which is unique per piece and costs a few uint8
+# ops instead of a table lookup. Positions are ranked in the order of these labels, so the solved state ranks 0.
+CORNER_LABELS: np.ndarray = np.bitwise_or.reduce(np.left_shift(1, CORNER_COLORS), axis=1).astype(np.uint8)
+EDGE_LABELS: np.ndarray = np.bitwise_or.reduce(np.left_shift(1, EDGE_COLORS), axis=1).astype(np.uint8)
+CORNER_ORDER: np.ndarray = np.argsort(CORNER_LABELS)
+EDGE_ORDER: np.ndarray = np.argsort(EDGE_LABELS)
+
+# Color bits of U/D, R/L and F/B stickers
+UD_BITS: np.uint8 = np.uint8(0b001001)
+RL_BITS: np.uint8 = np.uint8(0b010010)
+
+# Facelets read by the encoder, as rows of the transposed chunk: corner stickers 0, 1, 2, then edge stickers 0, 1
+ENCODE_FACELETS: np.ndarray = np.concatenate([CORNER_FACELETS[CORNER_ORDER].T.ravel(),
+                                              EDGE_FACELETS[EDGE_ORDER].T.ravel()])
+# Rows are encoded in chunks sized for the rank loops, transposed in smaller blocks that stay in cache
+ENCODE_CHUNK_ROWS: int = 1 << 15
+TRANSPOSE_BLOCK_ROWS: int = 1 << 12
+
+
+def rank_labels(labels: np.ndarray, skip_last: int) -> np.ndarray:
+    """
+    Returns: Lehmer rank of each column of a (n, N) label array, leaving out the last `skip_last` digits.
+    """
+    n: int = labels.shape[0]
+    ranks: np.ndarray = np.zeros(labels.shape[1], dtype=np.uint32)
+    smaller: np.ndarray = np.empty(labels.shape, dtype=bool)
+    digit: np.ndarray = np.empty(labels.shape[1], dtype=np.uint8)
+    for i in range(n - 1 - skip_last):
+        np.less(labels[i + 1:], labels[i], out=smaller[i + 1:])
+        np.sum(smaller[i + 1:].view(np.uint8), axis=0, dtype=np.uint8, out=digit)
+        ranks *= n - i
+        ranks += digit
+    return ranks
+
+
+def encode_chunk(facelets: np.ndarray, corner_codes: np.ndarray, edge_codes: np.ndarray):
+    rows: int = facelets.shape[0]
+    # Transposing facelet pairs as uint16 halves the element count of the slowest step
+    pairs: np.ndarray = np.empty((FACELET_COUNT // 2, rows), dtype=np.uint16)
+    for start in range(0, rows, TRANSPOSE_BLOCK_ROWS):
+        block = slice(start, start + TRANSPOSE_BLOCK_ROWS)
+        np.copyto(pairs[:, block], facelets[block].view(np.uint16).T)
+    color_bits: np.ndarray = pairs.view(np.uint8)
+    np.left_shift(np.uint8(1), color_bits, out=color_bits)
+    stickers: np.ndarray = color_bits.reshape(FACELET_COUNT // 2, rows, 2)[ENCODE_FACELETS // 2, :, ENCODE_FACELETS % 2]
+
+    c0, c1, c2 = stickers[0:8], stickers[8:16], stickers[16:24]
+    corners: np.ndarray = c0 | c1
+    corners |= c2
+    # Twist is the sticker index of the U/D color
+    twists: np.ndarray = ((c1 & UD_BITS) != 0).view(np.uint8)
+    twists += ((c2 & UD_BITS) != 0).view(np.uint8) << np.uint8(1)
+    e0, e1 = stickers[24:36], stickers[36:48]
+    edges: np.ndarray = e0 | e1
+    # Flipped when an R/L color sits in the first sticker or a U/D color in the second
+    flips: np.ndarray = ((e0 & RL_BITS) | (e1 & UD_BITS)) != 0
+
+    twist_rank: np.ndarray = np.zeros(rows, dtype=np.uint32)
+    for i in range(7):
+        twist_rank *= 3
+        twist_rank += twists[i]
+    corner_codes[:] = rank_labels(corners, 0)
+    corner_codes *= 3 ** 7
+    corner_codes += twist_rank
+
+    flip_rank: np.ndarray = np.zeros(rows, dtype=np.uint16)
+    for i in range(11):
+        flip_rank <<= 1
+        flip_rank |= flips[i]
+    edge_codes[:] = rank_labels(edges, 1)
+    edge_codes <<= 11
+    edge_codes |= flip_rank
+
+
+def encode_facelets(facelets: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Encodes a (N, 54) batch of valid states, see cubie_cube.verify_cubies; invalid states get meaningless codes.
+
+    Returns: (uint32 corner codes, uint64 edge codes), one pair per state.
+    """
+    facelets = np.ascontiguousarray(facelets, dtype=np.uint8)
+    if facelets.ndim != 2 or facelets.shape[1] != FACELET_COUNT:
+        raise ValueError(f'Expected a (N, {FACELET_COUNT}) state matrix, got shape {facelets.shape}')
+    corner_codes: np.ndarray = np.empty(len(facelets), dtype=np.uint32)
+    edge_codes: np.ndarray = np.empty(len(facelets), dtype=np.uint64)
+    for start in range(0, len(facelets), ENCODE_CHUNK_ROWS):
+        rows = slice(start, start + ENCODE_CHUNK_ROWS)
+        encode_chunk(facelets[rows], corner_codes[rows], edge_codes[rows])
+    return corner_codes, edge_codes
+
+
+def decode_cubies(corner_codes: np.ndarray,
+                  edge_codes: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    corner_codes = np.asarray(corner_codes, dtype=np.int64)
+    edge_codes = np.asarray(edge_codes, dtype=np.uint64)
+    corners: np.ndarray = unrank_permutation(corner_codes // 3 ** 7, 8)
+    twists: np.ndarray = unrank_orientation(corner_codes % 3 ** 7, 3, 7, 8)
+    edges: np.ndarray = unrank_permutation((edge_codes >> np.uint64(11)).astype(np.int64) * 2, 12)
+    flips: np.ndarray = unrank_orientation((edge_codes & np.uint64(2047)).astype(np.int64), 2, 11, 12)
+    # The dropped last Lehmer digit swaps the last two edges; it is set when the parities disagree
+    swap: np.ndarray = permutation_parity(corners) != permutation_parity(edges)
+    edges[swap, -2:] = edges[swap, -1:-3:-1]
+
+    # Back from label order to the cubie_cube position and piece order
+    cp: np.ndarray = np.empty_like(corners)
+    co: np.ndarray = np.empty_like(twists)
+    ep: np.ndarray = np.empty_like(edges)
+    eo: np.ndarray = np.empty_like(flips)
+    cp[..., CORNER_ORDER] = CORNER_ORDER[corners]
+    co[..., CORNER_ORDER] = twists
+    ep[..., EDGE_ORDER] = EDGE_ORDER[edges]
+    eo[..., EDGE_ORDER] = flips
+    return cp, co, ep, eo
+
+
+def decode_facelets(corner_codes: np.ndarray, edge_codes: np.ndarray) -> np.ndarray:
+    """
+    Returns: (N, 54) facelets of the states, the exact inverse of encode_facelets.
+    """
+    return cubies_to_facelets(*decode_cubies(corner_codes, edge_codes)).astype(np.uint8)
+
+
+def encode_state(state: StateLike) -> int:
+    corner_codes, edge_codes = encode_facelets(to_facelets(state)[None])
+    return int(corner_codes[0]) * EDGE_CODE_COUNT + int(edge_codes[0])
+
+
+def decode_state(state_id: int) -> CubeState:
+    if not 0 <= state_id < STATE_ID_COUNT:
+        raise ValueError(f'State id out of range: {state_id}')
+    corner_code, edge_code = divmod(state_id, EDGE_CODE_COUNT)
+    return CubeState(decode_facelets([corner_code], [edge_code])[0])
@@ -0,0 +1,165 @@
+import os
+import sys
+import weakref
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+DEFAULT_TABLE_DIR: str = os.path.join(os.path.expanduser('~'), '.cache', 'rubiks', 'tables')
+
+# Segment name, shape and dtype of every published table; small and picklable, for pool initializers
+SharedTablesHandle = Dict[str, Tuple[str, Tuple[int, ...], str]]
+
+
+def attach_segment(name: str) -> 'shared_memory.SharedMemory':
+    """
+    Opens a segment another process owns. Before Python 3.13 attaching also registered the segment with the resource
+    tracker as if this process had created it, and the tracker unlinked it when the first worker exited.
+    """
+    from multiprocessing import resource_tracker, shared_memory
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name, track=False)
+    register = resource_tracker.register
+    resource_tracker.register = lambda *args: None
+    try:
+        return shared_memory.SharedMemory(name)
+    finally:
+        resource_tracker.register = register
+
+
+def close_segments(segments: Iterable['shared_memory.SharedMemory'], unlink: bool):
+    for segment in segments:
+        try:
+            segment.close()
+        except BufferError:
+            # A view is still in use somewhere; the mapping goes with it, and an unlinked segment is freed then
+            pass
+        if unlink:
+            segment.unlink()
+
+
+class SharedTables:
+    """
+    Tables in POSIX shared memory, published once by the process that loaded them and attached by name in every
+    worker as read-only NumPy views, so no worker reads, copies or maps a table file. The publisher counts
+    references: the segments are unlinked on the last release, or when the publisher exits.
+    """
+
+    def __init__(self, segments: Dict[str, 'shared_memory.SharedMemory'], handle: SharedTablesHandle, owner: bool):
+        self.__segments: Dict[str, 'shared_memory.SharedMemory'] = segments
+        self.__handle: SharedTablesHandle = handle
+        self.__tables: Dict[str, np.ndarray] = {}
+        for name, (_, shape, dtype) in handle.items():
+            table: np.ndarray = np.ndarray(shape, dtype=np.dtype(dtype), buffer=segments[name].buf)
+            table.flags.writeable = False
+            self.__tables[name] = table
+        self.references: int = 1
+        self.__finalizer = weakref.finalize(self, close_segments, list(segments.values()), owner)
+
+    @classmethod
+    def publish(cls, tables: Dict[str, np.ndarray]) -> 'SharedTables':
+        # Imported on first use: it pulls in enough of the standard library to slow down every solver import
+        from multiprocessing import shared_memory
+        segments: Dict[str, 'shared_memory.SharedMemory'] = {}
+        handle: SharedTablesHandle = {}
+        try:
+            for name, table in tables.items():
+                segment = shared_memory.SharedMemory(create=True, size=max(table.nbytes, 1))
+                segments[name] = segment
+                np.ndarray(table.shape, dtype=table.dtype, buffer=segment.buf)[...] = table
+                handle[name] = (segment.name, table.shape, table.dtype.str)
+        except BaseException:
+            close_segments(segments.values(), unlink=True)
+            raise
+        return cls(segments, handle, owner=True)
+
+    @classmethod
+    def attach(cls, handle: SharedTablesHandle) -> 'SharedTables':
+        return cls({name: attach_segment(segment) for name, (segment, _, _) in handle.items()}, handle, owner=False)
+
+    @property
+    def handle(self) -> SharedTablesHandle:
+        return self.__handle
+
+    @property
+    def nbytes(self) -> int:
+        return sum(table.nbytes for table in self.__tables.values())
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.__tables
+
+    def get(self, name: str) -> np.ndarray:
+        return self.__tables[name]
+
+    def acquire(self) -> 'SharedTables':
+        if not self.references:
+            raise ValueError('Shared tables already released')
+        self.references += 1
+        return self
+
+    def release(self):
+        """
+        Drops one reference; the last one closes the segments, and unlinks them in the publisher.
+        """
+        self.references -= 1
+        if self.references == 0:
+            self.__tables.clear()
+            self.__finalizer()
+
+    def __enter__(self) -> 'SharedTables':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+class TableStore:
+    """
+    Lookup tables generated once, saved as .npy files and memory-mapped read-only on every later load. A store can
+    also be backed by SharedTables, which it serves before touching the directory.
+    """
+
+    def __init__(self, directory: str = None, shared: SharedTables = None):
+        self.__directory: str = directory or os.environ.get('RUBIKS_TABLE_DIR', DEFAULT_TABLE_DIR)
+        self.__tables: Dict[str, np.ndarray] = {}
+        self.__shared: Optional[SharedTables] = shared
+        self.__published: Optional[SharedTables] = None
+
+    @property
+    def directory(self) -> str:
+        return self.__directory
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.__directory, f'{name}.npy')
+
+    def exists(self, name: str) -> bool:
+        return name in self.__tables or (self.__shared is not None and name in self.__shared) \
+            or os.path.exists(self.path(name))
+
+    def get(self, name: str, builder: Callable[[], np.ndarray]) -> np.ndarray:
+        if self.__shared is not None and name in self.__shared:
+            return self.__shared.get(name)
+        if name not in self.__tables:
+            if not os.path.exists(self.path(name)):
+                self.save(name, builder())
+            self.__tables[name] = np.load(self.path(name), mmap_mode='r')
+        return self.__tables[name]
+
+    def save(self, name: str, table: np.ndarray):
+        os.makedirs(self.__directory, exist_ok=True)
+        # Write next to the target and rename, so concurrent readers never see a partial table
+        tmp_path: str = f'{self.path(name)}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.save(f, np.ascontiguousarray(table))
+        os.replace(tmp_path, self.path(name))
+        self.__tables.pop(name, None)
+
+    def share(self) -> SharedTables:
+        """
+        Publishes every table loaded so far to shared memory, or takes another reference to the tables this store
+        already published. The caller releases it once the workers that attached are gone.
+        """
+        if self.__published is not None and self.__published.references:
+            return self.__published.acquire()
+        self.__published = SharedTables.publish(self.__tables)
+        return self.__published
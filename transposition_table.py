@@ -0,0 +1,199 @@
+from typing import Optional, Tuple
+
+import numpy as np
+
+from enums import ReplacementPolicies
+
+# Corner code, edge code, value, depth and generation of one slot
+ENTRY_BYTES: int = 4 + 8 + 4 + 1 + 1
+DEFAULT_MEMORY_BYTES: int = 64 << 20
+DEFAULT_WAYS: int = 4
+
+# Multiplicative hashing of the two code halves; the top bits of the product pick the bucket
+EDGE_HASH_FACTOR: int = 0x9E3779B97F4A7C15
+CORNER_HASH_FACTOR: int = 0xC2B2AE3D27D4EB4F
+MASK_64: int = (1 << 64) - 1
+
+EMPTY_GENERATION: int = 0
+MAX_GENERATION: int = 255
+# Slots of the current generation rank above any depth when choosing what to evict
+CURRENT_WORTH: int = 256
+
+
+class TranspositionTable:
+    """
+    Open-addressing hash table from state codes (see state_codec) to a search value and the depth it was searched
+    to, held in preallocated arrays sized by a memory budget. A key hashes to a bucket of `ways` adjacent slots, so a
+    probe touches one cache line or two and never chains.
+
+    When a key is not in its full bucket, the least valuable slot is the candidate for eviction: empty, then from an
+    earlier search (see new_search), then shallowest. ALWAYS evicts it; DEPTH keeps it if it is from this search and
+    deeper than the new entry, and likewise never overwrites an entry of the same key with a shallower one.
+    """
+
+    def __init__(self, memory_bytes: int = DEFAULT_MEMORY_BYTES, ways: int = DEFAULT_WAYS,
+                 policy: ReplacementPolicies = ReplacementPolicies.DEPTH):
+        bucket_count: int = memory_bytes // (ENTRY_BYTES * ways)
+        if bucket_count < 2:
+            raise ValueError(f'{memory_bytes} bytes is too small for a table of {ways}-slot buckets')
+        self.__bucket_bits: int = bucket_count.bit_length() - 1
+        self.__ways: int = ways
+        self.policy: ReplacementPolicies = ReplacementPolicies(policy)
+
+        capacity: int = (1 << self.__bucket_bits) * ways
+        self.__corners: np.ndarray = np.zeros(capacity, dtype=np.uint32)
+        self.__edges: np.ndarray = np.zeros(capacity, dtype=np.uint64)
+        self.__values: np.ndarray = np.zeros(capacity, dtype=np.int32)
+        self.__depths: np.ndarray = np.zeros(capacity, dtype=np.uint8)
+        self.__generations: np.ndarray = np.zeros(capacity, dtype=np.uint8)
+        self.__generation: int = 1
+        self.__count: int = 0
+
+    @property
+    def capacity(self) -> int:
+        return len(self.__corners)
+
+    @property
+    def ways(self) -> int:
+        return self.__ways
+
+    @property
+    def memory_bytes(self) -> int:
+        return self.capacity * ENTRY_BYTES
+
+    def __len__(self) -> int:
+        return self.__count
+
+    def new_search(self):
+        """
+        Starts a new generation: entries stay readable, but become the first to be evicted.
+        """
+        # After wrapping, entries 255 generations old count as current again, which only affects eviction order
+        self.__generation = self.__generation % MAX_GENERATION + 1
+
+    def clear(self):
+        self.__generations[:] = EMPTY_GENERATION
+        self.__count = 0
+
+    def __first_slot(self, corner: int, edge: int) -> int:
+        hashed: int = (int(edge) * EDGE_HASH_FACTOR ^ int(corner) * CORNER_HASH_FACTOR) & MASK_64
+        return (hashed >> (64 - self.__bucket_bits)) * self.__ways
+
+    def __first_slots(self, corners: np.ndarray, edges: np.ndarray) -> np.ndarray:
+        hashed: np.ndarray = edges * np.uint64(EDGE_HASH_FACTOR)
+        hashed ^= corners.astype(np.uint64) * np.uint64(CORNER_HASH_FACTOR)
+        hashed >>= np.uint64(64 - self.__bucket_bits)
+        return hashed.astype(np.intp) * self.__ways
+
+    def probe(self, corner: int, edge: int) -> Optional[Tuple[int, int]]:
+        """
+        Returns: (value, depth) stored for the key, or None.
+        """
+        first: int = self.__first_slot(corner, edge)
+        for slot in range(first, first + self.__ways):
+            if self.__edges[slot] == edge and self.__corners[slot] == corner and self.__generations[slot]:
+                return int(self.__values[slot]), int(self.__depths[slot])
+        return None
+
+    def store(self, corner: int, edge: int, value: int, depth: int) -> bool:
+        """
+        Returns: Whether the entry was written, which the DEPTH policy may decline.
+        """
+        first: int = self.__first_slot(corner, edge)
+        target: int = -1
+        target_worth: int = CURRENT_WORTH * 2
+        for slot in range(first, first + self.__ways):
+            generation: int = int(self.__generations[slot])
+            if generation and self.__edges[slot] == edge and self.__corners[slot] == corner:
+                target, target_worth = slot, self.__worth(generation, int(self.__depths[slot]))
+                break
+            worth: int = self.__worth(generation, int(self.__depths[slot]))
+            if worth < target_worth:
+                target, target_worth = slot, worth
+        if self.policy == ReplacementPolicies.DEPTH and target_worth > CURRENT_WORTH + depth:
+            return False
+
+        if not self.__generations[target]:
+            self.__count += 1
+        self.__corners[target] = corner
+        self.__edges[target] = edge
+        self.__values[target] = value
+        self.__depths[target] = depth
+        self.__generations[target] = self.__generation
+        return True
+
+    def __worth(self, generation: int, depth: int) -> int:
+        if generation == EMPTY_GENERATION:
+            return -1
+        return depth + CURRENT_WORTH if generation == self.__generation else depth
+
+    def __get_bucket(self, corners: np.ndarray, edges: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns: (N, ways) slot indices of each key's bucket and a mask of the slot holding the key, if any.
+        """
+        slots: np.ndarray = self.__first_slots(corners, edges)[:, None] + np.arange(self.__ways)
+        matches: np.ndarray = ((self.__edges[slots] == edges[:, None]) & (self.__corners[slots] == corners[:, None])
+                               & (self.__generations[slots] != EMPTY_GENERATION))
+        return slots, matches
+
+    def probe_many(self, corners: np.ndarray, edges: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Returns: (found mask, values, depths) for a batch of keys; values and depths are 0 where not found.
+        """
+        corners = np.asarray(corners, dtype=np.uint32)
+        edges = np.asarray(edges, dtype=np.uint64)
+        slots, matches = self.__get_bucket(corners, edges)
+        found: np.ndarray = matches.any(axis=1)
+        hit_slots: np.ndarray = slots[np.arange(len(slots)), matches.argmax(axis=1)]
+        return (found, np.where(found, self.__values[hit_slots], 0).astype(np.int32),
+                np.where(found, self.__depths[hit_slots], 0).astype(np.uint8))
+
+    def store_many(self, corners: np.ndarray, edges: np.ndarray, values: np.ndarray, depths: np.ndarray) -> int:
+        """
+        Stores a batch under the same policy as store(). Of several rows with the same key the last one wins, and rows
+        that lose a slot to another key of the batch try again against the updated bucket.
+
+        Returns: Number of rows written.
+        """
+        corners = np.asarray(corners, dtype=np.uint32)
+        edges = np.asarray(edges, dtype=np.uint64)
+        values = np.asarray(values, dtype=np.int32)
+        depths = np.asarray(depths, dtype=np.uint8)
+        pending: np.ndarray = np.arange(len(corners))
+        written: int = 0
+        for _ in range(self.__ways + 1):
+            if not pending.size:
+                break
+            slots, matches = self.__get_bucket(corners[pending], edges[pending])
+            generations: np.ndarray = self.__generations[slots]
+            worth: np.ndarray = np.where(generations == self.__generation, CURRENT_WORTH, 0) + self.__depths[slots]
+            worth[generations == EMPTY_GENERATION] = -1
+            matched: np.ndarray = matches.any(axis=1)
+            columns: np.ndarray = np.where(matched, matches.argmax(axis=1), worth.argmin(axis=1))
+            rows: np.ndarray = np.arange(len(pending))
+            targets: np.ndarray = slots[rows, columns]
+            if self.policy == ReplacementPolicies.DEPTH:
+                accepted: np.ndarray = worth[rows, columns] <= CURRENT_WORTH + depths[pending].astype(np.int64)
+                pending, targets = pending[accepted], targets[accepted]
+
+            # The last row per target slot wins, like the later of two store() calls
+            _, last = np.unique(targets[::-1], return_index=True)
+            winners: np.ndarray = len(targets) - 1 - last
+            won: np.ndarray = np.zeros(len(targets), dtype=bool)
+            won[winners] = True
+            rows, slots_won = pending[won], targets[won]
+            self.__count += int(np.count_nonzero(self.__generations[slots_won] == EMPTY_GENERATION))
+            self.__corners[slots_won] = corners[rows]
+            self.__edges[slots_won] = edges[rows]
+            self.__values[slots_won] = values[rows]
+            self.__depths[slots_won] = depths[rows]
+            self.__generations[slots_won] = self.__generation
+            written += len(rows)
+
+            # Losers with the key of the winner are superseded by it; the others look for another slot
+            lost: np.ndarray = ~won
+            pending = pending[lost]
+            winner_of: np.ndarray = targets[lost]
+            pending = pending[(self.__corners[winner_of] != corners[pending])
+                              | (self.__edges[winner_of] != edges[pending])]
+        return written
@@ -0,0 +1,286 @@
+import time
+from typing import Callable, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from coordinates import (rank_combination, rank_orientation, rank_permutation, unrank_combination,
+                         unrank_orientation, unrank_permutation)
+from cube_state import (CANONICAL_SUCCESSORS, MOVE_COUNT, MOVE_NAMES, NO_PREVIOUS_MOVE, StateLike, format_moves,
+                        is_canonical_successor, to_facelets)
+from cubie_cube import MOVE_CO, MOVE_CP, MOVE_EO, MOVE_EP, facelets_to_cubies, verify_cubies
+from move_compiler import DEFAULT_REWRITES, compile_moves
+from table_store import TableStore
+
+TABLE_VERSION: int = 1
+
+N_TWIST: int = 3 ** 7
+N_FLIP: int = 2 ** 11
+N_SLICE: int = 495
+N_CORNER_PERM: int = 40320
+N_UD_EDGE_PERM: int = 40320
+N_SLICE_PERM: int = 24
+
+# Colex rank of the four slice edges FR, FL, BL, BR sitting in their home positions 8..11
+SOLVED_SLICE: int = 494
+NO_MOVE: int = 0xFFFF
+MAX_SOLUTION_LENGTH: int = 30
+MAX_PHASE2_DEPTH: int = 12
+
+PHASE2_MOVES: List[int] = [m for m, name in enumerate(MOVE_NAMES) if name[0] in 'UD' or name.endswith('2')]
+PHASE1_ONLY_MOVES: frozenset = frozenset(range(MOVE_COUNT)) - frozenset(PHASE2_MOVES)
+
+
+def build_twist_move_table() -> np.ndarray:
+    co: np.ndarray = unrank_orientation(np.arange(N_TWIST), 3, 7, 8)
+    return np.stack([rank_orientation((co[:, MOVE_CP[m]] + MOVE_CO[m]) % 3, 3, 7)
+                     for m in range(MOVE_COUNT)], axis=1).astype(np.uint16)
+
+
+def build_flip_move_table() -> np.ndarray:
+    eo: np.ndarray = unrank_orientation(np.arange(N_FLIP), 2, 11, 12)
+    return np.stack([rank_orientation((eo[:, MOVE_EP[m]] + MOVE_EO[m]) % 2, 2, 11)
+                     for m in range(MOVE_COUNT)], axis=1).astype(np.uint16)
+
+
+def build_slice_move_table() -> np.ndarray:
+    occupied: np.ndarray = unrank_combination(np.arange(N_SLICE), 12, 4)
+    return np.stack([rank_combination(occupied[:, MOVE_EP[m]])
+                     for m in range(MOVE_COUNT)], axis=1).astype(np.uint16)
+
+
+def build_corner_perm_move_table() -> np.ndarray:
+    cp: np.ndarray = unrank_permutation(np.arange(N_CORNER_PERM), 8)
+    return np.stack([rank_permutation(cp[:, MOVE_CP[m]])
+                     for m in range(MOVE_COUNT)], axis=1).astype(np.uint16)
+
+
+def build_ud_edge_perm_move_table() -> np.ndarray:
+    ud_edges: np.ndarray = unrank_permutation(np.arange(N_UD_EDGE_PERM), 8)
+    ep: np.ndarray = np.hstack([ud_edges, np.broadcast_to(np.arange(8, 12, dtype=np.uint8), (N_UD_EDGE_PERM, 4))])
+    table: np.ndarray = np.full((N_UD_EDGE_PERM, MOVE_COUNT), NO_MOVE, dtype=np.uint16)
+    for m in PHASE2_MOVES:
+        table[:, m] = rank_permutation(ep[:, MOVE_EP[m]][:, :8])
+    return table
+
+
+def build_slice_perm_move_table() -> np.ndarray:
+    slice_edges: np.ndarray = unrank_permutation(np.arange(N_SLICE_PERM), 4) + 8
+    ep: np.ndarray = np.hstack([np.broadcast_to(np.arange(8, dtype=np.uint8), (N_SLICE_PERM, 8)), slice_edges])
+    table: np.ndarray = np.full((N_SLICE_PERM, MOVE_COUNT), NO_MOVE, dtype=np.uint16)
+    for m in PHASE2_MOVES:
+        table[:, m] = rank_permutation(ep[:, MOVE_EP[m]][:, 8:] - 8)
+    return table
+
+
+def build_pruning_table(move_a: np.ndarray, move_b: np.ndarray, moves: Sequence[int], goal: int) -> np.ndarray:
+    """
+    Breadth-first search over the product coordinate a * len(move_b) + b, expanding a whole depth level at a time.
+
+    Returns: int8 distance to goal for every product coordinate.
+    """
+    n_b: int = move_b.shape[0]
+    depths: np.ndarray = np.full(move_a.shape[0] * n_b, -1, dtype=np.int8)
+    depths[goal] = 0
+    frontier: np.ndarray = np.array([goal], dtype=np.int64)
+    depth: int = 0
+    while frontier.size:
+        a, b = np.divmod(frontier, n_b)
+        for m in moves:
+            neighbours: np.ndarray = move_a[a, m].astype(np.int64) * n_b + move_b[b, m]
+            neighbours = neighbours[depths[neighbours] < 0]
+            depths[neighbours] = depth + 1
+        depth += 1
+        frontier = np.flatnonzero(depths == depth)
+    return depths
+
+
+# Phase 2 counterpart of CANONICAL_SUCCESSORS
+PHASE2_SUCCESSORS: List[List[int]] = [[m for m in PHASE2_MOVES if is_canonical_successor(p, m)]
+                                      for p in range(MOVE_COUNT)] + [list(PHASE2_MOVES)]
+MOVE_EP_LISTS: List[List[int]] = MOVE_EP.tolist()
+
+
+class TwoPhaseSolver:
+    """
+    Kociemba's two-phase algorithm: phase 1 reaches the <U, D, F2, B2, L2, R2> subgroup, phase 2 solves within it.
+    """
+
+    def __init__(self, store: TableStore = None):
+        self.__store: TableStore = store or TableStore()
+        self.__load_tables()
+
+    def __table(self, name: str, builder: Callable[[], np.ndarray]) -> np.ndarray:
+        return self.__store.get(f'two_phase_v{TABLE_VERSION}_{name}', builder)
+
+    def __load_tables(self):
+        twist_move: np.ndarray = self.__table('twist_move', build_twist_move_table)
+        flip_move: np.ndarray = self.__table('flip_move', build_flip_move_table)
+        slice_move: np.ndarray = self.__table('slice_move', build_slice_move_table)
+        corner_move: np.ndarray = self.__table('corner_perm_move', build_corner_perm_move_table)
+        ud_edge_move: np.ndarray = self.__table('ud_edge_perm_move', build_ud_edge_perm_move_table)
+        slice_perm_move: np.ndarray = self.__table('slice_perm_move', build_slice_perm_move_table)
+        twist_slice_prune: np.ndarray = self.__table(
+            'twist_slice_prune',
+            lambda: build_pruning_table(twist_move, slice_move, range(MOVE_COUNT), SOLVED_SLICE))
+        flip_slice_prune: np.ndarray = self.__table(
+            'flip_slice_prune',
+            lambda: build_pruning_table(flip_move, slice_move, range(MOVE_COUNT), SOLVED_SLICE))
+        corner_slice_prune: np.ndarray = self.__table(
+            'corner_slice_perm_prune',
+            lambda: build_pruning_table(corner_move, slice_perm_move, PHASE2_MOVES, 0))
+        edge_slice_prune: np.ndarray = self.__table(
+            'ud_edge_slice_perm_prune',
+            lambda: build_pruning_table(ud_edge_move, slice_perm_move, PHASE2_MOVES, 0))
+
+        # The search reads single entries, which is several times faster through flat memoryviews than numpy scalars
+        self.__twist_move = memoryview(twist_move.reshape(-1))
+        self.__flip_move = memoryview(flip_move.reshape(-1))
+        self.__slice_move = memoryview(slice_move.reshape(-1))
+        self.__corner_move = memoryview(corner_move.reshape(-1))
+        self.__ud_edge_move = memoryview(ud_edge_move.reshape(-1))
+        self.__slice_perm_move = memoryview(slice_perm_move.reshape(-1))
+        self.__twist_slice_prune = memoryview(twist_slice_prune.reshape(-1))
+        self.__flip_slice_prune = memoryview(flip_slice_prune.reshape(-1))
+        self.__corner_slice_prune = memoryview(corner_slice_prune.reshape(-1))
+        self.__edge_slice_prune = memoryview(edge_slice_prune.reshape(-1))
+
+    def solve(self, state: StateLike, max_length: int = 21, timeout: float = 0.05) -> str:
+        """
+        Returns: Move string that solves the state. The search stops at the first solution of at most max_length
+        moves, or returns the shortest solution found once timeout seconds have passed. When no solution is that
+        short, the first one found of any length.
+        """
+        return format_moves(self.solve_moves(state, max_length, timeout))
+
+    def solve_moves(self, state: StateLike, max_length: int = 21, timeout: float = 0.05) -> List[int]:
+        cp, co, ep, eo = facelets_to_cubies(to_facelets(state))
+        if not verify_cubies(cp, co, ep, eo):
+            raise ValueError('Cube state is not solvable')
+
+        self.__ep: List[int] = ep.tolist()
+        self.__deadline: float = time.perf_counter() + timeout
+        self.__target_length: int = max_length
+        self.__best: Optional[List[int]] = None
+        self.__nodes: int = 0
+
+        twist: int = int(rank_orientation(co, 3, 7))
+        flip: int = int(rank_orientation(eo, 2, 11))
+        slice_: int = int(rank_combination(ep >= 8))
+        corner: int = int(rank_permutation(cp))
+
+        path: List[int] = []
+        depth: int = self.__phase1_bound(twist, flip, slice_)
+        while depth < self.__length_limit() and not self.__is_done():
+            self.__phase1(twist, flip, slice_, corner, depth, NO_PREVIOUS_MOVE, path)
+            depth += 1
+        if self.__best is None:
+            # Nothing within max_length, which may be below what phase 1 alone needs: search again for the first
+            # solution of any length, as once the deadline has passed
+            self.__target_length = MAX_SOLUTION_LENGTH
+            depth = self.__phase1_bound(twist, flip, slice_)
+            while depth < self.__length_limit() and not self.__is_done():
+                self.__phase1(twist, flip, slice_, corner, depth, NO_PREVIOUS_MOVE, path)
+                depth += 1
+        if self.__best is None:
+            raise ValueError(f'No solution within {MAX_SOLUTION_LENGTH} moves')
+        # Solutions are canonical already; the rewrite table can still shorten one
+        return compile_moves(self.__best, DEFAULT_REWRITES)
+
+    def __length_limit(self) -> int:
+        """
+        Returns: Longest solution still worth finding. Until the deadline only solutions within the target count,
+        afterwards anything shorter than the best so far, so a hard state still gets an answer.
+        """
+        if self.__best is not None:
+            return min(len(self.__best) - 1, self.__target_length)
+        if time.perf_counter() <= self.__deadline:
+            return self.__target_length
+        return MAX_SOLUTION_LENGTH
+
+    def __is_done(self) -> bool:
+        return self.__best is not None and (len(self.__best) <= self.__target_length
+                                            or time.perf_counter() > self.__deadline)
+
+    def __phase1_bound(self, twist: int, flip: int, slice_: int) -> int:
+        return max(self.__twist_slice_prune[twist * N_SLICE + slice_],
+                   self.__flip_slice_prune[flip * N_SLICE + slice_])
+
+    def __phase1(self, twist: int, flip: int, slice_: int, corner: int, togo: int, previous: int,
+                 path: List[int]) -> bool:
+        if togo == 0:
+            if twist == 0 and flip == 0 and slice_ == SOLVED_SLICE and (not path or previous in PHASE1_ONLY_MOVES):
+                self.__start_phase2(corner, previous, path)
+            return self.__is_done()
+
+        self.__nodes += 1
+        if self.__nodes & 0x3FF == 0 and self.__is_done():
+            return True
+        twist_move, flip_move, slice_move = self.__twist_move, self.__flip_move, self.__slice_move
+        twist_slice_prune, flip_slice_prune = self.__twist_slice_prune, self.__flip_slice_prune
+        for m in CANONICAL_SUCCESSORS[previous]:
+            new_slice: int = slice_move[slice_ * MOVE_COUNT + m]
+            new_twist: int = twist_move[twist * MOVE_COUNT + m]
+            if twist_slice_prune[new_twist * N_SLICE + new_slice] >= togo:
+                continue
+            new_flip: int = flip_move[flip * MOVE_COUNT + m]
+            if flip_slice_prune[new_flip * N_SLICE + new_slice] >= togo:
+                continue
+            path.append(m)
+            done: bool = self.__phase1(new_twist, new_flip, new_slice, self.__corner_move[corner * MOVE_COUNT + m],
+                                       togo - 1, m, path)
+            path.pop()
+            if done:
+                return True
+        return False
+
+    def __start_phase2(self, corner: int, previous: int, phase1_path: List[int]):
+        ep: List[int] = self.__ep
+        for m in phase1_path:
+            ep = [ep[i] for i in MOVE_EP_LISTS[m]]
+        ud_edge: int = int(rank_permutation(np.array(ep[:8])))
+        slice_perm: int = int(rank_permutation(np.array(ep[8:]) - 8))
+
+        max_depth2: int = min(self.__length_limit() - len(phase1_path), MAX_PHASE2_DEPTH)
+        depth2: int = max(self.__corner_slice_prune[corner * N_SLICE_PERM + slice_perm],
+                          self.__edge_slice_prune[ud_edge * N_SLICE_PERM + slice_perm])
+        path: List[int] = list(phase1_path)
+        while depth2 <= max_depth2:
+            if self.__phase2(corner, ud_edge, slice_perm, depth2, previous, path):
+                self.__best = path
+                return
+            depth2 += 1
+
+    def __phase2(self, corner: int, ud_edge: int, slice_perm: int, togo: int, previous: int,
+                 path: List[int]) -> bool:
+        if togo == 0:
+            return corner == 0 and ud_edge == 0 and slice_perm == 0
+        self.__nodes += 1
+        corner_move, ud_edge_move, slice_perm_move = self.__corner_move, self.__ud_edge_move, self.__slice_perm_move
+        corner_slice_prune, edge_slice_prune = self.__corner_slice_prune, self.__edge_slice_prune
+        for m in PHASE2_SUCCESSORS[previous]:
+            new_slice_perm: int = slice_perm_move[slice_perm * MOVE_COUNT + m]
+            new_corner: int = corner_move[corner * MOVE_COUNT + m]
+            if corner_slice_prune[new_corner * N_SLICE_PERM + new_slice_perm] >= togo:
+                continue
+            new_ud_edge: int = ud_edge_move[ud_edge * MOVE_COUNT + m]
+            if edge_slice_prune[new_ud_edge * N_SLICE_PERM + new_slice_perm] >= togo:
+                continue
+            path.append(m)
+            if self.__phase2(new_corner, new_ud_edge, new_slice_perm, togo - 1, m, path):
+                return True
+            path.pop()
+        return False
+
+    @property
+    def nodes(self) -> int:
+        return self.__nodes
+
+
+def solve(state: StateLike, max_length: int = 21, timeout: float = 0.05, store: TableStore = None) -> str:
+    return TwoPhaseSolver(store).solve(state, max_length, timeout)
+
+
+def solve_all(states: Iterable[StateLike], max_length: int = 21, timeout: float = 0.05,
+              store: TableStore = None) -> List[str]:
+    solver: TwoPhaseSolver = TwoPhaseSolver(store)
+    return [solver.solve(state, max_length, timeout) for state in states]
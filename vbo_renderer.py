@@ -0,0 +1,390 @@
+import ctypes
+from typing import List, Optional, Tuple
+
+import numpy as np
+from OpenGL.GL import *
+
+from cube_nxn import get_sticker_positions
+from cube_state import FACE_COLORS, FACE_FRAMES, FACE_ORDER, FACE_SURFACES, FACELET_COUNT, get_facelet_positions
+from enums import GlColors4f, RubiksFaceRotation, Surfaces
+
+# Same geometry as the immediate-mode path: 27 pieces spaced 1.1 edges apart, vertices scaled by 0.98
+PIECE_SPACING: float = 1.1
+VERTEX_SCALE: float = 0.98
+
+PIECE_COUNT: int = 27
+QUAD_COUNT: int = PIECE_COUNT * len(Surfaces)
+VERTEX_DTYPE: np.dtype = np.dtype([('position', np.float32, 3), ('color', np.uint8, 4)])
+
+# NxNxN stickers cover this fraction of their cell, leaving black grooves between them
+STICKER_SCALE: float = 0.9
+
+FACE_COLORS_RGBA: np.ndarray = np.array([[round(c * 255) for c in FACE_COLORS[face].value] for face in FACE_ORDER],
+                                        dtype=np.uint8)
+BODY_COLOR_RGBA: Tuple[int, ...] = tuple(round(c * 255) for c in GlColors4f.BLACK_SOLID.value)
+
+
+def get_cube_bounds(center_pos: Tuple[float, float, float], piece_edge_length: float = 1.0,
+                    n: int = 3) -> Tuple[np.ndarray, float]:
+    """
+    Returns: (center, half edge) of the drawn cube. The 3x3x3 vertices, center included, are scaled by VERTEX_SCALE
+    as in the immediate-mode path; the NxNxN scales its size only.
+    """
+    center: np.ndarray = np.asarray(center_pos, dtype=np.float64) * (VERTEX_SCALE if n == 3 else 1.0)
+    return center, (PIECE_SPACING + 0.5) * piece_edge_length * VERTEX_SCALE
+
+
+def get_piece_grid() -> np.ndarray:
+    """
+    Returns: (27, 3) piece coordinates in {-1, 0, 1}, x right, y up, z front.
+    """
+    return np.array([(x, y, z) for x in (-1, 0, 1) for y in (-1, 0, 1) for z in (-1, 0, 1)], dtype=np.int64)
+
+
+def get_quad_layout() -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns: (piece, surface) of every quad. The 54 sticker quads come first, in facelet order, so the stickers changed
+    by a move form a few contiguous vertex ranges; the black inner surfaces follow.
+    """
+    grid: np.ndarray = get_piece_grid()
+    piece_lookup = {tuple(g): i for i, g in enumerate(grid)}
+    surfaces: List[Surfaces] = list(Surfaces)
+    positions: np.ndarray = get_facelet_positions()
+
+    quads: List[Tuple[int, int]] = []
+    for facelet, position in enumerate(positions):
+        face: str = FACE_ORDER[facelet // 9]
+        normal: np.ndarray = np.array(FACE_FRAMES[face][0])
+        quads.append((piece_lookup[tuple((position - normal) // 2)], surfaces.index(FACE_SURFACES[face])))
+    stickers = set(quads)
+    quads += [(piece, surface) for piece in range(PIECE_COUNT) for surface in range(len(surfaces))
+              if (piece, surface) not in stickers]
+    quad_pieces, quad_surfaces = np.array(quads).T
+    return quad_pieces, quad_surfaces
+
+
+QUAD_PIECES, QUAD_SURFACES = get_quad_layout()
+
+
+# (start, stop) of every run of layers that can turn together, counted from the turning face
+LAYER_RANGES: List[Tuple[int, int]] = [(start, stop) for start in range(3) for stop in range(start + 1, 4)]
+
+
+def get_layer_orders() -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns: One quad order per face and LAYER_RANGES entry, face major, with the quads of the pieces in those layers
+    last, and how many of the quads in each order stay still.
+    """
+    grid: np.ndarray = get_piece_grid()
+    orders: np.ndarray = np.empty((len(FACE_ORDER) * len(LAYER_RANGES), QUAD_COUNT), dtype=np.int64)
+    still_counts: np.ndarray = np.empty(len(orders), dtype=np.int64)
+    for f, face in enumerate(FACE_ORDER):
+        layers: np.ndarray = (1 - grid @ np.array(FACE_FRAMES[face][0]))[QUAD_PIECES]
+        for r, (start, stop) in enumerate(LAYER_RANGES):
+            turning: np.ndarray = (layers >= start) & (layers < stop)
+            orders[f * len(LAYER_RANGES) + r] = np.concatenate([np.flatnonzero(~turning), np.flatnonzero(turning)])
+            still_counts[f * len(LAYER_RANGES) + r] = np.count_nonzero(~turning)
+    return orders, still_counts
+
+
+LAYER_ORDERS, LAYER_STILL_COUNTS = get_layer_orders()
+
+
+def get_changed_runs(changed: np.ndarray) -> List[Tuple[int, int]]:
+    """
+    Returns: (start, stop) of every run of consecutive indices in a sorted index array.
+    """
+    run_starts: np.ndarray = np.flatnonzero(np.diff(changed, prepend=-2) != 1)
+    run_stops: np.ndarray = np.append(run_starts[1:], changed.size)
+    return list(zip(changed[run_starts].tolist(), (changed[run_stops - 1] + 1).tolist()))
+
+
+def get_box_vertices(low: np.ndarray, high: np.ndarray) -> np.ndarray:
+    """
+    Returns: (24, 3) quad vertices of the surfaces of the axis-aligned box between two corners.
+    """
+    corners: np.ndarray = np.array([(x, y, z) for x in (low[0], high[0]) for y in (low[1], high[1])
+                                    for z in (low[2], high[2])], dtype=np.float32)
+    return corners[np.array([surface.value for surface in Surfaces]).reshape(-1)]
+
+
+class VboCubeRenderer:
+    """
+    Retained-mode cube: every quad of every piece lives in one interleaved position + color vertex buffer. Only
+    sticker colors that differ from the last frame are re-uploaded, and a frame is one draw call, or two while a
+    layer is turning.
+    """
+
+    def __init__(self, center_pos: Tuple[float, float, float], piece_edge_length: float = 1.0):
+        self.__center_pos: Tuple[float, float, float] = center_pos
+        self.__vertices: np.ndarray = self.get_vertices(center_pos, piece_edge_length)
+        self.__facelets: Optional[np.ndarray] = None
+
+        self.__vertex_buffer = None
+        self.__index_buffer = None
+        self.uploads: int = 0
+
+    @staticmethod
+    def get_vertices(center_pos: Tuple[float, float, float], piece_edge_length: float) -> np.ndarray:
+        grid: np.ndarray = get_piece_grid()
+        centers: np.ndarray = np.asarray(center_pos) + grid * piece_edge_length * PIECE_SPACING
+        # Corner offsets in the x, y, z nesting order that the Surfaces vertex indices refer to
+        corners: np.ndarray = np.array([(x, y, z) for x in (-1, 1) for y in (-1, 1) for z in (-1, 1)]) / 2
+        surface_corners: np.ndarray = np.array([surface.value for surface in Surfaces])
+
+        vertices: np.ndarray = np.empty(QUAD_COUNT * 4, dtype=VERTEX_DTYPE)
+        vertices['position'] = ((centers[QUAD_PIECES, None, :]
+                                 + corners[surface_corners[QUAD_SURFACES]] * piece_edge_length)
+                                * VERTEX_SCALE).reshape(-1, 3)
+        vertices['color'] = BODY_COLOR_RGBA
+        return vertices
+
+    def __create_buffers(self):
+        self.__vertex_buffer = glGenBuffers(1)
+        glBindBuffer(GL_ARRAY_BUFFER, self.__vertex_buffer)
+        glBufferData(GL_ARRAY_BUFFER, self.__vertices.nbytes, self.__vertices.view(np.uint8), GL_DYNAMIC_DRAW)
+
+        quad_vertices: np.ndarray = LAYER_ORDERS[:, :, None] * 4 + np.arange(4)
+        self.__index_buffer = glGenBuffers(1)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.__index_buffer)
+        indices: np.ndarray = quad_vertices.astype(np.uint16).reshape(-1)
+        glBufferData(GL_ELEMENT_ARRAY_BUFFER, indices.nbytes, indices, GL_STATIC_DRAW)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+        self.uploads += 1
+
+    def set_facelets(self, facelets: np.ndarray):
+        """
+        Recolors the stickers, uploading each contiguous run of changed stickers with one buffer update.
+        """
+        facelets = np.asarray(facelets)
+        if self.__vertex_buffer is None:
+            self.__create_buffers()
+        if self.__facelets is None:
+            changed: np.ndarray = np.arange(FACELET_COUNT)
+        else:
+            changed = np.flatnonzero(facelets != self.__facelets)
+        if changed.size == 0:
+            return
+        self.__facelets = facelets.copy()
+        sticker_colors: np.ndarray = self.__vertices['color'][:FACELET_COUNT * 4].reshape(FACELET_COUNT, 4, 4)
+        sticker_colors[changed] = FACE_COLORS_RGBA[facelets[changed], None, :]
+
+        glBindBuffer(GL_ARRAY_BUFFER, self.__vertex_buffer)
+        for start, stop in get_changed_runs(changed):
+            run: np.ndarray = self.__vertices[start * 4:stop * 4]
+            glBufferSubData(GL_ARRAY_BUFFER, start * 4 * VERTEX_DTYPE.itemsize, run.nbytes, run.view(np.uint8))
+            self.uploads += 1
+
+    def render(self, rotation_face: str = None, elapsed_angle: float = 0.0, layers: Tuple[int, int] = (0, 1)):
+        if self.__vertex_buffer is None:
+            self.__create_buffers()
+        stride: int = VERTEX_DTYPE.itemsize
+        glBindBuffer(GL_ARRAY_BUFFER, self.__vertex_buffer)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glEnableClientState(GL_COLOR_ARRAY)
+        glVertexPointer(3, GL_FLOAT, stride, ctypes.c_void_p(VERTEX_DTYPE.fields['position'][1]))
+        glColorPointer(4, GL_UNSIGNED_BYTE, stride, ctypes.c_void_p(VERTEX_DTYPE.fields['color'][1]))
+
+        if rotation_face is None or not elapsed_angle:
+            glDrawArrays(GL_QUADS, 0, QUAD_COUNT * 4)
+        else:
+            order: int = FACE_ORDER.index(rotation_face) * len(LAYER_RANGES) + LAYER_RANGES.index(tuple(layers))
+            first: int = order * QUAD_COUNT * 4
+            still: int = int(LAYER_STILL_COUNTS[order]) * 4
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.__index_buffer)
+            glDrawElements(GL_QUADS, still, GL_UNSIGNED_SHORT, ctypes.c_void_p(first * 2))
+            glPushMatrix()
+            glTranslatef(*self.__center_pos)
+            glRotatef(elapsed_angle, *RubiksFaceRotation[rotation_face].value)
+            glTranslatef(*[-1 * _ for _ in self.__center_pos])
+            glDrawElements(GL_QUADS, QUAD_COUNT * 4 - still, GL_UNSIGNED_SHORT,
+                           ctypes.c_void_p((first + still) * 2))
+            glPopMatrix()
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+
+        glDisableClientState(GL_COLOR_ARRAY)
+        glDisableClientState(GL_VERTEX_ARRAY)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def release(self):
+        buffers = [b for b in (self.__vertex_buffer, self.__index_buffer) if b is not None]
+        if buffers:
+            glDeleteBuffers(len(buffers), buffers)
+        self.__vertex_buffer = None
+        self.__index_buffer = None
+        self.__facelets = None
+
+
+class NxNCubeRenderer:
+    """
+    Retained-mode NxNxN cube of the same outer size as the 3x3x3: the 6 * n * n sticker quads live in one vertex
+    buffer in (6, n, n) sticker order, drawn over black boxes for the body. Only changed sticker runs are re-uploaded.
+    While layers turn, the sticker order for that turn puts the turning stickers last, and the body is drawn as the
+    still slabs and the turning slab.
+    """
+
+    def __init__(self, center_pos: Tuple[float, float, float], piece_edge_length: float = 1.0, n: int = 3):
+        self.__center_pos: Tuple[float, float, float] = center_pos
+        self.__n: int = n
+        self.__half_size: float = (PIECE_SPACING + 0.5) * piece_edge_length * VERTEX_SCALE
+        self.__positions: np.ndarray = get_sticker_positions(n).reshape(-1, 3)
+        self.__vertices: np.ndarray = self.get_vertices(self.__positions, center_pos, self.__half_size, n)
+        self.__stickers: Optional[np.ndarray] = None
+
+        self.__vertex_buffer = None
+        self.__index_buffer = None
+        # Layers the index buffer currently orders for, and how many of its quads stay still
+        self.__turn_key: Optional[Tuple[str, int, int]] = None
+        self.__still_count: int = 0
+        self.uploads: int = 0
+
+    @property
+    def quad_count(self) -> int:
+        return len(self.__positions)
+
+    @staticmethod
+    def get_vertices(positions: np.ndarray, center_pos: Tuple[float, float, float], half_size: float,
+                     n: int) -> np.ndarray:
+        faces: np.ndarray = np.repeat(np.arange(len(FACE_ORDER)), n * n)
+        frames: np.ndarray = np.array([FACE_FRAMES[face] for face in FACE_ORDER], dtype=np.float64)[faces]
+        right, down = frames[:, 1], frames[:, 2]
+        # Doubled coordinates run to n on the surface; stickers float just above the body
+        centers: np.ndarray = positions * (half_size / n) + frames[:, 0] * half_size * 0.002
+        half: float = half_size / n * STICKER_SCALE
+        corners: np.ndarray = np.stack([-right - down, -right + down, right + down, right - down], axis=1) * half
+
+        vertices: np.ndarray = np.empty(len(positions) * 4, dtype=VERTEX_DTYPE)
+        vertices['position'] = (np.asarray(center_pos) + centers[:, None, :] + corners).reshape(-1, 3)
+        vertices['color'] = BODY_COLOR_RGBA
+        return vertices
+
+    def __create_buffers(self):
+        self.__vertex_buffer = glGenBuffers(1)
+        glBindBuffer(GL_ARRAY_BUFFER, self.__vertex_buffer)
+        glBufferData(GL_ARRAY_BUFFER, self.__vertices.nbytes, self.__vertices.view(np.uint8), GL_DYNAMIC_DRAW)
+        self.__index_buffer = glGenBuffers(1)
+        self.uploads += 1
+
+    def set_stickers(self, stickers: np.ndarray):
+        """
+        Recolors the stickers from a (6, n, n) sticker array, uploading each contiguous run of changed stickers.
+        """
+        stickers = np.asarray(stickers).reshape(-1)
+        if self.__vertex_buffer is None:
+            self.__create_buffers()
+        if self.__stickers is None:
+            changed: np.ndarray = np.arange(stickers.size)
+        else:
+            changed = np.flatnonzero(stickers != self.__stickers)
+        if changed.size == 0:
+            return
+        self.__stickers = stickers.copy()
+        sticker_colors: np.ndarray = self.__vertices['color'].reshape(-1, 4, 4)
+        sticker_colors[changed] = FACE_COLORS_RGBA[stickers[changed], None, :]
+
+        glBindBuffer(GL_ARRAY_BUFFER, self.__vertex_buffer)
+        for start, stop in get_changed_runs(changed):
+            run: np.ndarray = self.__vertices[start * 4:stop * 4]
+            glBufferSubData(GL_ARRAY_BUFFER, start * 4 * VERTEX_DTYPE.itemsize, run.nbytes, run.view(np.uint8))
+            self.uploads += 1
+
+    def get_layers(self, face: str) -> np.ndarray:
+        """
+        Returns: Layer of every sticker counted from the face: 0 on the face itself, n - 1 on the opposite face.
+        """
+        n: int = self.__n
+        along: np.ndarray = self.__positions @ np.array(FACE_FRAMES[face][0])
+        return np.where(along == n, 0, np.where(along == -n, n - 1, (n - 1 - along) // 2))
+
+    def __order_for_turn(self, face: str, start: int, stop: int):
+        if self.__turn_key == (face, start, stop):
+            return
+        layers: np.ndarray = self.get_layers(face)
+        turning: np.ndarray = (layers >= start) & (layers < stop)
+        order: np.ndarray = np.concatenate([np.flatnonzero(~turning), np.flatnonzero(turning)])
+        indices: np.ndarray = (order[:, None] * 4 + np.arange(4)).astype(np.uint32).reshape(-1)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.__index_buffer)
+        glBufferData(GL_ELEMENT_ARRAY_BUFFER, indices.nbytes, indices, GL_DYNAMIC_DRAW)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+        self.__turn_key = (face, start, stop)
+        self.__still_count = int(np.count_nonzero(~turning))
+        self.uploads += 1
+
+    def get_body_boxes(self, face: str = None, start: int = 0, stop: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns: Quad vertices of the still body slabs and of the turning slab, which is empty when nothing turns.
+        """
+        half: float = self.__half_size
+        center: np.ndarray = np.asarray(self.__center_pos, dtype=np.float64)
+        if face is None:
+            return get_box_vertices(center - half, center + half), np.empty((0, 3), dtype=np.float32)
+        normal: np.ndarray = np.array(FACE_FRAMES[face][0])
+        axis: int = int(np.flatnonzero(normal)[0])
+        pitch: float = 2 * half / self.__n
+        # Slab bounds as distances from the turning face, mapped onto the axis
+        bounds: List[Tuple[float, float]] = [(0, start * pitch), (stop * pitch, 2 * half), (start * pitch, stop * pitch)]
+        boxes: List[np.ndarray] = []
+        for near, far in bounds:
+            low, high = center - half, center + half
+            ends: np.ndarray = center[axis] + normal[axis] * (half - np.array([near, far]))
+            low[axis], high[axis] = ends.min(), ends.max()
+            boxes.append(get_box_vertices(low, high) if far > near else np.empty((0, 3), dtype=np.float32))
+        return np.concatenate(boxes[:2]), boxes[2]
+
+    @staticmethod
+    def draw_boxes(vertices: np.ndarray):
+        if len(vertices):
+            glVertexPointer(3, GL_FLOAT, 0, vertices)
+            glDrawArrays(GL_QUADS, 0, len(vertices))
+
+    def render(self, rotation_face: str = None, layers: Tuple[int, int] = (0, 1), elapsed_angle: float = 0.0):
+        if self.__vertex_buffer is None:
+            self.__create_buffers()
+        turning: bool = rotation_face is not None and bool(elapsed_angle)
+        still_boxes, turning_boxes = self.get_body_boxes(*((rotation_face, *layers) if turning else ()))
+
+        # The body boxes are client-side arrays, so no vertex buffer may be bound while they are drawn
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glColor4f(*GlColors4f.BLACK_SOLID.value)
+        self.draw_boxes(still_boxes)
+        if turning:
+            self.__order_for_turn(rotation_face, *layers)
+            glPushMatrix()
+            glTranslatef(*self.__center_pos)
+            glRotatef(elapsed_angle, *RubiksFaceRotation[rotation_face].value)
+            glTranslatef(*[-1 * _ for _ in self.__center_pos])
+            self.draw_boxes(turning_boxes)
+            glPopMatrix()
+
+        stride: int = VERTEX_DTYPE.itemsize
+        glBindBuffer(GL_ARRAY_BUFFER, self.__vertex_buffer)
+        glEnableClientState(GL_COLOR_ARRAY)
+        glVertexPointer(3, GL_FLOAT, stride, ctypes.c_void_p(VERTEX_DTYPE.fields['position'][1]))
+        glColorPointer(4, GL_UNSIGNED_BYTE, stride, ctypes.c_void_p(VERTEX_DTYPE.fields['color'][1]))
+        if not turning:
+            glDrawArrays(GL_QUADS, 0, self.quad_count * 4)
+        else:
+            still: int = self.__still_count * 4
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.__index_buffer)
+            glDrawElements(GL_QUADS, still, GL_UNSIGNED_INT, ctypes.c_void_p(0))
+            glPushMatrix()
+            glTranslatef(*self.__center_pos)
+            glRotatef(elapsed_angle, *RubiksFaceRotation[rotation_face].value)
+            glTranslatef(*[-1 * _ for _ in self.__center_pos])
+            glDrawElements(GL_QUADS, self.quad_count * 4 - still, GL_UNSIGNED_INT, ctypes.c_void_p(still * 4))
+            glPopMatrix()
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+
+        glDisableClientState(GL_COLOR_ARRAY)
+        glDisableClientState(GL_VERTEX_ARRAY)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def release(self):
+        buffers = [b for b in (self.__vertex_buffer, self.__index_buffer) if b is not None]
+        if buffers:
+            glDeleteBuffers(len(buffers), buffers)
+        self.__vertex_buffer = None
+        self.__index_buffer = None
+        self.__stickers = None
+        self.__turn_key = None